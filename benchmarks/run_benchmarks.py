@@ -0,0 +1,464 @@
+"""Benchmark suite for LMSteer, run entirely offline on synthetic models.
+
+Usage:
+    python -m benchmarks.run_benchmarks --output bench.json
+    python -m benchmarks.run_benchmarks --quick --compare bench.json
+
+Results are written as JSON keyed by benchmark name and parameters, so runs
+from different commits can be compared with --compare.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import torch
+from rich.console import Console
+from rich.table import Table
+
+from lmsteer.app.activation_store import ActivationStore
+from lmsteer.app.capture import run_observation
+from lmsteer.app.model_utils import build_module_tree
+from lmsteer.app.precision import convert_precision, model_memory_bytes
+from lmsteer.app.profiling import profiler
+from lmsteer.app.rules import compile_rules_to_steering_config
+from lmsteer.app.steering import SteeringHooks, SteeringWrappers
+from lmsteer.app.synthetic import build_synthetic_model, generate_synthetic_rules
+
+FULL_MODULE_SCALES = [1_000, 10_000, 100_000]
+FULL_RULE_SCALES = [10, 100, 1_000, 10_000]
+QUICK_MODULE_SCALES = [1_000]
+QUICK_RULE_SCALES = [10, 100]
+
+
+def _time(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return {
+        "min_s": min(durations),
+        "mean_s": sum(durations) / len(durations),
+        "repeat": repeat,
+    }
+
+
+def bench_build_module_tree(num_modules: int, repeat: int) -> List[dict]:
+    model = build_synthetic_model(num_modules=num_modules, hidden_size=8)
+    return [
+        {
+            "name": "build_module_tree",
+            "params": {"modules": num_modules, "share_templates": share_templates},
+            "metrics": _time(
+                lambda: build_module_tree(model, share_templates=share_templates),
+                repeat,
+            ),
+        }
+        for share_templates in (False, True)
+    ]
+
+
+def bench_compile(num_modules: int, num_rules: int, repeat: int) -> List[dict]:
+    model = build_synthetic_model(num_modules=num_modules, hidden_size=8)
+    rules = generate_synthetic_rules(model, num_rules)
+    console = Console(quiet=True)
+    template_root = build_module_tree(model, share_templates=True)
+    return [
+        {
+            "name": "compile_rules_to_steering_config",
+            "params": {"modules": num_modules, "rules": num_rules, "tree": False},
+            "metrics": _time(
+                lambda: compile_rules_to_steering_config(rules, model, console), repeat
+            ),
+        },
+        {
+            "name": "compile_rules_to_steering_config",
+            "params": {"modules": num_modules, "rules": num_rules, "tree": True},
+            "metrics": _time(
+                lambda: compile_rules_to_steering_config(
+                    rules, model, console, module_root=template_root
+                ),
+                repeat,
+            ),
+        },
+    ]
+
+
+def bench_tui_population(num_modules: int, repeat: int) -> List[dict]:
+    from lmsteer.tui.app import CustomTree, LMSteerApp
+
+    model = build_synthetic_model(num_modules=num_modules, hidden_size=8)
+    results = []
+    for share_templates in (False, True):
+        model_root = build_module_tree(model, share_templates=share_templates)
+        app = LMSteerApp(model_root=model_root, model_name="synthetic")
+
+        async def populate():
+            async with app.run_test() as pilot:
+                await pilot.pause()
+                tree = app.query_one("#module_tree", CustomTree)
+
+                def repopulate():
+                    tree.clear()
+                    app._add_nodes_to_tree(tree.root, model_root)
+
+                return _time(repopulate, repeat)
+
+        results.append(
+            {
+                "name": "tui_tree_population",
+                "params": {"modules": num_modules, "share_templates": share_templates},
+                "metrics": asyncio.run(populate()),
+            }
+        )
+    return results
+
+
+def bench_tui_status_update(num_modules: int, repeat: int) -> List[dict]:
+    from lmsteer.tui.app import LMSteerApp
+
+    model = build_synthetic_model(num_modules=num_modules, hidden_size=8)
+    app = LMSteerApp(
+        model_root=build_module_tree(model, share_templates=True),
+        model_name="synthetic",
+    )
+    rule_sets = [
+        generate_synthetic_rules(model, 100, seed=0),
+        generate_synthetic_rules(model, 100, seed=1),
+    ]
+
+    async def relabel():
+        async with app.run_test() as pilot:
+            await pilot.pause()
+            step = iter(range(1_000_000))
+            # Alternating rule sets forces a status change on every call.
+            return _time(
+                lambda: app.set_defined_rules(rule_sets[next(step) % 2]), repeat
+            )
+
+    return [
+        {
+            "name": "tui_status_update",
+            "params": {"modules": num_modules, "rules": 100},
+            "metrics": asyncio.run(relabel()),
+        }
+    ]
+
+
+def _synthetic_batches(num_batches: int, batch_size: int, seq_len: int) -> List[dict]:
+    generator = torch.Generator().manual_seed(0)
+    return [
+        {"input_ids": torch.randint(0, 128, (batch_size, seq_len), generator=generator)}
+        for _ in range(num_batches)
+    ]
+
+
+def bench_capture_throughput(
+    num_layers: int, positions: str, repeat: int, batch_size: int = 8, seq_len: int = 64
+) -> List[dict]:
+    model = build_synthetic_model(num_layers=num_layers, hidden_size=64, num_heads=4)
+    rules = [
+        {
+            "id": "bench",
+            "rule_type": "path_pattern",
+            "specifier": "layers.*.mlp.fc_out",
+            "action": "capture",
+        }
+    ]
+    console = Console(quiet=True)
+    steering_config = compile_rules_to_steering_config(rules, model, console)
+    batches = _synthetic_batches(4, batch_size, seq_len)
+    metrics = _time(
+        lambda: run_observation(
+            model, batches, steering_config, console, {"positions": positions}
+        ),
+        repeat,
+    )
+    metrics["tokens_per_s"] = len(batches) * batch_size * seq_len / metrics["min_s"]
+    return [
+        {
+            "name": "capture_throughput",
+            "params": {"layers": num_layers, "positions": positions},
+            "metrics": metrics,
+        }
+    ]
+
+
+def bench_capture_writer(
+    num_layers: int, repeat: int, batch_size: int = 8, seq_len: int = 64
+) -> List[dict]:
+    """Captures every MLP leaf to disk, one shard per batch, with and without background writers."""
+    model = build_synthetic_model(num_layers=num_layers, hidden_size=128, num_heads=4)
+    rules = [
+        {
+            "id": "bench",
+            "rule_type": "path_pattern",
+            "specifier": "layers.*.mlp.*",
+            "action": "capture",
+        }
+    ]
+    console = Console(quiet=True)
+    steering_config = compile_rules_to_steering_config(rules, model, console)
+    batches = _synthetic_batches(8, batch_size, seq_len)
+    results = []
+    for num_writers in (0, 2):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            runs = iter(range(repeat))
+
+            def capture():
+                run_observation(
+                    model,
+                    batches,
+                    steering_config,
+                    console,
+                    store=ActivationStore(f"{tmp_dir}/{next(runs)}"),
+                    shard_size=batch_size,
+                    num_writers=num_writers,
+                )
+
+            profiler.reset()
+            with profiler.profile():
+                metrics = _time(capture, repeat)
+        totals_s = {
+            (row["category"], row["name"]): row["total_ms"] / 1e3 / repeat
+            for row in profiler.summary()
+        }
+        # Time the forward thread spent writing shards (synchronous) or waiting on writers (background).
+        stall_s = totals_s.get(
+            ("writer", "backpressure" if num_writers else "write_shard"), 0.0
+        )
+        metrics["tokens_per_s"] = len(batches) * batch_size * seq_len / metrics["min_s"]
+        metrics["forward_pct"] = (
+            100 * totals_s.get(("forward", "model"), 0.0) / metrics["mean_s"]
+        )
+        metrics["write_stall_ms"] = 1e3 * stall_s
+        results.append(
+            {
+                "name": "capture_writer",
+                "params": {"layers": num_layers, "writers": num_writers},
+                "metrics": metrics,
+            }
+        )
+    profiler.reset()
+    return results
+
+
+def bench_injection_overhead(
+    num_layers: int,
+    repeat: int,
+    batch_size: int = 8,
+    seq_len: int = 64,
+    compile_model: bool = False,
+) -> List[dict]:
+    """Unsteered baseline versus hook and module-wrapper injection (optionally also under torch.compile)."""
+    model = build_synthetic_model(num_layers=num_layers, hidden_size=64, num_heads=4)
+    input_ids = _synthetic_batches(1, batch_size, seq_len)[0]["input_ids"]
+    vectors = {f"layers.{i}.mlp.fc_out": torch.randn(64) for i in range(num_layers)}
+
+    def timed(target) -> Dict[str, float]:
+        def forward():
+            with torch.no_grad():
+                target(input_ids=input_ids)
+
+        forward()  # Warm-up (and compilation for compiled targets)
+        return _time(forward, repeat)
+
+    timings = {"none": timed(model)}
+    with SteeringHooks(model, vectors, scale=1.0):
+        timings["hooks"] = timed(model)
+    with SteeringWrappers(model, vectors, scale=1.0):
+        timings["wrappers"] = timed(model)
+    if compile_model:
+        timings["none+compile"] = timed(torch.compile(model))
+        with SteeringWrappers(model, vectors, scale=1.0):
+            timings["wrappers+compile"] = timed(torch.compile(model))
+
+    for backend, metrics in timings.items():
+        if backend not in ("none", "none+compile"):
+            baseline = timings[
+                "none+compile" if backend.endswith("+compile") else "none"
+            ]
+            metrics["overhead_pct"] = 100 * (metrics["min_s"] / baseline["min_s"] - 1)
+    return [
+        {
+            "name": "injection",
+            "params": {"layers": num_layers, "backend": backend},
+            "metrics": metrics,
+        }
+        for backend, metrics in timings.items()
+    ]
+
+
+def bench_precision(
+    num_layers: int, repeat: int, batch_size: int = 8, seq_len: int = 64
+) -> List[dict]:
+    model = build_synthetic_model(num_layers=num_layers, hidden_size=256, num_heads=4)
+    input_ids = _synthetic_batches(1, batch_size, seq_len)[0]["input_ids"]
+    results = []
+    for precision in ("fp32", "bf16", "int8"):
+        converted = convert_precision(model, precision)
+
+        def forward():
+            with torch.no_grad():
+                converted(input_ids=input_ids)
+
+        metrics = _time(forward, repeat)
+        metrics["tokens_per_s"] = batch_size * seq_len / metrics["min_s"]
+        metrics["model_mb"] = model_memory_bytes(converted) / 2**20
+        results.append(
+            {
+                "name": "precision_forward",
+                "params": {"layers": num_layers, "precision": precision},
+                "metrics": metrics,
+            }
+        )
+    return results
+
+
+def result_key(result: dict) -> str:
+    params = ",".join(f"{k}={v}" for k, v in sorted(result["params"].items()))
+    return f"{result['name']}[{params}]"
+
+
+def run_suite(
+    module_scales: List[int],
+    rule_scales: List[int],
+    repeat: int = 3,
+    tui_max_modules: int = 10_000,
+    console: Console | None = None,
+    compile_model: bool = False,
+) -> dict:
+    """Runs every benchmark and returns the results as a JSON-serializable dict."""
+    console = console or Console(quiet=True)
+    results: List[dict] = []
+    for num_modules in module_scales:
+        console.print(f"Benchmarking {num_modules} modules...")
+        results += bench_build_module_tree(num_modules, repeat)
+        for num_rules in rule_scales:
+            results += bench_compile(num_modules, num_rules, repeat)
+        if num_modules <= tui_max_modules:
+            results += bench_tui_population(num_modules, repeat)
+            results += bench_tui_status_update(num_modules, repeat)
+    for num_layers in (2, 8):
+        for positions in ("all", "last"):
+            results += bench_capture_throughput(num_layers, positions, repeat)
+        results += bench_capture_writer(num_layers, repeat)
+        results += bench_injection_overhead(
+            num_layers, repeat, compile_model=compile_model
+        )
+        results += bench_precision(num_layers, repeat)
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "meta": {
+            "commit": commit,
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "platform": platform.platform(),
+        },
+        "results": {result_key(result): result for result in results},
+    }
+
+
+def compare_results(
+    current: dict, baseline: dict, threshold: float = 0.10
+) -> List[dict]:
+    """Returns benchmarks whose min time grew by more than threshold versus the baseline."""
+    regressions = []
+    for key, result in current["results"].items():
+        previous = baseline["results"].get(key)
+        if previous is None:
+            continue
+        before, after = previous["metrics"]["min_s"], result["metrics"]["min_s"]
+        if before > 0 and after / before - 1 > threshold:
+            regressions.append({"benchmark": key, "before_s": before, "after_s": after})
+    return regressions
+
+
+def print_results(results: dict, console: Console) -> None:
+    table = Table(title="LMSteer benchmarks")
+    table.add_column("Benchmark", overflow="fold")
+    table.add_column("Min (ms)", justify="right")
+    table.add_column("Mean (ms)", justify="right")
+    table.add_column("Extra", justify="right")
+    for key, result in results["results"].items():
+        metrics = result["metrics"]
+        extra = ", ".join(
+            f"{name}={value:.1f}"
+            for name, value in metrics.items()
+            if name not in ("min_s", "mean_s", "repeat")
+        )
+        table.add_row(
+            key,
+            f"{metrics['min_s'] * 1e3:.3f}",
+            f"{metrics['mean_s'] * 1e3:.3f}",
+            extra,
+        )
+    console.print(table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the LMSteer benchmark suite.")
+    parser.add_argument(
+        "--output", type=str, default=None, help="Path of the JSON results file."
+    )
+    parser.add_argument(
+        "--compare",
+        type=str,
+        default=None,
+        help="Baseline JSON results to compare against.",
+    )
+    parser.add_argument(
+        "--quick", action="store_true", help="Run only the smallest scales."
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--threshold", type=float, default=0.10, help="Regression threshold (fraction)."
+    )
+    parser.add_argument(
+        "--compile",
+        action="store_true",
+        help="Also time injection under torch.compile (slow to build).",
+    )
+    args = parser.parse_args()
+
+    console = Console()
+    results = run_suite(
+        QUICK_MODULE_SCALES if args.quick else FULL_MODULE_SCALES,
+        QUICK_RULE_SCALES if args.quick else FULL_RULE_SCALES,
+        repeat=args.repeat,
+        console=console,
+        compile_model=args.compile,
+    )
+    print_results(results, console)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        console.print(f"Results saved to {args.output}")
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.threshold)
+        for regression in regressions:
+            console.print(
+                f"[bold red]Regression:[/bold red] {regression['benchmark']} "
+                f"{regression['before_s'] * 1e3:.3f} ms -> {regression['after_s'] * 1e3:.3f} ms"
+            )
+        if not regressions:
+            console.print("[green]No regressions against the baseline.[/green]")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+from typing import Dict, Iterator, List, Tuple
+
+import torch
+
+
+class _HashingWriter:
+    """File wrapper that hashes everything written through it."""
+
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data) -> int:
+        self.sha256.update(data)
+        return self.f.write(data)
+
+    def flush(self) -> None:
+        self.f.flush()
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def replace_synced(tmp_path: str, path: str) -> None:
+    """Renames a synced temporary file over ``path`` and syncs the directory entry.
+
+    The caller must fsync ``tmp_path`` before calling this; syncing the
+    directory afterwards makes the rename itself survive a power loss.
+    """
+    os.replace(tmp_path, path)
+    dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+class ActivationStore:
+    """On-disk store for captured activations, split into shards.
+
+    Each shard is a single ``torch.save`` file holding a dict of module path to
+    a ``[rows, ...]`` tensor. An ``index.json`` file next to the shards records
+    the shard files, how many dataset samples each one covers and any metadata
+    about the run (e.g. the capture spec that was used). If activations were
+    reduced during capture, the projection bases are kept in ``projections.pt``.
+    Every shard's SHA-256 is recorded in the index so completed shards can be
+    verified later (``verify_shards``).
+    """
+
+    INDEX_FILE_NAME = "index.json"
+    PROJECTIONS_FILE_NAME = "projections.pt"
+
+    def __init__(self, root_dir: str, metadata: dict | None = None):
+        self.root_dir = root_dir
+        os.makedirs(self.root_dir, exist_ok=True)
+        self.index = self._load_index()
+        if metadata:
+            self.index["metadata"].update(metadata)
+            self._save_index()
+
+    def _index_path(self) -> str:
+        return os.path.join(self.root_dir, self.INDEX_FILE_NAME)
+
+    def _load_index(self) -> dict:
+        index_path = self._index_path()
+        if os.path.exists(index_path):
+            with open(index_path, "r") as f:
+                return json.load(f)
+        return {"metadata": {}, "shards": []}
+
+    def _save_index(self) -> None:
+        # Write to a temporary file first so a crash never leaves a truncated index.
+        tmp_path = self._index_path() + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        replace_synced(tmp_path, self._index_path())
+
+    @property
+    def num_shards(self) -> int:
+        return len(self.index["shards"])
+
+    @property
+    def num_samples(self) -> int:
+        return sum(shard["num_samples"] for shard in self.index["shards"])
+
+    def module_paths(self) -> List[str]:
+        """Returns every module path that appears in at least one shard."""
+        paths = []
+        for shard in self.index["shards"]:
+            for path in shard["rows"]:
+                if path not in paths:
+                    paths.append(path)
+        return paths
+
+    def shard_file_name(self, shard_idx: int) -> str:
+        return f"shard_{shard_idx:05d}.pt"
+
+    def save_shard_file(
+        self, shard_idx: int, activations: Dict[str, torch.Tensor]
+    ) -> Tuple[str, str]:
+        """Writes a shard file without touching the index (safe to call from writer threads).
+
+        The file is written under a temporary name, synced and renamed into
+        place, so a crash never leaves a truncated shard behind. Returns the
+        file name and its SHA-256, computed while writing.
+        """
+        shard_file_name = self.shard_file_name(shard_idx)
+        shard_path = os.path.join(self.root_dir, shard_file_name)
+        tmp_path = shard_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            writer = _HashingWriter(f)
+            torch.save(activations, writer)
+            f.flush()
+            os.fsync(f.fileno())
+        replace_synced(tmp_path, shard_path)
+        return shard_file_name, writer.sha256.hexdigest()
+
+    def record_shard(
+        self,
+        shard_file_name: str,
+        num_samples: int,
+        rows: Dict[str, int],
+        sha256: str | None = None,
+    ) -> None:
+        """Appends a written shard file to the index."""
+        self.index["shards"].append(
+            {
+                "file": shard_file_name,
+                "num_samples": num_samples,
+                "rows": rows,
+                "sha256": sha256,
+            }
+        )
+        self._save_index()
+
+    def write_shard(
+        self, activations: Dict[str, torch.Tensor], num_samples: int
+    ) -> str:
+        """Writes one shard of activations and records it in the index."""
+        shard_file_name, sha256 = self.save_shard_file(self.num_shards, activations)
+        self.record_shard(
+            shard_file_name,
+            num_samples,
+            {path: int(t.shape[0]) for path, t in activations.items()},
+            sha256,
+        )
+        return os.path.join(self.root_dir, shard_file_name)
+
+    def verify_shard(self, shard_idx: int) -> bool:
+        """Checks that a shard file exists and matches its recorded checksum.
+
+        Shards recorded without a checksum (older stores) only need to exist.
+        """
+        shard = self.index["shards"][shard_idx]
+        shard_path = os.path.join(self.root_dir, shard["file"])
+        if not os.path.exists(shard_path):
+            return False
+        return shard.get("sha256") is None or file_sha256(shard_path) == shard["sha256"]
+
+    def verify_shards(self) -> List[str]:
+        """Returns the file names of shards that are missing or fail their checksum."""
+        return [
+            shard["file"]
+            for shard_idx, shard in enumerate(self.index["shards"])
+            if not self.verify_shard(shard_idx)
+        ]
+
+    def truncate(self, num_shards: int) -> None:
+        """Drops every shard after the first ``num_shards``, plus any unrecorded or partial files."""
+        self.index["shards"] = self.index["shards"][:num_shards]
+        self._save_index()
+        recorded = {shard["file"] for shard in self.index["shards"]}
+        for file_name in os.listdir(self.root_dir):
+            is_shard = file_name.startswith("shard_") and file_name.endswith(
+                (".pt", ".pt.tmp")
+            )
+            if is_shard and file_name not in recorded:
+                os.remove(os.path.join(self.root_dir, file_name))
+
+    def load_shard(self, shard_idx: int) -> Dict[str, torch.Tensor]:
+        shard_file_name = self.index["shards"][shard_idx]["file"]
+        return torch.load(
+            os.path.join(self.root_dir, shard_file_name), weights_only=True
+        )
+
+    def iter_shards(self) -> Iterator[Dict[str, torch.Tensor]]:
+        for shard_idx in range(self.num_shards):
+            yield self.load_shard(shard_idx)
+
+    def load_module(self, module_path: str) -> torch.Tensor:
+        """Concatenates the activations of one module across all shards."""
+        parts = [
+            shard[module_path] for shard in self.iter_shards() if module_path in shard
+        ]
+        if not parts:
+            raise KeyError(f"No activations stored for module '{module_path}'")
+        return torch.cat(parts, dim=0)
+
+    def write_projections(self, projection_states: Dict[str, dict]) -> None:
+        """Saves the projection basis (and mean) of every reduced module."""
+        torch.save(
+            projection_states, os.path.join(self.root_dir, self.PROJECTIONS_FILE_NAME)
+        )
+        self.index["metadata"]["projections"] = {
+            path: {
+                "method": state["method"],
+                "in_dim": state["in_dim"],
+                "out_dim": state["out_dim"],
+            }
+            for path, state in projection_states.items()
+        }
+        self._save_index()
+
+    def load_projections(self) -> Dict[str, dict]:
+        """Returns the projection states of reduced modules (empty if nothing was reduced)."""
+        projections_path = os.path.join(self.root_dir, self.PROJECTIONS_FILE_NAME)
+        if not os.path.exists(projections_path):
+            return {}
+        return torch.load(projections_path, weights_only=True)
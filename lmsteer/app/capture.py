@@ -0,0 +1,478 @@
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Literal, Tuple, TypedDict
+
+import torch
+from rich.console import Console  # For status messages during observation runs
+
+from lmsteer.app.activation_store import ActivationStore
+from lmsteer.app.profiling import profiler
+from lmsteer.app.projection import ProjectionSpec, ProjectionState, Projector
+from lmsteer.app.shard_writer import ShardWriter, StagingBuffers
+
+
+CAPTURE_ACTION = "capture_leaf_activations"
+
+
+# Describes which token positions of a module's [batch, seq, hidden] output are kept.
+class CaptureSpec(TypedDict, total=False):
+    positions: Literal["all", "last", "first", "token_ids", "mask"]
+    token_ids: List[int]  # Only used when positions == "token_ids"
+
+
+DEFAULT_CAPTURE_SPEC: CaptureSpec = {"positions": "all"}
+
+
+def validate_capture_spec(capture_spec: CaptureSpec) -> None:
+    """Raises ValueError if the capture spec is malformed."""
+    positions = capture_spec.get("positions", "all")
+    if positions not in ("all", "last", "first", "token_ids", "mask"):
+        raise ValueError(f"Unknown capture positions '{positions}'")
+    if positions == "token_ids" and not capture_spec.get("token_ids"):
+        raise ValueError("Capture spec 'token_ids' requires a non-empty token_ids list")
+
+
+def _spec_key(capture_spec: CaptureSpec) -> tuple:
+    # Hashable key so modules sharing a spec also share the per-batch selector.
+    return (
+        capture_spec.get("positions", "all"),
+        tuple(capture_spec.get("token_ids", ())),
+    )
+
+
+def build_position_selector(
+    capture_spec: CaptureSpec,
+    input_ids: torch.Tensor,
+    attention_mask: torch.Tensor | None = None,
+    capture_mask: torch.Tensor | None = None,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Computes (batch_idx, pos_idx) index tensors for the positions selected by a spec.
+
+    The selector is computed once per batch and then applied inside every hook
+    as a single vectorized gather, so only the selected rows are ever copied.
+    Padding positions (attention_mask == 0) are never selected, regardless of
+    whether the tokenizer pads on the left or on the right.
+    """
+    batch_size, seq_len = input_ids.shape[:2]
+    device = input_ids.device
+    positions = capture_spec.get("positions", "all")
+    if attention_mask is None:
+        attention_mask = torch.ones(
+            (batch_size, seq_len), dtype=torch.long, device=device
+        )
+    valid = attention_mask.bool()
+
+    if positions == "last":
+        batch_idx = torch.arange(batch_size, device=device)
+        # Index of the last non-padding token in each row.
+        pos_idx = seq_len - 1 - valid.flip(dims=[1]).int().argmax(dim=1)
+        return batch_idx, pos_idx
+    if positions == "first":
+        batch_idx = torch.arange(batch_size, device=device)
+        pos_idx = valid.int().argmax(dim=1)  # Index of the first non-padding token
+        return batch_idx, pos_idx
+
+    if positions == "all":
+        selected = valid
+    elif positions == "token_ids":
+        wanted = torch.tensor(capture_spec["token_ids"], device=device)
+        selected = torch.isin(input_ids, wanted) & valid
+    elif positions == "mask":
+        if capture_mask is None:
+            raise ValueError("Capture spec 'mask' requires a capture_mask in the batch")
+        selected = capture_mask.to(device).bool() & valid
+    else:
+        raise ValueError(f"Unknown capture positions '{positions}'")
+
+    batch_idx, pos_idx = selected.nonzero(as_tuple=True)
+    return batch_idx, pos_idx
+
+
+class ActivationCapture:
+    """Registers forward hooks on the capture targets of a steering config.
+
+    Every hook selects the configured token positions from the module output
+    before anything is detached and copied, so memory and I/O scale with the
+    number of selected positions rather than the full sequence length. A
+    steering config entry may override the global spec with its own
+    ``capture_spec`` key.
+
+    With a projection spec (global, or a ``projection`` key per config entry),
+    the selected rows are also reduced to a few features inside the hook,
+    before they are copied off the device.
+
+    When ``staging`` is set (see ShardWriter.acquire_staging), rows are copied
+    into its reusable host buffers instead of freshly allocated CPU tensors.
+    """
+
+    def __init__(
+        self,
+        model: torch.nn.Module,
+        steering_config: dict,
+        capture_spec: CaptureSpec | None = None,
+        projection: ProjectionSpec | None = None,
+    ):
+        self.model = model
+        self.steering_config = steering_config
+        self.capture_spec = capture_spec or DEFAULT_CAPTURE_SPEC
+        validate_capture_spec(self.capture_spec)
+
+        self.module_specs: Dict[str, CaptureSpec] = {}
+        self.projectors: Dict[str, Projector] = {}
+        for module_path, entry in steering_config.items():
+            if entry.get("action") != CAPTURE_ACTION:
+                continue
+            module_spec = entry.get("capture_spec") or self.capture_spec
+            validate_capture_spec(module_spec)
+            self.module_specs[module_path] = module_spec
+            module_projection = entry.get("projection") or projection
+            if module_projection and module_projection.get("method", "none") != "none":
+                self.projectors[module_path] = Projector(module_projection)
+
+        self.buffers: Dict[str, List[torch.Tensor]] = {
+            path: [] for path in self.module_specs
+        }
+        self.staging: StagingBuffers | None = None
+        self.pin_memory = False
+        self.shard_size = 0  # Samples per shard, used to size staging buffers
+        self._shard_samples = 0  # Samples seen since the last pop_activations
+        self._staged_rows: Dict[str, int] = {}
+        self._handles = []
+        self._batch_shape: Tuple[int, int] | None = None
+        self._selectors: Dict[tuple, Tuple[torch.Tensor, torch.Tensor]] = {}
+
+    def __enter__(self) -> "ActivationCapture":
+        self.register()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.remove()
+
+    def register(self) -> None:
+        for module_path, module_spec in self.module_specs.items():
+            module = self.model.get_submodule(module_path)
+            handle = module.register_forward_hook(
+                self._make_hook(module_path, _spec_key(module_spec))
+            )
+            self._handles.append(handle)
+
+    def remove(self) -> None:
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+
+    def set_batch(
+        self,
+        input_ids: torch.Tensor,
+        attention_mask: torch.Tensor | None = None,
+        capture_mask: torch.Tensor | None = None,
+    ) -> None:
+        """Prepares the position selectors for the next forward pass."""
+        self._batch_shape = tuple(input_ids.shape[:2])
+        self._shard_samples += self._batch_shape[0]
+        self._selectors = {}
+        for module_spec in self.module_specs.values():
+            key = _spec_key(module_spec)
+            if key not in self._selectors:
+                self._selectors[key] = build_position_selector(
+                    module_spec, input_ids, attention_mask, capture_mask
+                )
+
+    def attach_writer(self, writer: ShardWriter, shard_size: int) -> None:
+        """Stages rows in the writer's reusable host buffers from now on."""
+        self.pin_memory = writer.pin_memory
+        self.shard_size = shard_size
+        self.staging = writer.acquire_staging()
+
+    def _stage(self, module_path: str, rows: torch.Tensor) -> None:
+        """Copies rows off the device, into the module's staging buffer when there is one."""
+        buffer = self.buffers[module_path]
+        staging = self.staging.get(module_path) if self.staging is not None else None
+        if (
+            self.staging is None
+            or buffer
+            or (
+                staging is not None
+                and (staging.shape[1:] != rows.shape[1:] or staging.dtype != rows.dtype)
+            )
+        ):
+            # Not row-compatible with the staging buffer (e.g. a whole attention
+            # map); stay on plain copies for the rest of the shard to keep row order.
+            buffer.append(rows.to("cpu"))
+            return
+        offset = self._staged_rows.get(module_path, 0)
+        needed = offset + rows.shape[0]
+        if staging is None or needed > staging.shape[0]:
+            # Size the buffer for a whole shard at the rows per sample seen so far,
+            # so it is allocated about once instead of growing by doubling.
+            capacity = max(
+                needed, -(-needed * self.shard_size // max(self._shard_samples, 1))
+            )
+            grown = torch.empty(
+                (capacity,) + tuple(rows.shape[1:]),
+                dtype=rows.dtype,
+                pin_memory=self.pin_memory,
+            )
+            if offset:
+                grown[:offset].copy_(staging[:offset])
+            staging = self.staging[module_path] = grown
+        staging[offset:needed].copy_(rows, non_blocking=self.pin_memory)
+        self._staged_rows[module_path] = needed
+
+    def _make_hook(self, module_path: str, spec_key: tuple):
+        projector = self.projectors.get(module_path)
+
+        def hook(module, inputs, output):
+            start_ns = time.perf_counter_ns() if profiler.enabled else 0
+            if isinstance(output, (tuple, list)):
+                output = output[0]
+            if not isinstance(output, torch.Tensor):
+                return
+            output = output.detach()
+            selector = self._selectors.get(spec_key)
+            if (
+                selector is not None
+                and output.dim() >= 2
+                and tuple(output.shape[:2]) == self._batch_shape
+            ):
+                batch_idx, pos_idx = selector
+                if batch_idx.device != output.device:
+                    batch_idx = batch_idx.to(output.device)
+                    pos_idx = pos_idx.to(output.device)
+                # Advanced indexing copies only the selected rows.
+                selected = output[batch_idx, pos_idx]
+            else:
+                # Output is not token-aligned (or no batch was set); keep it whole.
+                selected = output.clone()
+            if projector is not None:
+                selected = projector.transform(selected)
+                if selected is None:
+                    return  # Buffered until the PCA basis is fitted
+            self._stage(module_path, selected)
+            if start_ns:
+                profiler.record(
+                    "capture_hook",
+                    module_path,
+                    start_ns,
+                    time.perf_counter_ns(),
+                    selected.numel() * selected.element_size(),
+                )
+
+        return hook
+
+    def finalize_projections(self) -> None:
+        """Releases rows still buffered by PCA projectors (runs shorter than fit_batches)."""
+        for module_path, projector in self.projectors.items():
+            rows = projector.finalize()
+            if rows is not None:
+                self._stage(module_path, rows)
+
+    def projections_buffering(self) -> bool:
+        """True while any PCA projector holds rows back; a shard flushed now would miss them."""
+        return any(projector.buffering for projector in self.projectors.values())
+
+    def projection_states(self) -> Dict[str, ProjectionState]:
+        """Returns the fitted basis of every module whose activations were reduced."""
+        return {
+            module_path: projector.state
+            for module_path, projector in self.projectors.items()
+            if projector.state is not None
+        }
+
+    def pop_activations(self) -> Dict[str, torch.Tensor]:
+        """Returns everything captured since the last call and clears the buffers.
+
+        Staged rows are returned as views of the staging buffers, which stay
+        valid until the buffer set is reused.
+        """
+        if self.pin_memory and self._staged_rows:
+            torch.cuda.synchronize()  # Wait for the non-blocking device-to-host copies
+        self._shard_samples = 0
+        activations = {}
+        for module_path, buffer in self.buffers.items():
+            parts = []
+            staged = self._staged_rows.pop(module_path, 0)
+            if staged:
+                parts.append(self.staging[module_path][:staged])
+            parts.extend(buffer)
+            buffer.clear()
+            if parts:
+                activations[module_path] = (
+                    parts[0] if len(parts) == 1 else torch.cat(parts, dim=0)
+                )
+        return activations
+
+    def has_pending_rows(self) -> bool:
+        return bool(self._staged_rows) or any(self.buffers.values())
+
+
+def iter_tokenized_batches(
+    tokenizer, prompts: Iterable[str], batch_size: int = 8, max_length: int = 512
+) -> Iterator[dict]:
+    """Tokenizes prompts into padded batches suitable for run_observation."""
+    batch_prompts = []
+    for prompt in prompts:
+        batch_prompts.append(prompt)
+        if len(batch_prompts) == batch_size:
+            yield dict(
+                tokenizer(
+                    batch_prompts,
+                    return_tensors="pt",
+                    padding=True,
+                    truncation=True,
+                    max_length=max_length,
+                )
+            )
+            batch_prompts = []
+    if batch_prompts:
+        yield dict(
+            tokenizer(
+                batch_prompts,
+                return_tensors="pt",
+                padding=True,
+                truncation=True,
+                max_length=max_length,
+            )
+        )
+
+
+def run_capture_loop(
+    model: torch.nn.Module,
+    batches: Iterable[dict],
+    capture: ActivationCapture,
+    shard_size: int,
+    store: ActivationStore | None = None,
+    writer: ShardWriter | None = None,
+    on_shard: Callable[[Dict[str, torch.Tensor], int], None] | None = None,
+) -> int:
+    """Runs the model over batches and flushes the captured rows every ``shard_size`` samples.
+
+    Each shard goes to ``writer`` when there is one, else is written to
+    ``store`` synchronously; ``on_shard(activations, num_samples)`` is then
+    called with it (the activations stay valid until the callback returns).
+    No shard is flushed while a PCA projector is still fitting its basis.
+    The writer is closed on the way out; a failed background write never
+    masks an exception raised by the loop itself. Returns the samples processed.
+    """
+    samples_in_shard = 0
+    total_samples = 0
+
+    def flush() -> None:
+        activations = capture.pop_activations()
+        if writer is not None:
+            writer.submit(activations, samples_in_shard, capture.staging)
+        elif store is not None:
+            num_bytes = sum(t.numel() * t.element_size() for t in activations.values())
+            with profiler.span("writer", "write_shard", num_bytes):
+                store.write_shard(activations, samples_in_shard)
+        if on_shard is not None:
+            on_shard(activations, samples_in_shard)
+        if writer is not None:
+            capture.staging = writer.acquire_staging()
+
+    model.eval()
+    try:
+        with capture, profiler.layer_timing(model), torch.no_grad():
+            for batch in batches:
+                input_ids = batch["input_ids"]
+                attention_mask = batch.get("attention_mask")
+                capture.set_batch(input_ids, attention_mask, batch.get("capture_mask"))
+                with profiler.span("forward", "model"):
+                    model(input_ids=input_ids, attention_mask=attention_mask)
+
+                batch_size = input_ids.shape[0]
+                samples_in_shard += batch_size
+                total_samples += batch_size
+                if (
+                    samples_in_shard >= shard_size
+                    and not capture.projections_buffering()
+                ):
+                    flush()
+                    samples_in_shard = 0
+            capture.finalize_projections()
+            if samples_in_shard or capture.has_pending_rows():
+                flush()
+    except BaseException:
+        if writer is not None:
+            writer.close(raise_errors=False)  # Keep the original error
+        raise
+    if writer is not None:
+        writer.close()  # Waits for queued shards; re-raises a failed write
+    return total_samples
+
+
+def run_observation(
+    model: torch.nn.Module,
+    batches: Iterable[dict],
+    steering_config: dict,
+    console: Console,
+    capture_spec: CaptureSpec | None = None,
+    store: ActivationStore | None = None,
+    shard_size: int = 1024,
+    projection: ProjectionSpec | None = None,
+    num_writers: int = 2,
+    max_pending_shards: int = 2,
+) -> Dict[str, torch.Tensor] | ActivationStore:
+    """Runs the model over batches and captures activations for the steering config.
+
+    Each batch is a dict with ``input_ids`` and optionally ``attention_mask`` and
+    ``capture_mask`` (the latter is used by the "mask" capture spec). When a store
+    is given, activations are flushed to it every ``shard_size`` samples and the
+    store is returned; otherwise all activations are returned in memory.
+
+    With a projection spec, reduced activations are captured instead and the
+    store also receives the projection bases (see ActivationStore.load_projections).
+    No shard is flushed while a PCA basis is still being fitted, so the first
+    shard grows to cover the whole fit window and every shard's num_samples
+    matches its rows.
+
+    Shards are written by ``num_writers`` background threads (ShardWriter), so
+    serialization overlaps with the next forward passes; at most
+    ``max_pending_shards`` shards wait to be written before the forward pass
+    blocks. ``num_writers=0`` writes each shard synchronously.
+    """
+    capture = ActivationCapture(model, steering_config, capture_spec, projection)
+    if not capture.module_specs:
+        console.print(
+            "[yellow]No modules in the steering config are marked for capture.[/yellow]"
+        )
+        return store if store is not None else {}
+
+    collected: Dict[str, List[torch.Tensor]] = {}
+
+    def collect(activations: Dict[str, torch.Tensor], num_samples: int) -> None:
+        for module_path, tensor in activations.items():
+            collected.setdefault(module_path, []).append(tensor)
+
+    writer = None
+    if store is not None and num_writers > 0:
+        writer = ShardWriter(store, num_writers, max_pending_shards)
+        capture.attach_writer(writer, shard_size)
+
+    console.print(
+        f"Capturing activations for {len(capture.module_specs)} modules "
+        f"(positions: {capture.capture_spec.get('positions', 'all')})..."
+    )
+    total_samples = run_capture_loop(
+        model,
+        batches,
+        capture,
+        shard_size,
+        store,
+        writer,
+        on_shard=collect if store is None else None,
+    )
+
+    console.print(
+        f"[green]Observation complete. Processed {total_samples} samples.[/green]"
+    )
+    if writer is not None:
+        console.print(
+            f"Wrote {writer.stats['shards']} shards in the background "
+            f"({writer.stats['write_s']:.2f}s writing, forward pass waited {writer.stats['blocked_s']:.2f}s)."
+        )
+    if store is not None:
+        projection_states = capture.projection_states()
+        if projection_states:
+            store.write_projections(projection_states)
+        return store
+    return {path: torch.cat(parts, dim=0) for path, parts in collected.items()}
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import weakref
+from collections import OrderedDict
+from typing import List
+
+from transformers import AutoModel  # For type hinting
+from rich.console import Console
+
+from lmsteer.app.model_utils import ModuleNode
+from lmsteer.app.rules import Rule, compile_rules_to_steering_config
+
+
+# Tree fingerprints are cached per model/tree object, since hashing every leaf
+# path would otherwise dominate the cost of a cache hit. A model's entry also
+# records the ids of its modules, so any in-place module swap is noticed.
+_tree_fingerprints = weakref.WeakKeyDictionary()
+
+
+def rules_fingerprint(defined_rules: List[Rule]) -> str:
+    """Returns a stable hash of the rule list.
+
+    Rule order is part of the hash, since the last defined rule wins within a category.
+    """
+    payload = json.dumps(list(defined_rules), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def tree_fingerprint(model: AutoModel, module_root: ModuleNode | None = None) -> str:
+    """Returns a stable hash of the model's leaf module paths and types."""
+    key_object = module_root if module_root is not None else model
+    # ModuleNode trees are snapshots; a live model may have had modules swapped.
+    module_ids = tuple(map(id, model.modules())) if module_root is None else None
+    cached = _tree_fingerprints.get(key_object)
+    if cached is not None and cached[0] == module_ids:
+        return cached[1]
+
+    if module_root is not None:
+        leaves = module_root.iter_leaves()
+    else:
+        leaves = (
+            (name, type(module).__name__)
+            for name, module in model.named_modules()
+            if not list(module.children())
+        )
+    digest = hashlib.sha256()
+    for module_path, module_type in leaves:
+        digest.update(f"{module_path}\0{module_type}\n".encode("utf-8"))
+    fingerprint = digest.hexdigest()
+    _tree_fingerprints[key_object] = (module_ids, fingerprint)
+    return fingerprint
+
+
+class CompileCache:
+    """Memoizes compile_rules_to_steering_config by rule and tree fingerprint.
+
+    Results live in an in-process LRU and, if cache_dir is set, are also
+    persisted as JSON so later processes can skip compilation. Returned
+    configs are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, maxsize: int = 128, cache_dir: str | None = None):
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def cache_key(
+        self,
+        defined_rules: List[Rule],
+        model: AutoModel,
+        module_root: ModuleNode | None = None,
+    ) -> str:
+        return f"{rules_fingerprint(defined_rules)[:32]}-{tree_fingerprint(model, module_root)[:32]}"
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load_from_disk(self, key: str) -> dict | None:
+        if self.cache_dir is None:
+            return None
+        try:
+            with open(self._disk_path(key), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            # A missing or corrupt entry is just a cache miss.
+            return None
+
+    def _save_to_disk(self, key: str, steering_config: dict) -> None:
+        if self.cache_dir is None:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = self._disk_path(key) + f".{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(steering_config, f)
+            os.replace(tmp_path, self._disk_path(key))
+        except OSError:
+            pass  # The on-disk cache is best effort
+
+    def _remember(self, key: str, steering_config: dict) -> None:
+        self._entries[key] = steering_config
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def compile(
+        self,
+        defined_rules: List[Rule],
+        model: AutoModel,
+        console: Console,
+        module_root: ModuleNode | None = None,
+    ) -> dict:
+        """Returns the compiled steering config, compiling only on a cache miss."""
+        key = self.cache_key(defined_rules, model, module_root)
+        steering_config = self._entries.get(key)
+        if steering_config is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return steering_config
+
+        steering_config = self._load_from_disk(key)
+        if steering_config is None:
+            self.misses += 1
+            steering_config = compile_rules_to_steering_config(
+                defined_rules, model, console, module_root=module_root
+            )
+            self._save_to_disk(key, steering_config)
+        else:
+            self.hits += 1
+        self._remember(key, steering_config)
+        return steering_config
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+_default_cache = CompileCache()
+
+
+def compile_rules_cached(
+    defined_rules: List[Rule],
+    model: AutoModel,
+    console: Console,
+    module_root: ModuleNode | None = None,
+) -> dict:
+    """compile_rules_to_steering_config memoized in the process-wide CompileCache."""
+    return _default_cache.compile(defined_rules, model, console, module_root)
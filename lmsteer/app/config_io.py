@@ -1,8 +1,18 @@
+import hashlib
 import json
 import os
+from typing import Dict
+
+import torch
 from rich.console import Console  # For status messages
 
 
+def steering_config_hash(steering_config: dict) -> str:
+    """Returns a stable hash of a steering configuration (independent of key order)."""
+    payload = json.dumps(steering_config, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
 def save_steering_config(
     steering_config: dict,
     model_name: str,
@@ -44,3 +54,44 @@ def save_steering_config(
         console.print(
             f"[bold red]An unexpected error occurred while saving configuration: {e}[/bold red]"
         )
+
+
+def save_steering_vectors(
+    steering_vectors: Dict[str, torch.Tensor],
+    steering_config: dict,
+    file_path: str,
+    console: Console,
+) -> None:
+    """Saves steering vectors to a file aligned with the steering configuration.
+
+    Vectors are stored in steering config order together with the config hash,
+    so a vector file can be checked against the config it was computed for.
+    """
+    module_paths = [path for path in steering_config if path in steering_vectors]
+    payload = {
+        "config_hash": steering_config_hash(steering_config),
+        "module_paths": module_paths,
+        "vectors": {path: steering_vectors[path].contiguous() for path in module_paths},
+    }
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+        torch.save(payload, file_path)
+        console.print(f"Saved {len(module_paths)} steering vectors to {file_path}")
+    except Exception as e:
+        console.print(
+            f"[bold red]Error saving steering vectors to {file_path}: {e}[/bold red]"
+        )
+
+
+def load_steering_vectors(
+    file_path: str, steering_config: dict | None = None
+) -> Dict[str, torch.Tensor]:
+    """Loads steering vectors, checking them against a steering config if one is given."""
+    payload = torch.load(file_path, weights_only=True)
+    if steering_config is not None and payload["config_hash"] != steering_config_hash(
+        steering_config
+    ):
+        raise ValueError(
+            f"Steering vectors in {file_path} were computed for a different steering configuration."
+        )
+    return payload["vectors"]
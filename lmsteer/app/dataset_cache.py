@@ -0,0 +1,336 @@
+import copy
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import threading
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List
+
+import torch
+from rich.console import Console  # For status messages
+
+
+CACHE_FORMAT_VERSION = 1
+FINGERPRINTS_FILE_NAME = "dataset_fingerprints.json"
+
+
+def iter_dataset_texts(dataset_path: str, text_field: str = "text") -> Iterator[str]:
+    """Lazily yields prompts from a JSONL file (one object per line) or a text file (one prompt per line)."""
+    is_jsonl = dataset_path.endswith((".jsonl", ".ndjson"))
+    with open(dataset_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip():
+                continue
+            if is_jsonl:
+                record = json.loads(line)
+                yield record[text_field] if isinstance(record, dict) else str(record)
+            else:
+                yield line
+
+
+def dataset_fingerprint(dataset_path: str, text_field: str = "text") -> str:
+    """Hashes the dataset file contents (streamed in chunks) and the text field."""
+    digest = hashlib.sha256(text_field.encode("utf-8") + b"\0")
+    with open(dataset_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_dataset_fingerprint(
+    cache_root: str, dataset_path: str, text_field: str = "text"
+) -> str:
+    """Returns dataset_fingerprint, re-hashing the file only when its size or mtime changed.
+
+    Known fingerprints are kept in ``dataset_fingerprints.json`` under the
+    cache root, keyed on the absolute path and text field.
+    """
+    fingerprints_path = os.path.join(cache_root, FINGERPRINTS_FILE_NAME)
+    fingerprints = {}
+    if os.path.exists(fingerprints_path):
+        with open(fingerprints_path, "r") as f:
+            fingerprints = json.load(f)
+    key = f"{os.path.abspath(dataset_path)}\0{text_field}"
+    stat = os.stat(dataset_path)
+    entry = fingerprints.get(key)
+    if (
+        entry is not None
+        and entry["size"] == stat.st_size
+        and entry["mtime_ns"] == stat.st_mtime_ns
+    ):
+        return entry["sha256"]
+
+    fingerprint = dataset_fingerprint(dataset_path, text_field)
+    fingerprints[key] = {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": fingerprint,
+    }
+    os.makedirs(cache_root, exist_ok=True)
+    tmp_path = f"{fingerprints_path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w") as f:
+        json.dump(fingerprints, f, indent=2)
+    os.replace(tmp_path, fingerprints_path)
+    return fingerprint
+
+
+def tokenizer_fingerprint(tokenizer) -> str:
+    """Hashes everything that determines a tokenizer's output.
+
+    Fast tokenizers serialize their full pipeline (normalizer, pre-tokenizer,
+    model, post-processor); slow ones fall back to the vocabulary.
+    """
+    digest = hashlib.sha256(type(tokenizer).__name__.encode("utf-8"))
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is not None:
+        digest.update(backend.to_str().encode("utf-8"))
+    else:
+        digest.update(json.dumps(sorted(tokenizer.get_vocab().items())).encode("utf-8"))
+    special_tokens = getattr(tokenizer, "special_tokens_map", {})
+    digest.update(
+        json.dumps(special_tokens, sort_keys=True, default=str).encode("utf-8")
+    )
+    return digest.hexdigest()
+
+
+class TokenizedDataset:
+    """Token IDs and lengths of a tokenized dataset, memory-mapped from the cache.
+
+    ``tokens.bin`` holds every sample's token IDs back to back (int32) and
+    ``lengths.bin`` the per-sample lengths (int64). Opening a cached dataset
+    only maps the files; pages are read as samples are accessed.
+    """
+
+    TOKENS_FILE_NAME = "tokens.bin"
+    LENGTHS_FILE_NAME = "lengths.bin"
+    META_FILE_NAME = "meta.json"
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        with open(os.path.join(cache_dir, self.META_FILE_NAME), "r") as f:
+            self.metadata = json.load(f)
+        self.num_samples = self.metadata["num_samples"]
+        self.num_tokens = self.metadata["num_tokens"]
+        self.lengths = self._map(self.LENGTHS_FILE_NAME, self.num_samples, torch.int64)
+        self.tokens = self._map(self.TOKENS_FILE_NAME, self.num_tokens, torch.int32)
+        self.offsets = torch.zeros(self.num_samples + 1, dtype=torch.int64)
+        torch.cumsum(self.lengths, dim=0, out=self.offsets[1:])
+
+    def _map(self, file_name: str, size: int, dtype: torch.dtype) -> torch.Tensor:
+        if size == 0:
+            return torch.empty(0, dtype=dtype)
+        return torch.from_file(
+            os.path.join(self.cache_dir, file_name),
+            shared=False,
+            size=size,
+            dtype=dtype,
+        )
+
+    def __len__(self) -> int:
+        return self.num_samples
+
+    def __getitem__(self, index: int) -> torch.Tensor:
+        """Returns the token IDs of one sample (a view into the memory map)."""
+        if index < 0:
+            index += self.num_samples
+        if not 0 <= index < self.num_samples:
+            raise IndexError(
+                f"Sample {index} out of range for {self.num_samples} samples"
+            )
+        return self.tokens[self.offsets[index] : self.offsets[index + 1]]
+
+    def iter_batches(
+        self,
+        batch_size: int = 8,
+        pad_token_id: int = 0,
+        padding_side: str = "right",
+        start: int = 0,
+    ) -> Iterator[dict]:
+        """Yields padded batches in the same format as iter_tokenized_batches."""
+        for batch_start in range(start, self.num_samples, batch_size):
+            batch_end = min(batch_start + batch_size, self.num_samples)
+            lengths = self.lengths[batch_start:batch_end]
+            max_len = int(lengths.max()) if len(lengths) else 0
+            input_ids = torch.full(
+                (batch_end - batch_start, max_len), pad_token_id, dtype=torch.long
+            )
+            attention_mask = torch.zeros(
+                (batch_end - batch_start, max_len), dtype=torch.long
+            )
+            for row, index in enumerate(range(batch_start, batch_end)):
+                length = int(self.lengths[index])
+                if padding_side == "left":
+                    columns = slice(max_len - length, max_len)
+                else:
+                    columns = slice(0, length)
+                input_ids[row, columns] = self[index]
+                attention_mask[row, columns] = 1
+            yield {"input_ids": input_ids, "attention_mask": attention_mask}
+
+
+def _tokenize_chunk(
+    tokenizer, texts: List[str], max_length: int | None
+) -> List[List[int]]:
+    encoded = tokenizer(
+        texts,
+        truncation=max_length is not None,
+        max_length=max_length,
+        padding=False,
+    )
+    return encoded["input_ids"]
+
+
+def build_tokenized_dataset(
+    tokenizer,
+    texts: Iterator[str],
+    cache_dir: str,
+    metadata: dict | None = None,
+    max_length: int | None = 512,
+    chunk_size: int = 1024,
+    num_workers: int = 4,
+) -> TokenizedDataset:
+    """Tokenizes texts in parallel chunks and writes them to cache_dir.
+
+    Chunks are tokenized by a thread pool (fast tokenizers release the GIL)
+    with a bounded number in flight; every thread uses its own copy of the
+    tokenizer, since a Rust tokenizer must not be called from several
+    threads at once, and appended to the cache files in
+    dataset order. Everything is written to a temporary directory that is
+    renamed into place at the end, so an interrupted build never leaves a
+    half-written cache behind.
+    """
+    partial_dir = f"{cache_dir}.partial-{os.getpid()}"
+    shutil.rmtree(partial_dir, ignore_errors=True)
+    os.makedirs(partial_dir)
+    num_samples = 0
+    num_tokens = 0
+    local = threading.local()
+
+    def tokenize(chunk: List[str]) -> List[List[int]]:
+        if not hasattr(local, "tokenizer"):
+            local.tokenizer = copy.deepcopy(tokenizer)
+        return _tokenize_chunk(local.tokenizer, chunk, max_length)
+
+    def chunks() -> Iterator[List[str]]:
+        chunk = []
+        for text in texts:
+            chunk.append(text)
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    try:
+        with (
+            open(
+                os.path.join(partial_dir, TokenizedDataset.TOKENS_FILE_NAME), "wb"
+            ) as tokens_file,
+            open(
+                os.path.join(partial_dir, TokenizedDataset.LENGTHS_FILE_NAME), "wb"
+            ) as lengths_file,
+            ThreadPoolExecutor(max_workers=max(1, num_workers)) as executor,
+        ):
+            in_flight = deque()
+
+            def write_oldest() -> None:
+                nonlocal num_samples, num_tokens
+                token_ids = in_flight.popleft().result()
+                # array() packs the Python ints straight into native int32/int64 bytes.
+                flat = array("i", itertools.chain.from_iterable(token_ids))
+                tokens_file.write(flat)
+                lengths_file.write(array("q", map(len, token_ids)))
+                num_samples += len(token_ids)
+                num_tokens += len(flat)
+
+            for chunk in chunks():
+                in_flight.append(executor.submit(tokenize, chunk))
+                if len(in_flight) >= 2 * max(1, num_workers):
+                    write_oldest()
+            while in_flight:
+                write_oldest()
+
+        with open(os.path.join(partial_dir, TokenizedDataset.META_FILE_NAME), "w") as f:
+            json.dump(
+                {
+                    **(metadata or {}),
+                    "format_version": CACHE_FORMAT_VERSION,
+                    "num_samples": num_samples,
+                    "num_tokens": num_tokens,
+                    "max_length": max_length,
+                },
+                f,
+                indent=2,
+            )
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        os.replace(partial_dir, cache_dir)
+    except BaseException:
+        shutil.rmtree(partial_dir, ignore_errors=True)
+        raise
+    return TokenizedDataset(cache_dir)
+
+
+def tokenized_cache_dir(
+    cache_root: str,
+    tokenizer,
+    dataset_path: str,
+    text_field: str = "text",
+    max_length: int | None = 512,
+) -> str:
+    """Returns the cache directory for a (tokenizer, dataset, max_length) combination."""
+    tokenizer_hash = tokenizer_fingerprint(tokenizer)[:16]
+    dataset_hash = cached_dataset_fingerprint(cache_root, dataset_path, text_field)[:16]
+    return os.path.join(
+        cache_root, f"{tokenizer_hash}-{dataset_hash}-{max_length or 'full'}"
+    )
+
+
+def load_or_build_tokenized_dataset(
+    tokenizer,
+    dataset_path: str,
+    cache_root: str,
+    console: Console,
+    text_field: str = "text",
+    max_length: int | None = 512,
+    chunk_size: int = 1024,
+    num_workers: int = 4,
+) -> TokenizedDataset:
+    """Opens the cached tokenization of a dataset, tokenizing it first on a cache miss."""
+    cache_dir = tokenized_cache_dir(
+        cache_root, tokenizer, dataset_path, text_field, max_length
+    )
+    meta_path = os.path.join(cache_dir, TokenizedDataset.META_FILE_NAME)
+    if os.path.exists(meta_path):
+        dataset = TokenizedDataset(cache_dir)
+        if dataset.metadata.get("format_version") == CACHE_FORMAT_VERSION:
+            console.print(
+                f"Using cached tokens for [bold cyan]{dataset_path}[/bold cyan] "
+                f"({dataset.num_samples} samples, {dataset.num_tokens} tokens)."
+            )
+            return dataset
+
+    console.print(
+        f"Tokenizing [bold cyan]{dataset_path}[/bold cyan] into {cache_dir}..."
+    )
+    os.makedirs(cache_root, exist_ok=True)
+    dataset = build_tokenized_dataset(
+        tokenizer,
+        iter_dataset_texts(dataset_path, text_field),
+        cache_dir,
+        metadata={
+            "dataset_path": os.path.abspath(dataset_path),
+            "text_field": text_field,
+        },
+        max_length=max_length,
+        chunk_size=chunk_size,
+        num_workers=num_workers,
+    )
+    console.print(
+        f"[green]Cached {dataset.num_samples} samples ({dataset.num_tokens} tokens).[/green]"
+    )
+    return dataset
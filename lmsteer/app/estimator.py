@@ -0,0 +1,322 @@
+import copy
+from typing import Dict, List, TypedDict
+
+import torch
+
+from lmsteer.app.capture import CAPTURE_ACTION, CaptureSpec, DEFAULT_CAPTURE_SPEC
+from lmsteer.app.model_utils import ModuleNode
+from lmsteer.app.precision import model_memory_bytes
+
+
+# Output shape and dtype of one module, recorded during the meta-device dry run.
+class ModuleShape(TypedDict):
+    output_shape: List[int]  # Shape for the dry-run batch, e.g. [batch, seq, hidden]
+    dtype: str
+    element_size: int  # Bytes per element
+    token_aligned: bool  # True if the output is [batch, seq, ...]
+
+
+# Projected cost of capturing a steering config over a dataset.
+class CaptureCost(TypedDict):
+    num_samples: int
+    module_bytes: Dict[str, int]  # Total bytes stored per captured module
+    total_bytes: int
+    bytes_per_sample: int
+    weights_bytes: int
+    peak_ram_bytes: int
+    batch_size: int
+    shard_size: int
+    num_writers: int  # Background shard writers (0 writes synchronously)
+    max_pending_shards: int
+
+
+def format_bytes(num_bytes: float) -> str:
+    """Formats a byte count with a binary unit suffix (e.g. '1.5 MiB')."""
+    for unit in ("B", "KiB", "MiB", "GiB", "TiB"):
+        if abs(num_bytes) < 1024 or unit == "TiB":
+            return (
+                f"{num_bytes:.0f} {unit}" if unit == "B" else f"{num_bytes:.1f} {unit}"
+            )
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} TiB"
+
+
+def _first_tensor(output):
+    # Module outputs may be tensors, tuples, or Hugging Face ModelOutput objects.
+    if isinstance(output, torch.Tensor):
+        return output
+    if hasattr(output, "to_tuple"):
+        output = output.to_tuple()
+    if isinstance(output, (tuple, list)):
+        for item in output:
+            if isinstance(item, torch.Tensor):
+                return item
+    return None
+
+
+def _meta_model(model: torch.nn.Module) -> torch.nn.Module:
+    """Returns a copy of the model whose parameters live on the meta device."""
+    if all(p.is_meta for p in model.parameters()):
+        return model
+    if hasattr(model, "config"):
+        # Hugging Face models can be re-instantiated from their config without
+        # allocating (or copying) any weights. They come back in float32, so
+        # cast to the source dtype to get the activation dtype right (bf16 etc.).
+        with torch.device("meta"):
+            meta_model = type(model)(model.config)
+        dtype = next(
+            (p.dtype for p in model.parameters() if p.is_floating_point()), None
+        )
+        return meta_model.to(dtype) if dtype is not None else meta_model
+    return copy.deepcopy(model).to("meta")
+
+
+def dry_run_output_shapes(
+    model_root: ModuleNode, batch_size: int = 1, seq_len: int = 128
+) -> Dict[str, ModuleShape]:
+    """Records the output shape of every module via a forward pass on the meta device.
+
+    No weights are loaded or computed on: only shapes and dtypes propagate, so
+    this is cheap even for models that would not fit in memory.
+    """
+    meta_model = _meta_model(model_root.module)
+    shapes: Dict[str, ModuleShape] = {}
+    handles = []
+
+    def make_hook(module_path: str):
+        def hook(module, inputs, output):
+            tensor = _first_tensor(output)
+            if tensor is None:
+                return
+            shape = list(tensor.shape)
+            shapes[module_path] = {
+                "output_shape": shape,
+                "dtype": str(tensor.dtype).replace("torch.", ""),
+                "element_size": tensor.element_size(),
+                "token_aligned": len(shape) >= 2 and shape[:2] == [batch_size, seq_len],
+            }
+
+        return hook
+
+    for module_path, module in meta_model.named_modules():
+        handles.append(module.register_forward_hook(make_hook(module_path)))
+    try:
+        input_ids = torch.zeros((batch_size, seq_len), dtype=torch.long, device="meta")
+        with torch.no_grad():
+            meta_model(input_ids=input_ids)
+    finally:
+        for handle in handles:
+            handle.remove()
+    return shapes
+
+
+class CaptureEstimator:
+    """Predicts the size and memory footprint of an observation run.
+
+    Shapes come from a meta-device dry run of the model, so the estimator can
+    be built from the ModuleNode tree of a model without touching its weights.
+    """
+
+    def __init__(
+        self,
+        model_root: ModuleNode,
+        seq_len: int = 128,
+        capture_spec: CaptureSpec | None = None,
+    ):
+        self.model_root = model_root
+        self.seq_len = seq_len
+        self.capture_spec = capture_spec or DEFAULT_CAPTURE_SPEC
+        self.module_shapes = dry_run_output_shapes(model_root, 1, seq_len)
+        # Includes packed int8 weights, which are neither parameters nor buffers.
+        self.weights_bytes = model_memory_bytes(model_root.module)
+
+    def _selected_positions(self, capture_spec: CaptureSpec) -> int:
+        # "all", "token_ids" and "mask" can select at most every token; treat
+        # them as an upper bound since the actual count depends on the data.
+        if capture_spec.get("positions", "all") in ("last", "first"):
+            return 1
+        return self.seq_len
+
+    def output_bytes_per_sample(self, module_path: str) -> int:
+        """Bytes of the full module output for one sample."""
+        shape = self.module_shapes.get(module_path)
+        if shape is None:
+            return 0
+        numel = 1
+        for dim in shape["output_shape"]:
+            numel *= dim
+        return numel * shape["element_size"]
+
+    def capture_bytes_per_sample(
+        self, module_path: str, capture_spec: CaptureSpec | None = None
+    ) -> int:
+        """Bytes stored per sample for one module under a capture spec."""
+        shape = self.module_shapes.get(module_path)
+        if shape is None:
+            return 0
+        if not shape["token_aligned"]:
+            return self.output_bytes_per_sample(module_path)
+        row_numel = 1
+        for dim in shape["output_shape"][2:]:
+            row_numel *= dim
+        positions = self._selected_positions(capture_spec or self.capture_spec)
+        return positions * row_numel * shape["element_size"]
+
+    def _forward_bytes_per_sample(self) -> int:
+        # Without autograd, intermediate outputs are freed as the forward pass
+        # moves on; the working set is dominated by the largest input/output
+        # pair alive at once. This is a heuristic, not an exact bound.
+        largest = max(
+            (
+                self.output_bytes_per_sample(path)
+                for path in self.module_shapes
+                if path  # The root output is returned, not a working buffer
+            ),
+            default=0,
+        )
+        return 2 * largest
+
+    def _captured_modules(self, steering_config: dict) -> Dict[str, CaptureSpec]:
+        return {
+            path: entry.get("capture_spec") or self.capture_spec
+            for path, entry in steering_config.items()
+            if entry.get("action") == CAPTURE_ACTION
+        }
+
+    @staticmethod
+    def _buffered_shards(num_writers: int, max_pending_shards: int) -> int:
+        # A ShardWriter keeps max_pending + 1 staging sets of one shard each, and
+        # every writer thread holds a copy of the shard it is serializing.
+        if num_writers <= 0:
+            return 1
+        return max_pending_shards + 1 + num_writers
+
+    def peak_ram_bytes(
+        self,
+        steering_config: dict,
+        batch_size: int,
+        shard_size: int,
+        num_writers: int = 2,
+        max_pending_shards: int = 2,
+    ) -> int:
+        captured = self._captured_modules(steering_config)
+        captured_per_sample = sum(
+            self.capture_bytes_per_sample(path, spec) for path, spec in captured.items()
+        )
+        # A shard holds up to shard_size samples plus the batch that overflows it.
+        shard_bytes = (shard_size + batch_size) * captured_per_sample
+        return (
+            self.weights_bytes
+            + batch_size * self._forward_bytes_per_sample()
+            + self._buffered_shards(num_writers, max_pending_shards) * shard_bytes
+        )
+
+    def estimate(
+        self,
+        steering_config: dict,
+        num_samples: int,
+        batch_size: int = 8,
+        shard_size: int = 1024,
+        num_writers: int = 2,
+        max_pending_shards: int = 2,
+    ) -> CaptureCost:
+        """Projects stored bytes and peak RAM for capturing a steering config.
+
+        ``num_writers`` and ``max_pending_shards`` are the run_observation
+        settings; background writers keep several shards in memory at once.
+        """
+        captured = self._captured_modules(steering_config)
+        module_bytes = {
+            path: self.capture_bytes_per_sample(path, spec) * num_samples
+            for path, spec in captured.items()
+        }
+        bytes_per_sample = sum(
+            self.capture_bytes_per_sample(path, spec) for path, spec in captured.items()
+        )
+        return {
+            "num_samples": num_samples,
+            "module_bytes": module_bytes,
+            "total_bytes": sum(module_bytes.values()),
+            "bytes_per_sample": bytes_per_sample,
+            "weights_bytes": self.weights_bytes,
+            "peak_ram_bytes": self.peak_ram_bytes(
+                steering_config,
+                batch_size,
+                min(shard_size, num_samples),
+                num_writers,
+                max_pending_shards,
+            ),
+            "batch_size": batch_size,
+            "shard_size": shard_size,
+            "num_writers": num_writers,
+            "max_pending_shards": max_pending_shards,
+        }
+
+    def plan(
+        self,
+        steering_config: dict,
+        num_samples: int,
+        memory_budget_bytes: int,
+        max_batch_size: int = 256,
+        shard_budget_fraction: float = 0.5,
+        num_writers: int = 2,
+        max_pending_shards: int = 2,
+    ) -> CaptureCost:
+        """Picks the largest batch size and shard size that fit a memory budget.
+
+        At most ``shard_budget_fraction`` of the memory left after the weights is
+        reserved for buffered shards (every staging set and writer copy of the
+        ShardWriter configured by ``num_writers``/``max_pending_shards``); the batch size is then the largest power
+        of two whose forward pass fits in the remainder. Raises ValueError if not
+        even a single sample fits.
+        """
+        available = memory_budget_bytes - self.weights_bytes
+        if available <= 0:
+            raise ValueError(
+                f"Memory budget of {format_bytes(memory_budget_bytes)} does not fit "
+                f"the model weights ({format_bytes(self.weights_bytes)})."
+            )
+
+        captured_per_sample = self.estimate(steering_config, 1)["bytes_per_sample"]
+        if captured_per_sample:
+            shard_size = int(available * shard_budget_fraction) // (
+                captured_per_sample
+                * self._buffered_shards(num_writers, max_pending_shards)
+            )
+        else:
+            shard_size = num_samples
+        shard_size = max(1, min(shard_size, num_samples))
+
+        batch_size = 1
+        while (
+            batch_size * 2 <= min(max_batch_size, num_samples, shard_size)
+            and self.peak_ram_bytes(
+                steering_config,
+                batch_size * 2,
+                shard_size,
+                num_writers,
+                max_pending_shards,
+            )
+            <= memory_budget_bytes
+        ):
+            batch_size *= 2
+        if (
+            self.peak_ram_bytes(
+                steering_config, batch_size, shard_size, num_writers, max_pending_shards
+            )
+            > memory_budget_bytes
+        ):
+            raise ValueError(
+                f"Memory budget of {format_bytes(memory_budget_bytes)} is too small "
+                "to process a single sample."
+            )
+        # Shards hold whole batches, since shards are only flushed between batches.
+        shard_size -= shard_size % batch_size
+        return self.estimate(
+            steering_config,
+            num_samples,
+            batch_size,
+            shard_size,
+            num_writers,
+            max_pending_shards,
+        )
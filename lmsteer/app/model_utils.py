@@ -1,16 +1,113 @@
-from transformers import AutoModel, AutoTokenizer
+import torch
+from transformers import AutoModel, AutoModelForCausalLM, AutoTokenizer
 from rich.console import Console  # Keep for load_model_and_tokenizer status messages
 
+from lmsteer.app.precision import PRECISIONS, convert_precision
+
+
+# Structure shared by every isomorphic module subtree (e.g. all GPT2Block instances).
+# Templates are hash-consed: two subtrees with the same module types and child
+# names resolve to the very same ModuleTemplate object.
+class ModuleTemplate:
+    def __init__(self, module_type, children):
+        self.module_type = module_type
+        self.children = children  # List of (name_suffix, ModuleTemplate)
+        self.is_leaf = not children
+        self._leaf_paths = None
+
+    def leaf_paths(self):
+        """Returns (relative_path, module_type) for every leaf below this template."""
+        if self._leaf_paths is None:
+            leaf_paths = []
+            for name_suffix, child_template in self.children:
+                if child_template.is_leaf:
+                    leaf_paths.append((name_suffix, child_template.module_type))
+                else:
+                    for relative_path, module_type in child_template.leaf_paths():
+                        leaf_paths.append(
+                            (f"{name_suffix}.{relative_path}", module_type)
+                        )
+            self._leaf_paths = leaf_paths
+        return self._leaf_paths
+
+
+class _TemplateRegistry:
+    """Hash-conses ModuleTemplates and remembers the template of each module visited."""
+
+    def __init__(self):
+        self.templates = {}
+        self._by_module = {}
+
+    def template_for(self, module) -> ModuleTemplate:
+        template = self._by_module.get(id(module))
+        if template is not None:
+            return template
+        children = [
+            (name_suffix, self.template_for(child_module))
+            for name_suffix, child_module in module.named_children()
+        ]
+        # Child templates are canonical, so their identity is a valid structural key.
+        key = (
+            type(module).__name__,
+            tuple((name_suffix, id(child)) for name_suffix, child in children),
+        )
+        template = self.templates.get(key)
+        if template is None:
+            template = ModuleTemplate(type(module).__name__, children)
+            self.templates[key] = template
+        self._by_module[id(module)] = template
+        return template
+
+
+# A run of sibling modules sharing one template, e.g. transformer.h.0 ... h.11.
+class TemplateGroup:
+    def __init__(self, parent_node, template, instances):
+        self.parent_node = parent_node
+        self.template = template
+        self.instances = instances  # Instance ModuleNodes, in module order
+
+    def path_pattern(self, relative_path: str = "") -> str:
+        """Returns a glob matching the given relative path in every instance."""
+        parent_full_path = self.parent_node.get_full_path()
+        pattern = f"{parent_full_path}.*" if parent_full_path else "*"
+        return f"{pattern}.{relative_path}" if relative_path else pattern
+
 
 # Simplified node for internal tree representation, independent of Rich
 class ModuleNode:
-    def __init__(self, name, module, parent_node=None):
+    def __init__(
+        self, name, module, parent_node=None, template=None, instance_index=None
+    ):
         self.name = name
         self.module = module
         self.module_type = type(module).__name__
         self.parent_node = parent_node
-        self.children = []
-        self.is_leaf = not list(module.children())
+        # Nodes built from a shared template materialize their children lazily;
+        # instance_index is the position of this node within its TemplateGroup.
+        self.template = template
+        self.instance_index = instance_index
+        self.template_groups = []
+        self._children = None if template is not None else []
+        if template is not None:
+            self.is_leaf = template.is_leaf
+        else:
+            self.is_leaf = not list(module.children())
+
+    @property
+    def children(self):
+        if self._children is None:
+            self._children = [
+                ModuleNode(
+                    name=name_suffix,
+                    module=child_module,
+                    parent_node=self,
+                    template=child_template,
+                )
+                for (name_suffix, child_module), (_, child_template) in zip(
+                    self.module.named_children(), self.template.children
+                )
+            ]
+        return self._children
 
     def add_child(self, child_node):
         self.children.append(child_node)
@@ -25,32 +122,111 @@ class ModuleNode:
         else:  # Parent is the root ModuleNode
             return self.name
 
+    def iter_leaves(self):
+        """Yields (full_path, module_type) for every leaf below this node.
+
+        Subtrees built from a shared template are expanded from the template's
+        leaf list, without materializing their ModuleNodes.
+        """
+        full_path = self.get_full_path()
+        if self.is_leaf:
+            if full_path:
+                yield full_path, self.module_type
+            return
+        if self._children is None:
+            for relative_path, module_type in self.template.leaf_paths():
+                yield (
+                    f"{full_path}.{relative_path}" if full_path else relative_path,
+                    module_type,
+                )
+            return
+        for child_node in self._children:
+            yield from child_node.iter_leaves()
+
+
+def _build_module_tree_recursive(
+    module_to_inspect,
+    parent_module_node: ModuleNode,
+    registry: _TemplateRegistry | None = None,
+):
+    named_children = list(module_to_inspect.named_children())
+
+    # Siblings that share a template with at least one other sibling become
+    # instances of a TemplateGroup, holding only an index overlay on the template.
+    shared_templates = {}
+    if registry is not None:
+        sibling_counts = {}
+        for name_suffix, child_module in named_children:
+            if list(child_module.children()):
+                template = registry.template_for(child_module)
+                shared_templates[name_suffix] = template
+                sibling_counts[id(template)] = sibling_counts.get(id(template), 0) + 1
+        shared_templates = {
+            name_suffix: template
+            for name_suffix, template in shared_templates.items()
+            if sibling_counts[id(template)] > 1
+        }
+
+    groups = {}
+    for name_suffix, child_module in named_children:
+        template = shared_templates.get(name_suffix)
+        if template is not None:
+            group = groups.get(id(template))
+            if group is None:
+                group = TemplateGroup(parent_module_node, template, [])
+                groups[id(template)] = group
+                parent_module_node.template_groups.append(group)
+            child_node = ModuleNode(
+                name=name_suffix,
+                module=child_module,
+                parent_node=parent_module_node,
+                template=template,
+                instance_index=len(group.instances),
+            )
+            group.instances.append(child_node)
+            parent_module_node.add_child(child_node)
+            continue
 
-def _build_module_tree_recursive(module_to_inspect, parent_module_node: ModuleNode):
-    for name_suffix, child_module in module_to_inspect.named_children():
         child_node = ModuleNode(
             name=name_suffix, module=child_module, parent_node=parent_module_node
         )
         parent_module_node.add_child(child_node)
         if list(child_module.children()):  # If it's not a leaf, recurse
-            _build_module_tree_recursive(child_module, child_node)
+            _build_module_tree_recursive(child_module, child_node, registry)
 
 
-def build_module_tree(model: AutoModel) -> ModuleNode:
-    """Builds an internal tree representation of the model's modules."""
+def build_module_tree(model: AutoModel, share_templates: bool = False) -> ModuleNode:
+    """Builds an internal tree representation of the model's modules.
+
+    With share_templates=True, repeated sibling subtrees (such as the blocks of
+    a transformer) are detected and stored once as a shared ModuleTemplate; each
+    block only gets a lightweight instance node whose children are built on demand.
+    """
     model_class_name = type(model).__name__
     # The root ModuleNode represents the model itself.
     # Its name is the model class name for potential display, its path is effectively empty.
     root_internal_node = ModuleNode(
         name=model_class_name, module=model, parent_node=None
     )
-    _build_module_tree_recursive(model, root_internal_node)
+    registry = _TemplateRegistry() if share_templates else None
+    _build_module_tree_recursive(model, root_internal_node, registry)
     return root_internal_node
 
 
-def load_model_and_tokenizer(model_name: str, console: Console):
-    """Loads the specified Hugging Face model and tokenizer."""
+def load_model_and_tokenizer(
+    model_name: str, console: Console, causal_lm: bool = False, precision: str = "fp32"
+):
+    """Loads the specified Hugging Face model and tokenizer.
+
+    With causal_lm=True the model is loaded with its language modeling head
+    (AutoModelForCausalLM), as needed for generation. precision selects the
+    CPU compute precision ("fp32", "bf16" or "int8", see precision.py).
+    """
     try:
+        if precision not in PRECISIONS:
+            raise ValueError(
+                f"Unknown precision '{precision}', expected one of {PRECISIONS}"
+            )
         console.print(f"Loading model: [bold cyan]{model_name}[/bold cyan]...")
         tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
         if tokenizer.pad_token is None:
@@ -73,7 +249,18 @@ def load_model_and_tokenizer(model_name: str, console: Console):
                     f"Tokenizer for [bold cyan]{model_name}[/bold cyan] did not have a pad_token. Added a new pad_token [bold green]'[PAD]'[/bold green]."
                 )
 
-        model = AutoModel.from_pretrained(model_name, trust_remote_code=True)
+        model_class = AutoModelForCausalLM if causal_lm else AutoModel
+        # bf16 weights are loaded directly, without an fp32 copy in memory.
+        torch_dtype = torch.bfloat16 if precision == "bf16" else None
+        model = model_class.from_pretrained(
+            model_name, trust_remote_code=True, torch_dtype=torch_dtype
+        )
+        if precision == "int8":
+            model = convert_precision(model, precision, inplace=True)
+        if precision != "fp32":
+            console.print(
+                f"Model compute precision: [bold green]{precision}[/bold green]"
+            )
         console.print("[green]Model and tokenizer loaded successfully.[/green]")
         return model, tokenizer
     except Exception as e:
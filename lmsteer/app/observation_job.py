@@ -0,0 +1,215 @@
+import os
+from typing import Callable, Dict, Iterable, TypedDict
+
+import torch
+from rich.console import Console  # For status messages during observation jobs
+
+from lmsteer.app.activation_store import ActivationStore, replace_synced
+from lmsteer.app.capture import (
+    DEFAULT_CAPTURE_SPEC,
+    ActivationCapture,
+    CaptureSpec,
+    run_capture_loop,
+)
+from lmsteer.app.config_io import steering_config_hash
+from lmsteer.app.shard_writer import ShardWriter
+from lmsteer.app.steering_vectors import ReducerState, update_reducer_states
+
+
+CHECKPOINT_FILE_NAME = "checkpoint.pt"
+
+
+# Everything needed to resume an observation job, saved next to its store's index.
+class ObservationCheckpoint(TypedDict):
+    config_hash: str  # steering_config_hash of the job's steering config
+    capture_spec: (
+        CaptureSpec  # Global capture spec; rows from different specs must not mix
+    )
+    cursor: int  # Dataset samples covered by the committed shards (where to resume)
+    num_shards: int  # Shards committed to the store at this checkpoint
+    reducer_states: Dict[str, ReducerState]  # Over exactly those shards
+    track_outer: bool
+    complete: bool
+
+
+def load_checkpoint(store_dir: str) -> ObservationCheckpoint | None:
+    checkpoint_path = os.path.join(store_dir, CHECKPOINT_FILE_NAME)
+    if not os.path.exists(checkpoint_path):
+        return None
+    return torch.load(checkpoint_path, weights_only=True)
+
+
+def save_checkpoint(store_dir: str, checkpoint: ObservationCheckpoint) -> None:
+    # Same synced tmp-and-rename as the store index: a crash keeps the previous checkpoint.
+    checkpoint_path = os.path.join(store_dir, CHECKPOINT_FILE_NAME)
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        torch.save(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    replace_synced(tmp_path, checkpoint_path)
+
+
+def _recover(
+    store: ActivationStore,
+    checkpoint: ObservationCheckpoint,
+    console: Console,
+) -> ObservationCheckpoint:
+    """Brings a checkpoint up to date with the store after an interruption.
+
+    Shards recorded after the checkpoint are kept (and folded into the reducer
+    states) as long as they pass their checksum; the first shard that does not,
+    everything after it, and any partially written files are discarded.
+    """
+    recovered = 0
+    for shard_idx in range(checkpoint["num_shards"], store.num_shards):
+        if not store.verify_shard(shard_idx):
+            console.print(
+                f"[yellow]Discarding shard {store.index['shards'][shard_idx]['file']} and later "
+                "shards (missing or checksum mismatch).[/yellow]"
+            )
+            break
+        update_reducer_states(
+            checkpoint["reducer_states"],
+            store.load_shard(shard_idx),
+            track_outer=checkpoint["track_outer"],
+        )
+        checkpoint["cursor"] += store.index["shards"][shard_idx]["num_samples"]
+        checkpoint["num_shards"] += 1
+        recovered += 1
+    store.truncate(checkpoint["num_shards"])
+    if recovered:
+        console.print(
+            f"Recovered {recovered} shards written after the last checkpoint."
+        )
+    return checkpoint
+
+
+def run_observation_job(
+    model: torch.nn.Module,
+    make_batches: Callable[[int], Iterable[dict]],
+    steering_config: dict,
+    store_dir: str,
+    console: Console,
+    capture_spec: CaptureSpec | None = None,
+    shard_size: int = 1024,
+    checkpoint_every: int = 1,
+    track_outer: bool = False,
+    num_writers: int = 2,
+    max_pending_shards: int = 2,
+) -> ObservationCheckpoint:
+    """Runs a resumable observation job into an ActivationStore at ``store_dir``.
+
+    ``make_batches(start)`` must yield the dataset's batches beginning at
+    sample ``start`` (e.g. ``lambda start: dataset.iter_batches(8, start=start)``
+    for a TokenizedDataset). Every ``checkpoint_every`` shards the job waits
+    for pending writes and saves a checkpoint with the dataset cursor, the
+    reducer states of everything stored so far, the shard count and the
+    steering config hash. Calling it again with the same arguments resumes
+    from the last checkpoint: samples already in committed shards are not
+    processed again, and partially written shards are discarded.
+
+    Returns the final checkpoint; its reducer states can be passed straight to
+    compute_steering_vectors (use track_outer=True for the "pca" method).
+    """
+    config_hash = steering_config_hash(steering_config)
+    capture_spec = dict(capture_spec or DEFAULT_CAPTURE_SPEC)
+    store = ActivationStore(store_dir)
+    stored_hash = store.index["metadata"].get("steering_config_hash")
+    if stored_hash is not None and stored_hash != config_hash:
+        raise ValueError(
+            f"{store_dir} holds activations for a different steering config"
+        )
+    stored_spec = store.index["metadata"].get("capture_spec")
+    if stored_spec is not None and stored_spec != capture_spec:
+        raise ValueError(
+            f"{store_dir} holds activations captured with capture spec {stored_spec}"
+        )
+
+    checkpoint = load_checkpoint(store_dir)
+    if checkpoint is None:
+        checkpoint = {
+            "config_hash": config_hash,
+            "capture_spec": capture_spec,
+            "cursor": 0,
+            "num_shards": 0,
+            "reducer_states": {},
+            "track_outer": track_outer,
+            "complete": False,
+        }
+    elif checkpoint["config_hash"] != config_hash:
+        raise ValueError(
+            f"Checkpoint in {store_dir} was written for a different steering config"
+        )
+    elif checkpoint.get("capture_spec", capture_spec) != capture_spec:
+        raise ValueError(
+            f"Checkpoint in {store_dir} was written with capture spec {checkpoint['capture_spec']}"
+        )
+    elif checkpoint["track_outer"] != track_outer:
+        raise ValueError(
+            f"Checkpoint in {store_dir} was written with track_outer={checkpoint['track_outer']}"
+        )
+    elif checkpoint["complete"]:
+        console.print(
+            f"[green]Observation job in {store_dir} is already complete.[/green]"
+        )
+        return checkpoint
+    else:
+        console.print(
+            f"Resuming observation job from sample {checkpoint['cursor']} "
+            f"({checkpoint['num_shards']} shards committed)..."
+        )
+
+    capture = ActivationCapture(model, steering_config, capture_spec)
+    if not capture.module_specs:
+        console.print(
+            "[yellow]No modules in the steering config are marked for capture.[/yellow]"
+        )
+        return checkpoint
+    store.index["metadata"].update(
+        {"steering_config_hash": config_hash, "capture_spec": capture.capture_spec}
+    )
+    checkpoint = _recover(store, checkpoint, console)  # Also saves the index
+
+    reducer_states = checkpoint["reducer_states"]
+    cursor = checkpoint["cursor"]
+    shards_since_checkpoint = 0
+    writer = None
+    if num_writers > 0:
+        writer = ShardWriter(store, num_writers, max_pending_shards)
+        capture.attach_writer(writer, shard_size)
+
+    def commit(complete: bool = False) -> None:
+        nonlocal shards_since_checkpoint
+        if writer is not None:
+            writer.drain()  # The checkpoint may only cover shards that are in the index
+        checkpoint.update(
+            cursor=cursor,
+            num_shards=store.num_shards,
+            reducer_states=reducer_states,
+            complete=complete,
+        )
+        save_checkpoint(store_dir, checkpoint)
+        shards_since_checkpoint = 0
+
+    def on_shard(activations: Dict[str, torch.Tensor], num_samples: int) -> None:
+        nonlocal cursor, shards_since_checkpoint
+        update_reducer_states(reducer_states, activations, track_outer=track_outer)
+        cursor += num_samples
+        shards_since_checkpoint += 1
+        if shards_since_checkpoint >= checkpoint_every:
+            commit()
+
+    console.print(
+        f"Capturing activations for {len(capture.module_specs)} modules from sample {cursor} "
+        f"(checkpoint every {checkpoint_every} shards)..."
+    )
+    run_capture_loop(
+        model, make_batches(cursor), capture, shard_size, store, writer, on_shard
+    )
+    commit(complete=True)  # The writer is closed, so every shard is in the index
+
+    console.print(
+        f"[green]Observation job complete. {cursor} samples in {store.num_shards} shards.[/green]"
+    )
+    return checkpoint
@@ -0,0 +1,262 @@
+import copy
+import time
+import warnings
+from typing import Dict, Iterable, List, Literal, TypedDict
+
+import torch
+from torch import nn
+from rich.console import Console  # For status messages and the validation table
+from rich.table import Table
+
+from lmsteer.app.capture import run_observation
+from lmsteer.app.steering import SteeringHooks
+
+
+Precision = Literal["fp32", "bf16", "int8"]
+PRECISIONS = ("fp32", "bf16", "int8")
+
+
+def _conv1d_to_linear(model: nn.Module) -> int:
+    """Replaces Hugging Face Conv1D layers (GPT-2 style) with equivalent nn.Linear layers.
+
+    Conv1D is a Linear with a transposed weight; dynamic quantization only
+    recognizes nn.Linear, so the swap lets those layers be quantized too.
+    """
+    try:
+        from transformers.pytorch_utils import Conv1D
+    except ImportError:  # pragma: no cover - transformers is a core dependency
+        return 0
+    replaced = 0
+    for parent in list(model.modules()):
+        for name, child in list(parent.named_children()):
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = nn.Linear(in_features, out_features, dtype=child.weight.dtype)
+                with torch.no_grad():
+                    linear.weight.copy_(child.weight.t())
+                    linear.bias.copy_(child.bias)
+                setattr(parent, name, linear)
+                replaced += 1
+    return replaced
+
+
+def convert_precision(
+    model: nn.Module, precision: Precision, inplace: bool = False
+) -> nn.Module:
+    """Returns the model in the requested CPU compute precision.
+
+    - "fp32": unchanged.
+    - "bf16": all parameters and buffers cast to bfloat16 (half the memory).
+    - "int8": dynamic int8 quantization of every nn.Linear (and GPT-2 Conv1D)
+      layer: weights are stored as int8, activations are quantized on the fly,
+      and module outputs stay float32.
+
+    int8 replaces those layers with quantized ``Linear`` modules, so
+    module_type rules written for the original types (e.g. "Conv1D" or
+    "Linear") no longer match them; use path_pattern or instance rules, or
+    compile rules against the fp32 model. Their packed weights are not
+    parameters: count memory with model_memory_bytes rather than parameters().
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(
+            f"Unknown precision '{precision}', expected one of {PRECISIONS}"
+        )
+    if precision == "fp32":
+        return model
+    if not inplace:
+        model = copy.deepcopy(model)
+    if precision == "bf16":
+        return model.to(torch.bfloat16)
+
+    _conv1d_to_linear(model)
+    with warnings.catch_warnings():
+        # Eager-mode quantized tensors are deprecated upstream but remain the
+        # only dynamic int8 path for CPU inference without a compile step.
+        warnings.simplefilter("ignore")
+        return torch.ao.quantization.quantize_dynamic(
+            model, {nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+
+
+def model_memory_bytes(model: nn.Module) -> int:
+    """Bytes held by the model's parameters and buffers, plus packed int8 weights."""
+
+    def tensor_bytes(value) -> int:
+        if isinstance(value, torch.Tensor):
+            return value.numel() * value.element_size()
+        if isinstance(value, (tuple, list)):
+            return sum(tensor_bytes(item) for item in value)
+        return 0
+
+    total = sum(tensor_bytes(p) for p in model.parameters()) + sum(
+        tensor_bytes(b) for b in model.buffers()
+    )
+    # Dynamically quantized layers keep weight and bias in packed params instead.
+    return total + sum(
+        tensor_bytes(value)
+        for key, value in model.state_dict().items()
+        if key.endswith("_packed_params")
+    )
+
+
+def _output_tensor(output) -> torch.Tensor:
+    if hasattr(output, "to_tuple"):  # Hugging Face ModelOutput
+        output = output.to_tuple()
+    if isinstance(output, (tuple, list)):
+        output = output[0]
+    return output
+
+
+# Per-module agreement between reduced-precision and fp32 captures.
+class ModuleAgreement(TypedDict):
+    module_path: str
+    max_abs_error: float
+    relative_error: float  # |x - ref| / |ref| over all captured rows
+    cosine: float  # Mean per-row cosine similarity
+
+
+class PrecisionReport(TypedDict):
+    precision: str
+    reference_bytes: int
+    model_bytes: int
+    reference_tokens_per_s: float
+    tokens_per_s: float
+    modules: List[ModuleAgreement]
+    steering_cosine: (
+        float | None
+    )  # Cosine between fp32 and reduced-precision steering effects
+    steering_relative_error: float | None
+
+
+def validate_precision(
+    reference_model: nn.Module,
+    model: nn.Module,
+    batches: Iterable[dict],
+    steering_config: dict,
+    console: Console,
+    steering_vectors: Dict[str, torch.Tensor] | None = None,
+    scale: float = 1.0,
+    precision: str = "",
+) -> PrecisionReport:
+    """Compares captured activations and steering effects of a model against its fp32 reference.
+
+    Both models observe the same batches with the same steering config. If
+    steering vectors are given, the steering effect (steered minus unsteered
+    model output) is compared as well.
+    """
+    batches = list(batches)
+    quiet = Console(quiet=True)
+    num_tokens = sum(
+        int(batch["attention_mask"].sum())
+        if batch.get("attention_mask") is not None
+        else batch["input_ids"].numel()
+        for batch in batches
+    )
+
+    def observe(target: nn.Module):
+        start = time.perf_counter()
+        activations = run_observation(target, batches, steering_config, quiet)
+        return activations, num_tokens / max(time.perf_counter() - start, 1e-9)
+
+    console.print(
+        f"Validating {precision or 'model'} against fp32 on {len(batches)} batches..."
+    )
+    reference, reference_tokens_per_s = observe(reference_model)
+    reduced, tokens_per_s = observe(model)
+
+    modules: List[ModuleAgreement] = []
+    for module_path, expected in reference.items():
+        actual = reduced.get(module_path)
+        if actual is None:
+            continue
+        expected = (
+            expected.to(torch.float32).flatten(1)
+            if expected.dim() > 1
+            else expected.float()[:, None]
+        )
+        actual = actual.to(torch.float32).reshape(expected.shape)
+        modules.append(
+            {
+                "module_path": module_path,
+                "max_abs_error": (actual - expected).abs().max().item(),
+                "relative_error": (
+                    (actual - expected).norm() / expected.norm().clamp_min(1e-12)
+                ).item(),
+                "cosine": nn.functional.cosine_similarity(actual, expected, dim=-1)
+                .mean()
+                .item(),
+            }
+        )
+
+    steering_cosine = None
+    steering_relative_error = None
+    if steering_vectors:
+
+        def steering_effect(target: nn.Module) -> torch.Tensor:
+            effects = []
+            with torch.no_grad():
+                for batch in batches:
+                    inputs = {
+                        "input_ids": batch["input_ids"],
+                        "attention_mask": batch.get("attention_mask"),
+                    }
+                    plain = _output_tensor(target(**inputs)).float()
+                    with SteeringHooks(target, steering_vectors, scale):
+                        steered = _output_tensor(target(**inputs)).float()
+                    effects.append((steered - plain).flatten())
+            return torch.cat(effects)
+
+        expected_effect = steering_effect(reference_model)
+        actual_effect = steering_effect(model)
+        steering_cosine = nn.functional.cosine_similarity(
+            actual_effect, expected_effect, dim=0
+        ).item()
+        steering_relative_error = (
+            (actual_effect - expected_effect).norm()
+            / expected_effect.norm().clamp_min(1e-12)
+        ).item()
+
+    return {
+        "precision": precision,
+        "reference_bytes": model_memory_bytes(reference_model),
+        "model_bytes": model_memory_bytes(model),
+        "reference_tokens_per_s": reference_tokens_per_s,
+        "tokens_per_s": tokens_per_s,
+        "modules": modules,
+        "steering_cosine": steering_cosine,
+        "steering_relative_error": steering_relative_error,
+    }
+
+
+def print_precision_report(
+    report: PrecisionReport, console: Console, limit: int = 20
+) -> None:
+    """Prints memory, throughput and accuracy of a reduced-precision model versus fp32."""
+    from lmsteer.app.estimator import format_bytes
+
+    console.print(
+        f"[bold]{report['precision'] or 'Model'} vs fp32:[/bold] "
+        f"memory {format_bytes(report['model_bytes'])} vs {format_bytes(report['reference_bytes'])}, "
+        f"throughput {report['tokens_per_s']:.0f} vs {report['reference_tokens_per_s']:.0f} tokens/s"
+    )
+    if report["steering_cosine"] is not None:
+        console.print(
+            f"Steering effect: cosine {report['steering_cosine']:.4f}, "
+            f"relative error {report['steering_relative_error']:.4f}"
+        )
+    table = Table(title="Captured activation agreement")
+    table.add_column("Module")
+    table.add_column("Max abs error", justify="right")
+    table.add_column("Relative error", justify="right")
+    table.add_column("Cosine", justify="right")
+    # Worst agreement first.
+    for module in sorted(
+        report["modules"], key=lambda m: m["relative_error"], reverse=True
+    )[:limit]:
+        table.add_row(
+            module["module_path"],
+            f"{module['max_abs_error']:.4g}",
+            f"{module['relative_error']:.4f}",
+            f"{module['cosine']:.4f}",
+        )
+    console.print(table)
@@ -0,0 +1,141 @@
+import threading
+from collections import OrderedDict
+from typing import List, Tuple, TypedDict
+
+import torch
+
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+
+# Summary of one module's output on a sample prompt, as shown in the TUI.
+class ActivationPreview(TypedDict):
+    module_path: str
+    shape: List[int] | None  # None when the module has no tensor output
+    dtype: str | None
+    norm: float  # L2 norm of the whole output
+    mean_token_norm: float  # Mean L2 norm over tokens (last dimension)
+    mean: float
+    std: float
+    min: float
+    max: float
+    histogram: List[int]
+
+
+class _StopForward(Exception):
+    """Raised by the preview hook to end the forward pass once the module has run."""
+
+
+def compute_activation_preview(
+    model: torch.nn.Module,
+    module_path: str,
+    input_ids: torch.Tensor,
+    attention_mask: torch.Tensor | None = None,
+    bins: int = 16,
+) -> ActivationPreview:
+    """Runs the model up to module_path on one input and summarizes its output.
+
+    The forward pass is aborted right after the module runs, so previews of
+    early modules do not pay for the rest of the model.
+    """
+    module = model.get_submodule(module_path) if module_path else model
+    captured = {}
+
+    def hook(module, inputs, output):
+        if isinstance(output, (tuple, list)):
+            output = output[0] if output else None
+        elif not isinstance(output, torch.Tensor) and hasattr(output, "to_tuple"):
+            output = output.to_tuple()[0]  # Hugging Face ModelOutput
+        captured["output"] = (
+            output.detach() if isinstance(output, torch.Tensor) else None
+        )
+        raise _StopForward
+
+    handle = module.register_forward_hook(hook)
+    try:
+        with torch.no_grad():
+            model(input_ids=input_ids, attention_mask=attention_mask)
+    except _StopForward:
+        pass
+    finally:
+        handle.remove()
+
+    output = captured.get("output")
+    if output is None or output.numel() == 0:
+        return {
+            "module_path": module_path,
+            "shape": None,
+            "dtype": None,
+            "norm": 0.0,
+            "mean_token_norm": 0.0,
+            "mean": 0.0,
+            "std": 0.0,
+            "min": 0.0,
+            "max": 0.0,
+            "histogram": [],
+        }
+    values = output.to(torch.float32)
+    flat = values.flatten()
+    low, high = flat.min().item(), flat.max().item()
+    histogram = torch.histc(flat, bins=bins, min=low, max=high) if high > low else None
+    return {
+        "module_path": module_path,
+        "shape": list(output.shape),
+        "dtype": str(output.dtype).replace("torch.", ""),
+        "norm": flat.norm().item(),
+        "mean_token_norm": values.norm(dim=-1).mean().item()
+        if values.dim() > 0
+        else abs(flat.item()),
+        "mean": flat.mean().item(),
+        "std": flat.std(unbiased=False).item(),
+        "min": low,
+        "max": high,
+        "histogram": histogram.int().tolist()
+        if histogram is not None
+        else [flat.numel()],
+    }
+
+
+def sparkline(counts: List[int]) -> str:
+    """Renders histogram counts as a one-line sparkline."""
+    if not counts:
+        return ""
+    peak = max(counts)
+    if peak == 0:
+        return SPARK_CHARS[0] * len(counts)
+    top = len(SPARK_CHARS) - 1
+    return "".join(SPARK_CHARS[round(count / peak * top)] for count in counts)
+
+
+class PreviewCache:
+    """Bounded, thread-safe LRU of activation previews keyed by (module path, prompt)."""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Tuple[str, str], ActivationPreview]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def get(self, module_path: str, prompt: str) -> ActivationPreview | None:
+        with self._lock:
+            preview = self._entries.get((module_path, prompt))
+            if preview is not None:
+                self._entries.move_to_end((module_path, prompt))
+            return preview
+
+    def put(self, module_path: str, prompt: str, preview: ActivationPreview) -> None:
+        with self._lock:
+            self._entries[(module_path, prompt)] = preview
+            self._entries.move_to_end((module_path, prompt))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
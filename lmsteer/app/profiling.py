@@ -0,0 +1,206 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+import torch
+from rich.console import Console
+from rich.table import Table
+
+
+class HookProfiler:
+    """Collects timing and byte counts from capture and steering hooks.
+
+    Disabled by default. Instrumented code checks ``profiler.enabled`` before
+    taking any timestamps, so the cost when disabled is a single attribute
+    read per hook call; per-layer forward timing hooks are only installed
+    while the profiler is enabled.
+
+    Aggregates are kept per (category, name) key: call count, cumulative time
+    and bytes. Individual events are also kept (up to max_events) for export
+    as a Chrome trace (chrome://tracing or https://ui.perfetto.dev).
+    """
+
+    def __init__(self, max_events: int = 1_000_000):
+        self.enabled = False
+        self.max_events = max_events
+        self._lock = threading.Lock()
+        self._origin_ns = time.perf_counter_ns()
+        self.reset()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def reset(self) -> None:
+        with self._lock:
+            # (category, name) -> [calls, total_ns, bytes]
+            self.stats: Dict[Tuple[str, str], List[int]] = {}
+            self.events: List[dict] = []
+            self.dropped_events = 0
+
+    @contextmanager
+    def profile(self):
+        """Enables the profiler for the duration of a block."""
+        was_enabled = self.enabled
+        self.enable()
+        try:
+            yield self
+        finally:
+            self.enabled = was_enabled
+
+    def record(
+        self, category: str, name: str, start_ns: int, end_ns: int, num_bytes: int = 0
+    ) -> None:
+        """Records one timed event, e.g. a hook call or a shard write."""
+        duration_ns = end_ns - start_ns
+        with self._lock:
+            stat = self.stats.get((category, name))
+            if stat is None:
+                stat = self.stats[(category, name)] = [0, 0, 0]
+            stat[0] += 1
+            stat[1] += duration_ns
+            stat[2] += num_bytes
+            if len(self.events) < self.max_events:
+                event = {
+                    "name": name,
+                    "cat": category,
+                    "ph": "X",
+                    "ts": (start_ns - self._origin_ns) / 1000,
+                    "dur": duration_ns / 1000,
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                }
+                if num_bytes:
+                    event["args"] = {"bytes": num_bytes}
+                self.events.append(event)
+            else:
+                self.dropped_events += 1
+
+    @contextmanager
+    def span(self, category: str, name: str, num_bytes: int = 0):
+        """Times a block of code if the profiler is enabled."""
+        if not self.enabled:
+            yield
+            return
+        start_ns = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(category, name, start_ns, time.perf_counter_ns(), num_bytes)
+
+    @contextmanager
+    def layer_timing(
+        self, model: torch.nn.Module, module_paths: List[str] | None = None
+    ):
+        """Times the forward pass of each layer while the block runs.
+
+        By default the layers are the direct children of every nn.ModuleList
+        (e.g. the transformer blocks). No hooks are installed when disabled.
+        """
+        if not self.enabled:
+            yield
+            return
+        if module_paths is None:
+            module_paths = [
+                f"{parent_path}.{name}" if parent_path else name
+                for parent_path, parent in model.named_modules()
+                if isinstance(parent, torch.nn.ModuleList)
+                for name, _ in parent.named_children()
+            ]
+        starts: Dict[str, List[int]] = {}
+        handles = []
+
+        def make_hooks(module_path: str):
+            def pre_hook(module, inputs):
+                starts.setdefault(module_path, []).append(time.perf_counter_ns())
+
+            def post_hook(module, inputs, output):
+                stack = starts.get(module_path)
+                if stack:
+                    self.record(
+                        "forward", module_path, stack.pop(), time.perf_counter_ns()
+                    )
+
+            return pre_hook, post_hook
+
+        for module_path in module_paths:
+            module = model.get_submodule(module_path)
+            pre_hook, post_hook = make_hooks(module_path)
+            handles.append(module.register_forward_pre_hook(pre_hook))
+            handles.append(module.register_forward_hook(post_hook))
+        try:
+            yield
+        finally:
+            for handle in handles:
+                handle.remove()
+
+    def summary(self) -> List[dict]:
+        """Returns the aggregates, most expensive first."""
+        with self._lock:
+            rows = [
+                {
+                    "category": category,
+                    "name": name,
+                    "calls": calls,
+                    "total_ms": total_ns / 1e6,
+                    "mean_us": total_ns / calls / 1e3 if calls else 0.0,
+                    "bytes": num_bytes,
+                }
+                for (category, name), (calls, total_ns, num_bytes) in self.stats.items()
+            ]
+        rows.sort(key=lambda row: row["total_ms"], reverse=True)
+        return rows
+
+    def print_summary(self, console: Console, limit: int = 30) -> None:
+        """Prints a table of the most expensive hooks, layers and waits."""
+        rows = self.summary()
+        if not rows:
+            console.print("[yellow]No profiling data recorded.[/yellow]")
+            return
+        table = Table(title="LMSteer hook profile")
+        table.add_column("Category")
+        table.add_column("Name")
+        table.add_column("Calls", justify="right")
+        table.add_column("Total (ms)", justify="right")
+        table.add_column("Mean (us)", justify="right")
+        table.add_column("Bytes", justify="right")
+        for row in rows[:limit]:
+            table.add_row(
+                row["category"],
+                row["name"],
+                str(row["calls"]),
+                f"{row['total_ms']:.3f}",
+                f"{row['mean_us']:.1f}",
+                str(row["bytes"]) if row["bytes"] else "",
+            )
+        console.print(table)
+        if len(rows) > limit:
+            console.print(f"[dim]... {len(rows) - limit} more entries not shown.[/dim]")
+
+    def export_chrome_trace(self, file_path: str) -> None:
+        """Writes the recorded events in Chrome trace event format."""
+        with self._lock:
+            payload = {
+                "traceEvents": list(self.events),
+                "displayTimeUnit": "ms",
+                "otherData": {
+                    "summary": None,
+                    "dropped_events": self.dropped_events,
+                },
+            }
+        payload["otherData"]["summary"] = self.summary()
+        os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+        with open(file_path, "w") as f:
+            json.dump(payload, f)
+
+
+# Process-wide profiler used by the capture and steering hooks. Set
+# LMSTEER_PROFILE=1 to enable it at startup, or call profiler.enable() at runtime.
+profiler = HookProfiler()
+if os.environ.get("LMSTEER_PROFILE", "") not in ("", "0"):
+    profiler.enable()
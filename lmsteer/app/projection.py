@@ -0,0 +1,141 @@
+from typing import Dict, List, Literal, TypedDict
+
+import torch
+
+
+# Optional dimensionality reduction applied inside the capture hooks.
+class ProjectionSpec(TypedDict, total=False):
+    method: Literal["none", "random", "pca"]
+    dim: int  # Output width
+    fit_batches: int  # PCA only: batches buffered before the basis is fitted
+    seed: int  # Random projection only
+
+
+DEFAULT_PROJECTION_SPEC: ProjectionSpec = {"method": "none"}
+
+
+# Everything needed to interpret (or lift back) reduced activations.
+class ProjectionState(TypedDict):
+    method: str
+    in_dim: int
+    out_dim: int
+    basis: torch.Tensor  # [in_dim, out_dim], orthonormal columns
+    mean: torch.Tensor  # [in_dim]; zeros for random projections
+
+
+def validate_projection_spec(projection_spec: ProjectionSpec) -> None:
+    """Raises ValueError if the projection spec is malformed."""
+    method = projection_spec.get("method", "none")
+    if method not in ("none", "random", "pca"):
+        raise ValueError(f"Unknown projection method '{method}'")
+    if method != "none" and projection_spec.get("dim", 0) < 1:
+        raise ValueError(f"Projection '{method}' requires a positive 'dim'")
+    if method == "pca" and projection_spec.get("fit_batches", 1) < 1:
+        raise ValueError("PCA projection requires fit_batches >= 1")
+
+
+class Projector:
+    """Reduces one module's captured rows to ``dim`` features.
+
+    A random projection uses a fixed, seeded orthonormal basis. PCA buffers the
+    rows of the first ``fit_batches`` batches, fits the top principal
+    directions on them, and from then on projects rows as they arrive; the
+    buffered rows are released (projected) together with the batch that
+    completes the fit, so no rows are lost or reordered. Rows narrower than
+    ``dim`` are passed through unchanged.
+    """
+
+    def __init__(self, projection_spec: ProjectionSpec):
+        validate_projection_spec(projection_spec)
+        self.method = projection_spec.get("method", "none")
+        self.out_dim = projection_spec.get("dim", 0)
+        self.fit_batches = projection_spec.get("fit_batches", 4)
+        self.seed = projection_spec.get("seed", 0)
+        self.state: ProjectionState | None = None
+        self._pending: List[torch.Tensor] = []
+        self._passthrough = self.method == "none"
+
+    @property
+    def fitted(self) -> bool:
+        return self.state is not None or self._passthrough
+
+    @property
+    def buffering(self) -> bool:
+        """True while PCA rows are held back waiting for the fit."""
+        return bool(self._pending)
+
+    def _fit(self, rows: torch.Tensor) -> None:
+        in_dim = rows.shape[-1]
+        if self.out_dim >= in_dim:
+            self._passthrough = True
+            return
+        if self.method == "random":
+            generator = torch.Generator().manual_seed(self.seed)
+            gaussian = torch.randn(in_dim, self.out_dim, generator=generator)
+            basis = torch.linalg.qr(gaussian).Q
+            mean = torch.zeros(in_dim)
+        else:
+            flat = rows.reshape(-1, in_dim).to(torch.float64)
+            mean = flat.mean(dim=0)
+            centered = flat - mean
+            covariance = centered.T @ centered / max(flat.shape[0] - 1, 1)
+            eigenvalues, eigenvectors = torch.linalg.eigh(covariance)  # Ascending order
+            basis = eigenvectors[:, -self.out_dim :].flip(dims=[1])
+        self.state = {
+            "method": self.method,
+            "in_dim": in_dim,
+            "out_dim": self.out_dim,
+            "basis": basis.to(torch.float32).contiguous(),
+            "mean": mean.to(torch.float32),
+        }
+
+    def _apply(self, rows: torch.Tensor) -> torch.Tensor:
+        if self._passthrough:
+            return rows
+        basis = self.state["basis"].to(rows.device)
+        mean = self.state["mean"].to(rows.device)
+        return ((rows.to(torch.float32) - mean) @ basis).to(rows.dtype)
+
+    def transform(self, rows: torch.Tensor) -> torch.Tensor | None:
+        """Returns the reduced rows, or None while PCA rows are still being buffered."""
+        if self.fitted:
+            return self._apply(rows)
+        if self.method == "random":
+            self._fit(rows)
+            return self._apply(rows)
+        self._pending.append(rows)
+        if len(self._pending) < self.fit_batches:
+            return None
+        return self.finalize()
+
+    def finalize(self) -> torch.Tensor | None:
+        """Fits on whatever was buffered (e.g. a run shorter than fit_batches) and releases it."""
+        if not self._pending:
+            return None
+        rows = torch.cat(self._pending, dim=0)
+        self._pending = []
+        if not self.fitted:
+            self._fit(rows)
+        return self._apply(rows)
+
+
+def reconstruct(reduced: torch.Tensor, state: ProjectionState) -> torch.Tensor:
+    """Maps reduced activations back to the module's full width (the best rank-dim approximation for PCA)."""
+    return reduced.to(torch.float32) @ state["basis"].T + state["mean"]
+
+
+def lift_vectors(
+    vectors: Dict[str, torch.Tensor], states: Dict[str, ProjectionState]
+) -> Dict[str, torch.Tensor]:
+    """Lifts steering vectors computed in reduced space back to full module width.
+
+    Steering vectors are differences, so the projection mean cancels out and
+    only the basis is applied. Modules without a projection are returned as is.
+    """
+    lifted = {}
+    for module_path, vector in vectors.items():
+        state = states.get(module_path)
+        lifted[module_path] = (
+            vector if state is None else vector.to(torch.float32) @ state["basis"].T
+        )
+    return lifted
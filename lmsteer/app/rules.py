@@ -1,8 +1,11 @@
 from typing import TypedDict, Literal, List
 import fnmatch
+import re
 from transformers import AutoModel  # For type hinting
 from rich.console import Console  # For status messages during compilation
 
+from lmsteer.app.model_utils import ModuleNode
+
 
 # Define the structure of a rule
 class Rule(TypedDict):
@@ -12,95 +15,193 @@ class Rule(TypedDict):
     action: Literal["capture", "skip"]
 
 
-def compile_rules_to_steering_config(
-    defined_rules: List[Rule], model: AutoModel, console: Console
-) -> dict:
-    """Compiles the defined rules into a final steering configuration for leaf modules."""
-    final_steering_config = {}
-    console.print("\nCompiling rules to final steering configuration...")
+# Characters that start a wildcard in fnmatch-style path patterns.
+_GLOB_CHARS = "*?["
 
-    # Get all leaf modules with their full paths
-    leaf_modules = []
-    for name, module_obj in model.named_modules():
-        if not list(module_obj.children()):  # Check if it's a leaf module
-            leaf_modules.append((name, module_obj))
 
-    for module_full_name, leaf_module in leaf_modules:
-        leaf_module_type = type(leaf_module).__name__
-        final_action = None  # Undetermined initially
-        source_rule_id = None
-        applied_rule_specifier = None
-        applied_rule_type = None
+class _RuleResolver:
+    """Indexes rules by kind so each leaf is resolved without rescanning every rule.
 
-        # Rule Precedence: Instance > Path Pattern > Module Type
-        # Within each category, the last defined rule wins (hence iterating `reversed(defined_rules)`)
+    Rule Precedence: Instance > Path Pattern > Module Type.
+    Within each category, the last defined rule wins.
+    """
 
-        # 1. Check instance rules (highest precedence)
-        for rule in reversed(defined_rules):
-            if (
-                rule["rule_type"] == "instance"
-                and rule["specifier"] == module_full_name
-            ):
-                final_action = rule["action"]
-                source_rule_id = rule["id"]
-                applied_rule_specifier = rule["specifier"]
-                applied_rule_type = rule["rule_type"]
-                break
+    def __init__(self, defined_rules: List[Rule]):
+        self.instance_rules = {}
+        self.type_rules = {}
+        # Path patterns are indexed by their literal prefix (the text before the
+        # first wildcard): only patterns whose prefix starts a path can match it.
+        # Each bucket holds (definition order, rule, compiled regex), newest first.
+        self.path_rules_by_prefix = {}
+        latest_patterns = {}
+        for order, rule in enumerate(defined_rules):
+            if rule["rule_type"] == "instance":
+                self.instance_rules[rule["specifier"]] = rule
+            elif rule["rule_type"] == "module_type":
+                self.type_rules[rule["specifier"]] = rule
+            elif rule["rule_type"] == "path_pattern":
+                # A repeated pattern matches the same paths, so only the last one matters.
+                latest_patterns[rule["specifier"]] = (order, rule)
+        for specifier, (order, rule) in latest_patterns.items():
+            literal_end = min(
+                (specifier.index(c) for c in _GLOB_CHARS if c in specifier),
+                default=len(specifier),
+            )
+            self.path_rules_by_prefix.setdefault(specifier[:literal_end], []).append(
+                (order, rule, re.compile(fnmatch.translate(specifier)))
+            )
+        for bucket in self.path_rules_by_prefix.values():
+            bucket.sort(key=lambda path_rule: path_rule[0], reverse=True)
+        self._prefix_lengths = sorted(
+            {len(prefix) for prefix in self.path_rules_by_prefix}
+        )
 
-        if final_action is not None:  # Action decided by instance rule
-            if final_action == "capture":
-                final_steering_config[module_full_name] = {
-                    "action": "capture_leaf_activations",
-                    "module_type": leaf_module_type,
-                    "source_rule_id": source_rule_id,
-                    "source_rule_type": applied_rule_type,
-                    "source_rule_specifier": applied_rule_specifier,
-                }
-            continue  # Decision made for this leaf module, move to the next leaf
+    def has_path_rules_under(self, path_prefix: str) -> bool:
+        """Returns True if some path pattern rule could match a path below path_prefix."""
+        prefix = f"{path_prefix}." if path_prefix else ""
+        return any(
+            literal.startswith(prefix) or prefix.startswith(literal)
+            for literal in self.path_rules_by_prefix
+        )
 
+    def has_instance_rules_under(self, path_prefix: str) -> bool:
+        prefix = f"{path_prefix}." if path_prefix else ""
+        return any(specifier.startswith(prefix) for specifier in self.instance_rules)
+
+    def resolve(self, module_full_name: str, leaf_module_type: str):
+        """Returns the rule that decides a leaf module, or None if no rule applies."""
+        # 1. Check instance rules (highest precedence)
+        rule = self.instance_rules.get(module_full_name)
+        if rule is not None:
+            return rule
         # 2. Check path pattern rules (middle precedence)
-        for rule in reversed(defined_rules):
-            if rule["rule_type"] == "path_pattern" and fnmatch.fnmatch(
-                module_full_name, rule["specifier"]
-            ):
-                final_action = rule["action"]
-                source_rule_id = rule["id"]
-                applied_rule_specifier = rule["specifier"]
-                applied_rule_type = rule["rule_type"]
+        best_order, best_rule = -1, None
+        for prefix_length in self._prefix_lengths:
+            if prefix_length > len(module_full_name):
                 break
+            bucket = self.path_rules_by_prefix.get(module_full_name[:prefix_length])
+            if not bucket:
+                continue
+            for order, rule, regex in bucket:
+                if order <= best_order:
+                    break  # The rest of the bucket was defined earlier
+                if regex.match(module_full_name):
+                    best_order, best_rule = order, rule
+                    break
+        if best_rule is not None:
+            return best_rule
+        # 3. Check module type rules (lowest precedence)
+        return self.type_rules.get(leaf_module_type)
 
-        if final_action is not None:  # Action decided by path pattern rule
-            if final_action == "capture":
-                final_steering_config[module_full_name] = {
-                    "action": "capture_leaf_activations",
-                    "module_type": leaf_module_type,
-                    "source_rule_id": source_rule_id,
-                    "source_rule_type": applied_rule_type,
-                    "source_rule_specifier": applied_rule_specifier,
-                }
-            continue  # Decision made, move to next leaf
 
-        # 3. Check module type rules (lowest precedence)
-        for rule in reversed(defined_rules):
-            if (
-                rule["rule_type"] == "module_type"
-                and rule["specifier"] == leaf_module_type
-            ):
-                final_action = rule["action"]
-                source_rule_id = rule["id"]
-                applied_rule_specifier = rule["specifier"]
-                applied_rule_type = rule["rule_type"]
-                break
+def _config_entry(rule: Rule, leaf_module_type: str) -> dict:
+    return {
+        "action": "capture_leaf_activations",
+        "module_type": leaf_module_type,
+        "source_rule_id": rule["id"],
+        "source_rule_type": rule["rule_type"],
+        "source_rule_specifier": rule["specifier"],
+    }
+
+
+def _compile_template_group(
+    group, resolver: _RuleResolver, final_steering_config: dict
+):
+    """Compiles every instance of a TemplateGroup, resolving shared leaves once."""
+    group_prefix = group.parent_node.get_full_path()
+    leaf_paths = group.template.leaf_paths()
+    per_instance = resolver.has_path_rules_under(
+        group_prefix
+    ) or resolver.has_instance_rules_under(group_prefix)
+
+    # Without instance or path rules that reach into the group, the decision for
+    # a leaf only depends on its type, so it is made once for all instances.
+    shared_entries = None
+    if not per_instance:
+        shared_entries = []
+        for relative_path, leaf_module_type in leaf_paths:
+            rule = resolver.type_rules.get(leaf_module_type)
+            if rule is not None and rule["action"] == "capture":
+                shared_entries.append(
+                    (relative_path, _config_entry(rule, leaf_module_type))
+                )
+
+    for instance_node in group.instances:
+        instance_path = instance_node.get_full_path()
+        if shared_entries is not None:
+            for relative_path, entry in shared_entries:
+                final_steering_config[f"{instance_path}.{relative_path}"] = dict(entry)
+            continue
+        for relative_path, leaf_module_type in leaf_paths:
+            module_full_name = f"{instance_path}.{relative_path}"
+            rule = resolver.resolve(module_full_name, leaf_module_type)
+            if rule is not None and rule["action"] == "capture":
+                final_steering_config[module_full_name] = _config_entry(
+                    rule, leaf_module_type
+                )
+
+
+def _compile_tree(module_node, resolver: _RuleResolver, final_steering_config: dict):
+    group_of_instance = {
+        id(instance_node): group
+        for group in module_node.template_groups
+        for instance_node in group.instances
+    }
+    for child_node in module_node.children:
+        group = group_of_instance.get(id(child_node))
+        if group is not None:
+            # The whole group is compiled when its first instance is reached,
+            # which keeps the config in module order.
+            if child_node is group.instances[0]:
+                _compile_template_group(group, resolver, final_steering_config)
+        elif child_node.is_leaf:
+            rule = resolver.resolve(child_node.get_full_path(), child_node.module_type)
+            if rule is not None and rule["action"] == "capture":
+                final_steering_config[child_node.get_full_path()] = _config_entry(
+                    rule, child_node.module_type
+                )
+        else:
+            _compile_tree(child_node, resolver, final_steering_config)
+
+
+def resolve_leaf_actions(defined_rules: List[Rule], leaves) -> List[str | None]:
+    """Returns the deciding rule's action ("capture", "skip" or None) for each (path, type) leaf."""
+    resolver = _RuleResolver(defined_rules)
+    actions = []
+    for module_full_name, leaf_module_type in leaves:
+        rule = resolver.resolve(module_full_name, leaf_module_type)
+        actions.append(rule["action"] if rule is not None else None)
+    return actions
+
+
+def compile_rules_to_steering_config(
+    defined_rules: List[Rule],
+    model: AutoModel,
+    console: Console,
+    module_root: ModuleNode | None = None,
+) -> dict:
+    """Compiles the defined rules into a final steering configuration for leaf modules.
+
+    If the model's ModuleNode tree is given and was built with shared templates,
+    repeated blocks are compiled group by group instead of leaf by leaf.
+    """
+    final_steering_config = {}
+    console.print("\nCompiling rules to final steering configuration...")
+    resolver = _RuleResolver(defined_rules)
 
-        # If after all checks, final_action is 'capture', add to config
-        if final_action == "capture":
-            final_steering_config[module_full_name] = {
-                "action": "capture_leaf_activations",
-                "module_type": leaf_module_type,
-                "source_rule_id": source_rule_id,
-                "source_rule_type": applied_rule_type,
-                "source_rule_specifier": applied_rule_specifier,
-            }
+    if module_root is not None:
+        _compile_tree(module_root, resolver, final_steering_config)
+    else:
+        for module_full_name, module_obj in model.named_modules():
+            if list(module_obj.children()):  # Only leaf modules are configured
+                continue
+            leaf_module_type = type(module_obj).__name__
+            rule = resolver.resolve(module_full_name, leaf_module_type)
+            # If after all checks, the action is 'capture', add to config
+            if rule is not None and rule["action"] == "capture":
+                final_steering_config[module_full_name] = _config_entry(
+                    rule, leaf_module_type
+                )
 
     console.print(
         f"Compilation complete. {len(final_steering_config)} leaf modules marked for capture based on {len(defined_rules)} rules."
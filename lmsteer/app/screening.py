@@ -0,0 +1,278 @@
+import math
+import time
+import uuid
+from typing import Dict, Iterable, List, TypedDict
+
+import torch
+from rich.console import Console  # For status messages and the results table
+from rich.table import Table
+
+from lmsteer.app.capture import (
+    CaptureSpec,
+    build_position_selector,
+    validate_capture_spec,
+)
+from lmsteer.app.profiling import profiler
+from lmsteer.app.rules import Rule
+
+
+# Scalar statistics of one leaf module over a screening sample.
+class ScreeningResult(TypedDict):
+    module_path: str
+    module_type: str
+    num_tokens: int
+    mean_norm: float  # Mean L2 norm of the selected token activations
+    variance: float  # Mean per-feature variance
+    separation: (
+        float | None
+    )  # |mean_pos - mean_neg| / pooled std; None without a negative set
+    score: float  # Ranking key: separation when available, else variance
+
+
+class _LeafAccumulator:
+    """Running sums for one module and one prompt set (no activations are kept)."""
+
+    __slots__ = ("count", "norm_sum", "feature_sum", "square_sum")
+
+    def __init__(self):
+        self.count = 0
+        self.norm_sum = 0.0
+        self.feature_sum: torch.Tensor | None = None  # float64 [hidden]
+        self.square_sum = 0.0  # Sum of squared entries over all tokens and features
+
+    def update(self, rows: torch.Tensor) -> None:
+        rows = rows.to(torch.float64)
+        self.count += rows.shape[0]
+        self.norm_sum += rows.norm(dim=-1).sum().item()
+        self.square_sum += rows.square().sum().item()
+        feature_sum = rows.sum(dim=0)
+        self.feature_sum = (
+            feature_sum if self.feature_sum is None else self.feature_sum + feature_sum
+        )
+
+    def mean(self) -> torch.Tensor:
+        return self.feature_sum / self.count
+
+    def variance(self) -> float:
+        # Mean over features of E[x^2] - E[x]^2.
+        width = self.feature_sum.numel()
+        mean = self.mean()
+        return max(
+            self.square_sum / (self.count * width) - mean.square().mean().item(), 0.0
+        )
+
+
+class StatisticsHooks:
+    """Forward hooks that fold every leaf's selected token rows into scalar statistics.
+
+    Each hook selects token positions like ActivationCapture, flattens any
+    extra dimensions into the feature axis, and only updates running sums,
+    so the pass costs a few reductions per module and no activation copies.
+    """
+
+    def __init__(
+        self,
+        model: torch.nn.Module,
+        module_paths: List[str] | None = None,
+        capture_spec: CaptureSpec | None = None,
+    ):
+        self.model = model
+        self.capture_spec = capture_spec or {"positions": "all"}
+        validate_capture_spec(self.capture_spec)
+        if module_paths is None:
+            module_paths = [
+                name
+                for name, module in model.named_modules()
+                if name and not list(module.children())
+            ]
+        self.module_types = {
+            path: type(model.get_submodule(path)).__name__ for path in module_paths
+        }
+        self.accumulators: Dict[str, Dict[str, _LeafAccumulator]] = {}
+        self.current_set = "positive"
+        self._handles = []
+        self._batch_shape = None
+        self._selector = None
+
+    def __enter__(self) -> "StatisticsHooks":
+        self.register()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.remove()
+
+    def register(self) -> None:
+        for module_path in self.module_types:
+            module = self.model.get_submodule(module_path)
+            self._handles.append(
+                module.register_forward_hook(self._make_hook(module_path))
+            )
+
+    def remove(self) -> None:
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+
+    def set_batch(
+        self,
+        prompt_set: str,
+        input_ids: torch.Tensor,
+        attention_mask: torch.Tensor | None = None,
+        capture_mask: torch.Tensor | None = None,
+    ) -> None:
+        self.current_set = prompt_set
+        self._batch_shape = tuple(input_ids.shape[:2])
+        self._selector = build_position_selector(
+            self.capture_spec, input_ids, attention_mask, capture_mask
+        )
+
+    def _make_hook(self, module_path: str):
+        def hook(module, inputs, output):
+            start_ns = time.perf_counter_ns() if profiler.enabled else 0
+            if isinstance(output, (tuple, list)):
+                output = output[0]
+            if not isinstance(output, torch.Tensor) or not output.is_floating_point():
+                return
+            output = output.detach()
+            if output.dim() >= 2 and tuple(output.shape[:2]) == self._batch_shape:
+                batch_idx, pos_idx = self._selector
+                rows = output[batch_idx.to(output.device), pos_idx.to(output.device)]
+            else:
+                rows = output.reshape(1, -1) if output.dim() < 2 else output
+            rows = rows.reshape(rows.shape[0], -1) if rows.dim() != 2 else rows
+            if rows.shape[0] == 0:
+                return
+            per_set = self.accumulators.setdefault(module_path, {})
+            accumulator = per_set.get(self.current_set)
+            if accumulator is None:
+                accumulator = per_set[self.current_set] = _LeafAccumulator()
+            if (
+                accumulator.feature_sum is not None
+                and accumulator.feature_sum.numel() != rows.shape[1]
+            ):
+                return  # Output width changed between calls; keep the first one
+            accumulator.update(rows)
+            if start_ns:
+                profiler.record(
+                    "screening_hook", module_path, start_ns, time.perf_counter_ns()
+                )
+
+        return hook
+
+    def results(self) -> List[ScreeningResult]:
+        results: List[ScreeningResult] = []
+        for module_path, per_set in self.accumulators.items():
+            positive = per_set.get("positive")
+            negative = per_set.get("negative")
+            total = [acc for acc in (positive, negative) if acc is not None]
+            count = sum(acc.count for acc in total)
+            norm_sum = sum(acc.norm_sum for acc in total)
+            pooled = _LeafAccumulator()
+            pooled.count = count
+            pooled.norm_sum = norm_sum
+            pooled.square_sum = sum(acc.square_sum for acc in total)
+            pooled.feature_sum = sum(acc.feature_sum for acc in total)
+            variance = pooled.variance()
+
+            separation = None
+            if positive is not None and negative is not None:
+                # Difference of the set means relative to the typical per-feature spread.
+                within = (
+                    positive.variance() * positive.count
+                    + negative.variance() * negative.count
+                ) / count
+                distance = (positive.mean() - negative.mean()).norm().item()
+                width = positive.feature_sum.numel()
+                separation = distance / math.sqrt(within * width + 1e-12)
+            results.append(
+                {
+                    "module_path": module_path,
+                    "module_type": self.module_types[module_path],
+                    "num_tokens": count,
+                    "mean_norm": norm_sum / count,
+                    "variance": variance,
+                    "separation": separation,
+                    "score": separation if separation is not None else variance,
+                }
+            )
+        results.sort(key=lambda result: result["score"], reverse=True)
+        return results
+
+
+def screen_modules(
+    model: torch.nn.Module,
+    positive_batches: Iterable[dict],
+    console: Console,
+    negative_batches: Iterable[dict] | None = None,
+    capture_spec: CaptureSpec | None = None,
+    module_paths: List[str] | None = None,
+) -> List[ScreeningResult]:
+    """Runs a small sample through the model and ranks leaf modules by scalar statistics.
+
+    Every leaf (or the given module_paths) gets a statistics hook. With a
+    negative prompt set, modules are ranked by how well their mean activation
+    separates the two sets; otherwise by activation variance.
+    """
+    hooks = StatisticsHooks(model, module_paths, capture_spec)
+    console.print(f"Screening {len(hooks.module_types)} modules...")
+    model.eval()
+    sets = [("positive", positive_batches)]
+    if negative_batches is not None:
+        sets.append(("negative", negative_batches))
+    with hooks, torch.no_grad():
+        for prompt_set, batches in sets:
+            for batch in batches:
+                input_ids = batch["input_ids"]
+                attention_mask = batch.get("attention_mask")
+                hooks.set_batch(
+                    prompt_set, input_ids, attention_mask, batch.get("capture_mask")
+                )
+                model(input_ids=input_ids, attention_mask=attention_mask)
+    results = hooks.results()
+    console.print(f"[green]Screening complete. Ranked {len(results)} modules.[/green]")
+    return results
+
+
+def suggest_capture_rules(
+    results: List[ScreeningResult], top_k: int = 10, min_score: float | None = None
+) -> List[Rule]:
+    """Turns the top-ranked screening results into instance capture rules."""
+    rules: List[Rule] = []
+    for result in results[:top_k]:
+        if min_score is not None and result["score"] < min_score:
+            break
+        rules.append(
+            {
+                "id": str(uuid.uuid4()),
+                "rule_type": "instance",
+                "specifier": result["module_path"],
+                "action": "capture",
+            }
+        )
+    return rules
+
+
+def print_screening_results(
+    results: List[ScreeningResult], console: Console, limit: int = 20
+) -> None:
+    """Prints the ranked screening results as a table."""
+    table = Table(title="LMSteer module screening")
+    table.add_column("Rank", justify="right")
+    table.add_column("Module")
+    table.add_column("Type")
+    table.add_column("Mean norm", justify="right")
+    table.add_column("Variance", justify="right")
+    table.add_column("Separation", justify="right")
+    for rank, result in enumerate(results[:limit], start=1):
+        separation = result["separation"]
+        table.add_row(
+            str(rank),
+            result["module_path"],
+            result["module_type"],
+            f"{result['mean_norm']:.3f}",
+            f"{result['variance']:.4f}",
+            f"{separation:.3f}" if separation is not None else "",
+        )
+    console.print(table)
+    if len(results) > limit:
+        console.print(f"[dim]... {len(results) - limit} more modules not shown.[/dim]")
@@ -0,0 +1,539 @@
+"""Local steered-inference server with dynamic request batching.
+
+Usage:
+    python -m lmsteer.app.server --model-name gpt2 --vector-store vectors/ \
+        --profile honest=honest_steer_config.json --port 8080
+    python -m lmsteer.app.server --model-name gpt2 --unix-socket /tmp/lmsteer.sock ...
+
+The model is loaded once. Concurrent requests are queued and merged into
+batches; every row of a batch carries its own steering profile and scale, so
+requests for different profiles share one forward pass. Endpoints:
+
+    POST /generate  {"prompt": str | "input_ids": [int], "max_new_tokens": int,
+                     "profile": str | null, "scale": float}
+    GET  /stats     latency percentiles, throughput and batching counters
+    GET  /health
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, TypedDict
+
+import torch
+from rich.console import Console  # For status messages
+
+from lmsteer.app.precision import PRECISIONS
+from lmsteer.app.steering import BatchedSteeringHooks
+
+
+# Limits used when merging queued requests into one batch.
+class BatchPolicy(TypedDict):
+    max_batch_size: int  # Requests per batch
+    max_batch_tokens: int  # Padded (prompt + new) tokens per batch
+    max_wait_ms: float  # How long the first request of a batch may wait for others
+
+
+DEFAULT_BATCH_POLICY: BatchPolicy = {
+    "max_batch_size": 16,
+    "max_batch_tokens": 8192,
+    "max_wait_ms": 10.0,
+}
+
+
+class _PendingRequest:
+    def __init__(
+        self,
+        input_ids: List[int],
+        max_new_tokens: int,
+        profile: str | None,
+        scale: float,
+        future: asyncio.Future,
+    ):
+        self.input_ids = input_ids
+        self.max_new_tokens = max_new_tokens
+        self.profile = profile
+        self.scale = scale
+        self.future = future
+        self.arrival = time.perf_counter()
+
+
+class ServerStats:
+    """Latency and throughput counters over a sliding window of recent requests."""
+
+    def __init__(self, window: int = 10_000):
+        self.started = time.perf_counter()
+        self.latencies = deque(maxlen=window)  # Seconds, arrival to response
+        self.queue_waits = deque(maxlen=window)  # Seconds, arrival to batch start
+        self.requests = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.tokens_generated = 0
+        self.errors = 0
+
+    def record_batch(self, batch_size: int) -> None:
+        self.batches += 1
+        self.batched_requests += batch_size
+
+    def record_request(
+        self, latency_s: float, queue_wait_s: float, new_tokens: int
+    ) -> None:
+        self.requests += 1
+        self.tokens_generated += new_tokens
+        self.latencies.append(latency_s)
+        self.queue_waits.append(queue_wait_s)
+
+    @staticmethod
+    def _percentile(values, fraction: float) -> float:
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def snapshot(self) -> dict:
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "batches": self.batches,
+            "mean_batch_size": self.batched_requests / self.batches
+            if self.batches
+            else 0.0,
+            "tokens_generated": self.tokens_generated,
+            "latency_p50_ms": self._percentile(self.latencies, 0.50) * 1e3,
+            "latency_p99_ms": self._percentile(self.latencies, 0.99) * 1e3,
+            "queue_wait_p50_ms": self._percentile(self.queue_waits, 0.50) * 1e3,
+            "requests_per_s": self.requests / elapsed,
+            "tokens_per_s": self.tokens_generated / elapsed,
+            "uptime_s": elapsed,
+        }
+
+
+class SteeredInferenceServer:
+    """Serves greedy generation with per-request steering from one loaded model.
+
+    A single batching loop drains the request queue: it waits for a first
+    request, then keeps collecting until the batch is full (max_batch_size or
+    max_batch_tokens) or the first request has waited max_wait_ms. Generation
+    runs in a worker thread so the event loop keeps accepting requests while
+    the model is busy.
+    """
+
+    def __init__(
+        self,
+        model: torch.nn.Module,
+        tokenizer=None,
+        steering_profiles: Dict[str, Dict[str, torch.Tensor]] | None = None,
+        policy: BatchPolicy | None = None,
+        console: Console | None = None,
+    ):
+        if not hasattr(model, "generate"):
+            raise ValueError(
+                "The served model must support generate() (load it as a causal LM)"
+            )
+        self.model = model.eval()
+        self.tokenizer = tokenizer
+        self.policy: BatchPolicy = {**DEFAULT_BATCH_POLICY, **(policy or {})}
+        self.console = console or Console(quiet=True)
+        # Profiles use base-model paths (h.0.mlp, ...), as captured from an
+        # AutoModel; causal-LM models nest those under base_model_prefix.
+        self.steering = BatchedSteeringHooks(
+            getattr(model, "base_model", model), steering_profiles or {}
+        )
+        self.stats = ServerStats()
+
+        config = getattr(model, "config", None)
+        self.pad_token_id = getattr(tokenizer, "pad_token_id", None)
+        if self.pad_token_id is None:
+            self.pad_token_id = getattr(config, "pad_token_id", None)
+        if self.pad_token_id is None:
+            self.pad_token_id = getattr(config, "eos_token_id", None) or 0
+        # Requests are checked against these up front, so one bad request
+        # cannot fail the batch it would have shared.
+        self.vocab_size = getattr(config, "vocab_size", None)
+        self.max_positions = getattr(config, "n_positions", None) or getattr(
+            config, "max_position_embeddings", None
+        )
+
+        self._queue: asyncio.Queue | None = None
+        self._carry: _PendingRequest | None = (
+            None  # Request that did not fit the last batch
+        )
+        self._running: List[_PendingRequest] = []  # Batch being collected or generated
+        self._batch_task: asyncio.Task | None = None
+        self._servers: List[asyncio.AbstractServer] = []
+        # One worker: batches run back to back, never concurrently.
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="lmsteer-generate"
+        )
+
+    # --- Lifecycle ---
+
+    async def start(self) -> None:
+        """Registers the steering hooks and starts the batching loop."""
+        if self._batch_task is not None:
+            return
+        self._queue = asyncio.Queue()
+        self.steering.register()
+        self._batch_task = asyncio.create_task(self._batch_loop())
+
+    async def serve_tcp(
+        self, host: str = "127.0.0.1", port: int = 8080
+    ) -> asyncio.AbstractServer:
+        await self.start()
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        self._servers.append(server)
+        return server
+
+    async def serve_unix(self, socket_path: str) -> asyncio.AbstractServer:
+        await self.start()
+        server = await asyncio.start_unix_server(self._handle_connection, socket_path)
+        self._servers.append(server)
+        return server
+
+    async def close(self) -> None:
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+        if self._batch_task is not None:
+            self._batch_task.cancel()
+            try:
+                await self._batch_task
+            except asyncio.CancelledError:
+                pass
+            self._batch_task = None
+        # Fail every request that will never be served instead of leaving it waiting.
+        waiting = self._running + ([self._carry] if self._carry is not None else [])
+        while self._queue is not None and not self._queue.empty():
+            waiting.append(self._queue.get_nowait())
+        for item in waiting:
+            if not item.future.done():
+                item.future.set_exception(RuntimeError("The server was closed"))
+        self._running = []
+        self._carry = None
+        self.steering.remove()
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self) -> "SteeredInferenceServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.close()
+
+    # --- Requests ---
+
+    async def submit(self, request: dict) -> dict:
+        """Queues one generation request and waits for its result.
+
+        The request holds a ``prompt`` (needs a tokenizer) or ``input_ids``,
+        plus optional ``max_new_tokens`` (default 16), ``profile`` (a steering
+        profile name, or None for no steering) and ``scale`` (default 1.0).
+        """
+        if self._queue is None:
+            raise RuntimeError("The server has not been started")
+        if "input_ids" in request:
+            try:
+                input_ids = [int(token_id) for token_id in request["input_ids"]]
+            except (TypeError, ValueError):
+                raise ValueError("input_ids must be a list of integers")
+        elif "prompt" in request:
+            if self.tokenizer is None:
+                raise ValueError(
+                    "Text prompts need a tokenizer; send input_ids instead"
+                )
+            input_ids = self.tokenizer(request["prompt"])["input_ids"]
+        else:
+            raise ValueError("A request needs a 'prompt' or 'input_ids'")
+        if not input_ids:
+            raise ValueError("The prompt is empty")
+        if self.vocab_size is not None and not all(
+            0 <= token_id < self.vocab_size for token_id in input_ids
+        ):
+            raise ValueError(f"input_ids must be in [0, {self.vocab_size})")
+        try:
+            max_new_tokens = int(request.get("max_new_tokens", 16))
+            scale = float(request.get("scale", 1.0))
+        except (TypeError, ValueError):
+            raise ValueError("max_new_tokens and scale must be numbers")
+        if max_new_tokens < 1:
+            raise ValueError("max_new_tokens must be at least 1")
+        if (
+            self.max_positions is not None
+            and len(input_ids) + max_new_tokens > self.max_positions
+        ):
+            raise ValueError(
+                f"Prompt ({len(input_ids)} tokens) plus max_new_tokens ({max_new_tokens}) "
+                f"exceeds the model's {self.max_positions} positions"
+            )
+        profile = request.get("profile")
+        if profile is not None and profile not in self.steering.profiles:
+            raise ValueError(f"Unknown steering profile '{profile}'")
+
+        future = asyncio.get_running_loop().create_future()
+        pending = _PendingRequest(input_ids, max_new_tokens, profile, scale, future)
+        await self._queue.put(pending)
+        return await future
+
+    def _padded_tokens(self, batch: List[_PendingRequest]) -> int:
+        max_prompt = max(len(item.input_ids) for item in batch)
+        max_new = max(item.max_new_tokens for item in batch)
+        return len(batch) * (max_prompt + max_new)
+
+    async def _collect_batch(self) -> List[_PendingRequest]:
+        first = self._carry or await self._queue.get()
+        self._carry = None
+        batch = self._running = [first]  # Tracked so close() can fail it if cancelled
+        deadline = first.arrival + self.policy["max_wait_ms"] / 1e3
+        while len(batch) < self.policy["max_batch_size"]:
+            timeout = deadline - time.perf_counter()
+            try:
+                if timeout > 0:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                else:
+                    item = self._queue.get_nowait()  # Still take what is already queued
+            except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                break
+            if self._padded_tokens(batch + [item]) > self.policy["max_batch_tokens"]:
+                self._carry = item  # Starts the next batch
+                break
+            batch.append(item)
+        return batch
+
+    async def _batch_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            started = time.perf_counter()
+            self.stats.record_batch(len(batch))
+            try:
+                outputs = await loop.run_in_executor(
+                    self._executor, self._generate, batch
+                )
+            except Exception as e:  # Fail the whole batch, keep serving
+                self._running = []
+                self.stats.errors += len(batch)
+                self.console.print(
+                    f"[bold red]Batch of {len(batch)} failed: {e}[/bold red]"
+                )
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                continue
+            self._running = []  # Left set on cancellation, so close() can fail them
+            finished = time.perf_counter()
+            for item, new_tokens in zip(batch, outputs):
+                self.stats.record_request(
+                    finished - item.arrival, started - item.arrival, len(new_tokens)
+                )
+                if item.future.done():  # The client went away
+                    continue
+                response = {
+                    "output_ids": new_tokens,
+                    "profile": item.profile,
+                    "scale": item.scale,
+                    "batch_size": len(batch),
+                    "latency_ms": (finished - item.arrival) * 1e3,
+                }
+                if self.tokenizer is not None:
+                    response["text"] = self.tokenizer.decode(
+                        new_tokens, skip_special_tokens=True
+                    )
+                item.future.set_result(response)
+
+    def _generate(self, batch: List[_PendingRequest]) -> List[List[int]]:
+        """Runs one left-padded greedy generation for the whole batch."""
+        max_prompt = max(len(item.input_ids) for item in batch)
+        input_ids = torch.full(
+            (len(batch), max_prompt), self.pad_token_id, dtype=torch.long
+        )
+        attention_mask = torch.zeros((len(batch), max_prompt), dtype=torch.long)
+        for row, item in enumerate(batch):
+            # Left padding keeps every prompt's last token at the same position.
+            input_ids[row, max_prompt - len(item.input_ids) :] = torch.tensor(
+                item.input_ids
+            )
+            attention_mask[row, max_prompt - len(item.input_ids) :] = 1
+
+        device = next(self.model.parameters()).device
+        self.steering.set_rows(
+            [item.profile for item in batch], [item.scale for item in batch]
+        )
+        with torch.no_grad():
+            generated = self.model.generate(
+                input_ids=input_ids.to(device),
+                attention_mask=attention_mask.to(device),
+                max_new_tokens=max(item.max_new_tokens for item in batch),
+                do_sample=False,
+                pad_token_id=self.pad_token_id,
+            )
+        new_tokens = generated[:, max_prompt:].tolist()
+        return [row[: item.max_new_tokens] for row, item in zip(new_tokens, batch)]
+
+    # --- HTTP ---
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Handles one minimal HTTP/1.1 request (one request per connection)."""
+        try:
+            request_line = (await reader.readline()).decode("latin-1").strip()
+            if not request_line:
+                return
+            method, path, _ = request_line.split(" ", 2)
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+
+            if method == "GET" and path == "/health":
+                status, payload = 200, {"status": "ok"}
+            elif method == "GET" and path == "/stats":
+                status, payload = 200, self.stats.snapshot()
+            elif method == "POST" and path == "/generate":
+                try:
+                    status, payload = 200, await self.submit(json.loads(body or b"{}"))
+                except (ValueError, TypeError, KeyError) as e:
+                    status, payload = 400, {"error": str(e)}
+            else:
+                status, payload = 404, {"error": f"No route for {method} {path}"}
+        except Exception as e:
+            status, payload = 500, {"error": str(e)}
+
+        data = json.dumps(payload).encode("utf-8")
+        reason = {
+            200: "OK",
+            400: "Bad Request",
+            404: "Not Found",
+            500: "Internal Server Error",
+        }[status]
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode(
+                "latin-1"
+            )
+            + data
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+def load_steering_profiles(
+    vector_store_dir: str, profile_specs: List[str], console: Console
+) -> Dict[str, Dict[str, torch.Tensor]]:
+    """Loads 'name=config.json[:vector_name]' profiles from a steering vector store."""
+    from lmsteer.app.vector_store import SteeringVectorStore
+
+    store = SteeringVectorStore(vector_store_dir)
+    profiles = {}
+    for spec in profile_specs:
+        name, _, config_spec = spec.partition("=")
+        config_path, _, vector_name = config_spec.partition(":")
+        with open(config_path, "r") as f:
+            steering_config = json.load(f)
+        vectors = store.load_for_config(steering_config, vector_name or "default")
+        if not vectors:
+            console.print(
+                f"[yellow]Profile '{name}' has no stored vectors for {config_path}.[/yellow]"
+            )
+        profiles[name] = vectors
+        console.print(
+            f"Loaded steering profile [bold cyan]{name}[/bold cyan] ({len(vectors)} modules)."
+        )
+    return profiles
+
+
+def main():
+    from lmsteer.app.model_utils import load_model_and_tokenizer
+
+    parser = argparse.ArgumentParser(description="Serve steered generation locally.")
+    parser.add_argument(
+        "--model-name", "--model_name", dest="model_name", required=True
+    )
+    parser.add_argument(
+        "--vector-store",
+        type=str,
+        default=None,
+        help="Steering vector store directory.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="append",
+        default=[],
+        help="Steering profile as name=config.json[:vector_name]; may be repeated.",
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--unix-socket",
+        type=str,
+        default=None,
+        help="Serve on a Unix socket instead of TCP.",
+    )
+    parser.add_argument(
+        "--max-batch-size", type=int, default=DEFAULT_BATCH_POLICY["max_batch_size"]
+    )
+    parser.add_argument(
+        "--max-batch-tokens", type=int, default=DEFAULT_BATCH_POLICY["max_batch_tokens"]
+    )
+    parser.add_argument("--precision", choices=PRECISIONS, default="fp32")
+    parser.add_argument(
+        "--max-wait-ms", type=float, default=DEFAULT_BATCH_POLICY["max_wait_ms"]
+    )
+    args = parser.parse_args()
+
+    console = Console()
+    model, tokenizer = load_model_and_tokenizer(
+        args.model_name, console, causal_lm=True, precision=args.precision
+    )
+    if model is None:
+        return
+    profiles = {}
+    if args.profile:
+        if args.vector_store is None:
+            console.print("[bold red]--profile requires --vector-store.[/bold red]")
+            return
+        profiles = load_steering_profiles(args.vector_store, args.profile, console)
+
+    server = SteeredInferenceServer(
+        model,
+        tokenizer,
+        profiles,
+        policy={
+            "max_batch_size": args.max_batch_size,
+            "max_batch_tokens": args.max_batch_tokens,
+            "max_wait_ms": args.max_wait_ms,
+        },
+        console=console,
+    )
+
+    async def serve():
+        if args.unix_socket:
+            listener = await server.serve_unix(args.unix_socket)
+            console.print(f"[green]Serving on unix:{args.unix_socket}[/green]")
+        else:
+            listener = await server.serve_tcp(args.host, args.port)
+            console.print(f"[green]Serving on http://{args.host}:{args.port}[/green]")
+        try:
+            await listener.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        console.print("Server stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, TypedDict
+
+import torch
+
+from lmsteer.app.activation_store import ActivationStore
+from lmsteer.app.profiling import profiler
+
+
+# Host buffers for one shard: module path -> [capacity, ...] tensor, sized for a shard.
+StagingBuffers = Dict[str, torch.Tensor]
+
+
+class WriterStats(TypedDict):
+    shards: int
+    bytes: int
+    write_s: float  # Summed over writer threads
+    blocked_s: float  # Time the forward thread waited for a free buffer or queue slot
+
+
+class ShardWriter:
+    """Writes activation shards from a pool of background threads.
+
+    The forward thread hands each finished shard to ``submit`` and carries on
+    with the next batch while a writer thread serializes it. Capture hooks copy
+    rows into reusable staging buffers (``acquire_staging``), pinned when CUDA
+    is available, so the capture hooks allocate no new host memory once the
+    buffers are sized. Each writer thread still copies the shard it is writing
+    out of its staging buffers, so up to ``max_pending + 1 + num_workers``
+    shards are held in memory (see CaptureEstimator.peak_ram_bytes).
+
+    At most ``max_pending`` shards wait in the queue and ``max_pending + 1``
+    staging buffer sets exist; when both are used up the forward thread blocks
+    (backpressure) instead of growing memory without bound. Shards may be
+    written out of order by different threads, but they are recorded in the
+    store's index strictly in submission order, and only once their file is
+    complete.
+    """
+
+    def __init__(
+        self, store: ActivationStore, num_workers: int = 2, max_pending: int = 2
+    ):
+        if num_workers < 1 or max_pending < 1:
+            raise ValueError(
+                "ShardWriter needs at least one worker and one pending slot"
+            )
+        self.store = store
+        self.pin_memory = torch.cuda.is_available()
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._free_staging: queue.Queue = queue.Queue()
+        for _ in range(max_pending + 1):
+            self._free_staging.put({})
+        self._lock = threading.Lock()
+        self._next_shard = store.num_shards
+        self._next_record = store.num_shards
+        # Written but not yet recorded: shard index -> record_shard arguments.
+        self._written: Dict[int, tuple] = {}
+        self._error: BaseException | None = None
+        self.stats: WriterStats = {
+            "shards": 0,
+            "bytes": 0,
+            "write_s": 0.0,
+            "blocked_s": 0.0,
+        }
+        self._workers: List[threading.Thread] = [
+            threading.Thread(
+                target=self._worker, name=f"lmsteer-shard-writer-{i}", daemon=True
+            )
+            for i in range(num_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def __enter__(self) -> "ShardWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def _blocking(self, fn: Callable):
+        start_ns = time.perf_counter_ns()
+        result = fn()
+        end_ns = time.perf_counter_ns()
+        self.stats["blocked_s"] += (end_ns - start_ns) / 1e9
+        if profiler.enabled:
+            profiler.record("writer", "backpressure", start_ns, end_ns)
+        return result
+
+    def acquire_staging(self) -> StagingBuffers:
+        """Returns a free staging buffer set, waiting for a writer to release one if needed."""
+        return self._blocking(self._free_staging.get)
+
+    def submit(
+        self,
+        activations: Dict[str, torch.Tensor],
+        num_samples: int,
+        staging: StagingBuffers | None = None,
+    ) -> None:
+        """Queues one shard for writing; ``staging`` is released once its rows are copied out."""
+        self._raise_if_failed()
+        shard_idx = self._next_shard
+        self._next_shard += 1
+        self._blocking(
+            lambda: self._queue.put((shard_idx, activations, num_samples, staging))
+        )
+
+    def _worker(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            shard_idx, activations, num_samples, staging = item
+            try:
+                start_ns = time.perf_counter_ns()
+                if staging is not None:
+                    # Copy the rows out so the staging buffers can go straight back
+                    # to the capture hooks. This also compacts views of a larger
+                    # buffer, which torch.save would otherwise write whole.
+                    activations = {
+                        path: tensor.clone() for path, tensor in activations.items()
+                    }
+                    self._free_staging.put(staging)
+                    staging = None
+                shard_file_name, sha256 = self.store.save_shard_file(
+                    shard_idx, activations
+                )
+                end_ns = time.perf_counter_ns()
+                num_bytes = sum(tensor.nbytes for tensor in activations.values())
+                if profiler.enabled:
+                    profiler.record(
+                        "writer", "write_shard", start_ns, end_ns, num_bytes
+                    )
+                rows = {
+                    path: int(tensor.shape[0]) for path, tensor in activations.items()
+                }
+                self._record(
+                    shard_idx,
+                    (shard_file_name, num_samples, rows, sha256),
+                    num_bytes,
+                    (end_ns - start_ns) / 1e9,
+                )
+            except BaseException as error:  # Surfaced on the forward thread
+                with self._lock:
+                    self._error = self._error or error
+            finally:
+                if staging is not None:
+                    self._free_staging.put(staging)
+                self._queue.task_done()
+
+    def _record(
+        self, shard_idx: int, entry: tuple, num_bytes: int, write_s: float
+    ) -> None:
+        with self._lock:
+            self._written[shard_idx] = entry
+            self.stats["shards"] += 1
+            self.stats["bytes"] += num_bytes
+            self.stats["write_s"] += write_s
+            # Keep the index in submission order. A failed shard never arrives
+            # here, so nothing after it is recorded.
+            while self._next_record in self._written:
+                self.store.record_shard(*self._written.pop(self._next_record))
+                self._next_record += 1
+
+    def _raise_if_failed(self) -> None:
+        if self._error is not None:
+            raise RuntimeError("Background shard write failed") from self._error
+
+    def drain(self) -> None:
+        """Blocks until every submitted shard is written and recorded in the index."""
+        self._queue.join()
+        self._raise_if_failed()
+
+    def close(self, raise_errors: bool = True) -> None:
+        """Waits for every queued shard to be written, then stops the writer threads.
+
+        Pass raise_errors=False when another exception is already propagating,
+        so a failed write does not mask it.
+        """
+        if self._workers:
+            for _ in self._workers:
+                self._queue.put(None)
+            for worker in self._workers:
+                worker.join()
+            self._workers = []
+        if raise_errors:
+            self._raise_if_failed()
@@ -0,0 +1,259 @@
+import time
+from typing import Dict, List, Tuple
+
+import torch
+
+from lmsteer.app.profiling import profiler
+
+
+class SteeringHooks:
+    """Injects steering vectors into module outputs with forward hooks.
+
+    Each targeted module's output becomes ``output + scale * vector``, with the
+    vector broadcast over the batch and sequence dimensions. Vectors are cast
+    to the output's dtype and device on first use and cached.
+    """
+
+    def __init__(
+        self,
+        model: torch.nn.Module,
+        steering_vectors: Dict[str, torch.Tensor],
+        scale: float = 1.0,
+    ):
+        self.model = model
+        self.steering_vectors = steering_vectors
+        self.scale = scale
+        self._handles = []
+        self._cast_vectors: Dict[tuple, torch.Tensor] = {}
+
+    def __enter__(self) -> "SteeringHooks":
+        self.register()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.remove()
+
+    def register(self) -> None:
+        for module_path in self.steering_vectors:
+            module = self.model.get_submodule(module_path)
+            self._handles.append(
+                module.register_forward_hook(self._make_hook(module_path))
+            )
+
+    def remove(self) -> None:
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+
+    def set_scale(self, scale: float) -> None:
+        self.scale = scale
+
+    def _vector_for(self, module_path: str, like: torch.Tensor) -> torch.Tensor:
+        key = (module_path, like.dtype, like.device)
+        vector = self._cast_vectors.get(key)
+        if vector is None:
+            vector = self.steering_vectors[module_path].to(
+                device=like.device, dtype=like.dtype
+            )
+            self._cast_vectors[key] = vector
+        return vector
+
+    def _make_hook(self, module_path: str):
+        def hook(module, inputs, output):
+            if self.scale == 0:
+                return None
+            start_ns = time.perf_counter_ns() if profiler.enabled else 0
+            hidden = output[0] if isinstance(output, tuple) else output
+            steered = hidden + self.scale * self._vector_for(module_path, hidden)
+            if start_ns:
+                profiler.record(
+                    "steering_hook", module_path, start_ns, time.perf_counter_ns()
+                )
+            if isinstance(output, tuple):
+                return (steered,) + output[1:]
+            return steered
+
+        return hook
+
+
+class SteeredModule(torch.nn.Module):
+    """Wraps a module and adds ``scale * vector`` to its output.
+
+    Unlike a forward hook this is plain module code, so torch.compile can trace
+    it into the surrounding graph. The vector and scale are non-persistent
+    buffers: they move with the model and stay out of its state dict, and
+    changing the scale in place does not trigger a recompile.
+    """
+
+    def __init__(
+        self, module: torch.nn.Module, vector: torch.Tensor, scale: float = 1.0
+    ):
+        super().__init__()
+        self.module = module
+        self.register_buffer("vector", vector.detach().clone(), persistent=False)
+        self.register_buffer("scale", torch.tensor(float(scale)), persistent=False)
+
+    def forward(self, *args, **kwargs):
+        output = self.module(*args, **kwargs)
+        if isinstance(output, tuple):
+            hidden = output[0]
+            return (hidden + (self.scale * self.vector).to(hidden.dtype),) + output[1:]
+        return output + (self.scale * self.vector).to(output.dtype)
+
+
+class SteeringWrappers:
+    """Injects steering vectors by swapping the targeted modules for SteeredModule wrappers.
+
+    An alternative to SteeringHooks with the same interface: no Python hooks
+    run per call, and the steered model can be compiled with torch.compile.
+    remove() puts the original module objects back, so the model does not need
+    to be reloaded. Nested targets are supported: inner modules are wrapped
+    first and restored last.
+    """
+
+    def __init__(
+        self,
+        model: torch.nn.Module,
+        steering_vectors: Dict[str, torch.Tensor],
+        scale: float = 1.0,
+    ):
+        self.model = model
+        self.steering_vectors = steering_vectors
+        self.scale = scale
+        self.wrappers: Dict[str, SteeredModule] = {}
+        # (parent, attribute name, original module), in wrapping order.
+        self._swapped: List[Tuple[torch.nn.Module, str, torch.nn.Module]] = []
+
+    def __enter__(self) -> "SteeringWrappers":
+        self.register()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.remove()
+
+    def register(self) -> None:
+        try:
+            # Deepest paths first, so an outer wrapper encloses the inner wrappers.
+            for module_path in sorted(
+                self.steering_vectors, key=lambda path: -path.count(".")
+            ):
+                if not module_path:
+                    raise ValueError("SteeringWrappers cannot wrap the model root")
+                parent_path, _, name = module_path.rpartition(".")
+                parent = self.model.get_submodule(parent_path)
+                module = getattr(parent, name)
+                reference = next(module.parameters(), None)
+                vector = self.steering_vectors[module_path]
+                if reference is not None:
+                    vector = vector.to(device=reference.device, dtype=reference.dtype)
+                wrapper = SteeredModule(module, vector, self.scale)
+                setattr(parent, name, wrapper)
+                self._swapped.append((parent, name, module))
+                self.wrappers[module_path] = wrapper
+        except BaseException:
+            self.remove()  # Do not leave the modules swapped so far in place
+            raise
+
+    def remove(self) -> None:
+        for parent, name, module in reversed(self._swapped):
+            setattr(parent, name, module)
+        self._swapped = []
+        self.wrappers = {}
+
+    def set_scale(self, scale: float) -> None:
+        self.scale = scale
+        for wrapper in self.wrappers.values():
+            wrapper.scale.fill_(scale)
+
+
+class BatchedSteeringHooks:
+    """Applies a different steering profile and scale to each row of a batch.
+
+    A profile is a named dict of module path to steering vector (e.g. the
+    vectors of one steering config). Before each batch, set_rows() builds one
+    [batch, hidden] delta per module (scale_i * vector_i, or zeros for rows
+    whose profile does not target the module); the hooks then add that delta
+    to every position with a single broadcast add.
+    """
+
+    def __init__(
+        self, model: torch.nn.Module, profiles: Dict[str, Dict[str, torch.Tensor]]
+    ):
+        self.model = model
+        self.profiles = profiles
+        self.module_paths = sorted(
+            {path for vectors in profiles.values() for path in vectors}
+        )
+        self._handles = []
+        self._deltas: Dict[str, torch.Tensor] = {}
+
+    def __enter__(self) -> "BatchedSteeringHooks":
+        self.register()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.remove()
+
+    def register(self) -> None:
+        for module_path in self.module_paths:
+            module = self.model.get_submodule(module_path)
+            self._handles.append(
+                module.register_forward_hook(self._make_hook(module_path))
+            )
+
+    def remove(self) -> None:
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+
+    def set_rows(self, profile_names: List[str | None], scales: List[float]) -> None:
+        """Selects the profile (or None for no steering) and scale of every row."""
+        unknown = [
+            name
+            for name in profile_names
+            if name is not None and name not in self.profiles
+        ]
+        if unknown:
+            raise KeyError(f"Unknown steering profile(s): {sorted(set(unknown))}")
+        self._deltas = {}
+        for module_path in self.module_paths:
+            rows = []
+            any_steered = False
+            for name, scale in zip(profile_names, scales):
+                vector = (
+                    self.profiles[name].get(module_path) if name is not None else None
+                )
+                if vector is None or scale == 0:
+                    rows.append(None)
+                else:
+                    rows.append(scale * vector.to(torch.float32))
+                    any_steered = True
+            if not any_steered:
+                continue  # The hook is a no-op for this module in this batch
+            template = next(row for row in rows if row is not None)
+            self._deltas[module_path] = torch.stack(
+                [row if row is not None else torch.zeros_like(template) for row in rows]
+            )
+
+    def _make_hook(self, module_path: str):
+        def hook(module, inputs, output):
+            delta = self._deltas.get(module_path)
+            if delta is None:
+                return None
+            start_ns = time.perf_counter_ns() if profiler.enabled else 0
+            hidden = output[0] if isinstance(output, tuple) else output
+            if hidden.shape[0] != delta.shape[0]:
+                return None
+            delta = delta.to(device=hidden.device, dtype=hidden.dtype)
+            steered = hidden + delta.view(
+                delta.shape[0], *([1] * (hidden.dim() - 2)), -1
+            )
+            if start_ns:
+                profiler.record(
+                    "steering_hook", module_path, start_ns, time.perf_counter_ns()
+                )
+            if isinstance(output, tuple):
+                return (steered,) + output[1:]
+            return steered
+
+        return hook
@@ -0,0 +1,174 @@
+from typing import Dict, List, Literal, Mapping, TypedDict
+
+import torch
+
+from lmsteer.app.activation_store import ActivationStore
+
+
+# Sufficient statistics of one module's activations, accumulated shard by shard.
+class ReducerState(TypedDict):
+    count: int
+    sum: torch.Tensor  # [hidden], float64
+    sum_outer: torch.Tensor | None  # [hidden, hidden], float64; only needed for PCA
+
+
+def _update_reducer_state(
+    state: ReducerState | None, rows: torch.Tensor, track_outer: bool
+) -> ReducerState:
+    rows = rows.reshape(rows.shape[0], -1).to(torch.float64)
+    if state is None:
+        hidden = rows.shape[1]
+        state = {
+            "count": 0,
+            "sum": torch.zeros(hidden, dtype=torch.float64),
+            "sum_outer": (
+                torch.zeros(hidden, hidden, dtype=torch.float64)
+                if track_outer
+                else None
+            ),
+        }
+    state["count"] += rows.shape[0]
+    state["sum"] += rows.sum(dim=0)
+    if state["sum_outer"] is not None:
+        state["sum_outer"] += rows.T @ rows
+    return state
+
+
+def reduce_activations(
+    source: ActivationStore | Mapping[str, torch.Tensor],
+    module_paths: List[str] | None = None,
+    track_outer: bool = False,
+) -> Dict[str, ReducerState]:
+    """Reduces captured activations to per-module reducer states.
+
+    The source is either an ActivationStore (read one shard at a time) or an
+    in-memory dict of module path to [rows, ...] tensors, as returned by
+    run_observation. Set track_outer to keep the second moments needed for PCA.
+    """
+    shards = source.iter_shards() if isinstance(source, ActivationStore) else [source]
+    states: Dict[str, ReducerState] = {}
+    for shard in shards:
+        update_reducer_states(states, shard, module_paths, track_outer)
+    return states
+
+
+def update_reducer_states(
+    states: Dict[str, ReducerState],
+    shard: Mapping[str, torch.Tensor],
+    module_paths: List[str] | None = None,
+    track_outer: bool = False,
+) -> Dict[str, ReducerState]:
+    """Folds one shard of activations into per-module reducer states, in place."""
+    wanted = set(module_paths) if module_paths is not None else None
+    for module_path, rows in shard.items():
+        if wanted is not None and module_path not in wanted:
+            continue
+        states[module_path] = _update_reducer_state(
+            states.get(module_path), rows, track_outer
+        )
+    return states
+
+
+def merge_reducer_states(a: ReducerState, b: ReducerState) -> ReducerState:
+    """Combines the reducer states of two disjoint sets of activations."""
+    return {
+        "count": a["count"] + b["count"],
+        "sum": a["sum"] + b["sum"],
+        "sum_outer": (
+            a["sum_outer"] + b["sum_outer"]
+            if a["sum_outer"] is not None and b["sum_outer"] is not None
+            else None
+        ),
+    }
+
+
+def _as_reducer_states(
+    source, module_paths: List[str] | None, track_outer: bool
+) -> Dict[str, ReducerState]:
+    if isinstance(source, Mapping) and all(
+        isinstance(value, dict) and "count" in value for value in source.values()
+    ):
+        return dict(source)  # Already reducer states
+    return reduce_activations(source, module_paths, track_outer)
+
+
+def compute_steering_vectors(
+    positive,
+    negative,
+    steering_config: dict | None = None,
+    method: Literal["mean_diff", "pca"] = "mean_diff",
+    normalize: bool = False,
+) -> Dict[str, torch.Tensor]:
+    """Computes a steering vector for every module captured in both prompt sets.
+
+    ``positive`` and ``negative`` are each an ActivationStore, an in-memory dict of
+    activations, or a dict of ReducerStates. Modules with the same width are
+    stacked into one [modules, hidden] batch, so the math runs as a handful of
+    batched tensor ops instead of a Python loop over modules.
+
+    - "mean_diff": mean(positive) - mean(negative).
+    - "pca": the top principal component of the pooled activations (computed
+      with one batched eigendecomposition), oriented along mean_diff and scaled
+      to its projection on the mean difference.
+    """
+    if method not in ("mean_diff", "pca"):
+        raise ValueError(f"Unknown steering vector method '{method}'")
+    track_outer = method == "pca"
+    module_paths = list(steering_config) if steering_config is not None else None
+    positive_states = _as_reducer_states(positive, module_paths, track_outer)
+    negative_states = _as_reducer_states(negative, module_paths, track_outer)
+
+    ordered_paths = [
+        path
+        for path in (module_paths if module_paths is not None else positive_states)
+        if path in positive_states and path in negative_states
+    ]
+
+    # Group modules by width so each group becomes one stacked tensor.
+    groups: Dict[int, List[str]] = {}
+    for path in ordered_paths:
+        groups.setdefault(positive_states[path]["sum"].shape[0], []).append(path)
+
+    steering_vectors: Dict[str, torch.Tensor] = {}
+    for paths in groups.values():
+        pos_count = torch.tensor(
+            [positive_states[p]["count"] for p in paths], dtype=torch.float64
+        ).unsqueeze(1)
+        neg_count = torch.tensor(
+            [negative_states[p]["count"] for p in paths], dtype=torch.float64
+        ).unsqueeze(1)
+        pos_sum = torch.stack([positive_states[p]["sum"] for p in paths])
+        neg_sum = torch.stack([negative_states[p]["sum"] for p in paths])
+        mean_diff = pos_sum / pos_count - neg_sum / neg_count  # [modules, hidden]
+
+        if method == "pca":
+            if any(
+                positive_states[p]["sum_outer"] is None
+                or negative_states[p]["sum_outer"] is None
+                for p in paths
+            ):
+                raise ValueError(
+                    "PCA steering vectors need reducer states with sum_outer"
+                )
+            total_count = (pos_count + neg_count).unsqueeze(2)  # [modules, 1, 1]
+            mean = ((pos_sum + neg_sum) / total_count.squeeze(2)).unsqueeze(2)
+            second_moment = (
+                torch.stack([positive_states[p]["sum_outer"] for p in paths])
+                + torch.stack([negative_states[p]["sum_outer"] for p in paths])
+            ) / total_count
+            covariance = second_moment - mean @ mean.transpose(1, 2)
+            _, eigenvectors = torch.linalg.eigh(covariance)  # Ascending eigenvalues
+            direction = eigenvectors[:, :, -1]  # [modules, hidden]
+            projection = (direction * mean_diff).sum(dim=1, keepdim=True)
+            vectors = direction * projection
+        else:
+            vectors = mean_diff
+
+        if normalize:
+            vectors = vectors / vectors.norm(dim=1, keepdim=True).clamp_min(1e-12)
+        vectors = vectors.to(torch.float32)
+        for index, path in enumerate(paths):
+            steering_vectors[path] = vectors[index].clone()
+
+    # Keep steering config (or capture) order regardless of grouping.
+    return {path: steering_vectors[path] for path in ordered_paths}
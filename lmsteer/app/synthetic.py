@@ -0,0 +1,175 @@
+import random
+from typing import List
+
+import torch
+from torch import nn
+
+from lmsteer.app.rules import Rule
+
+
+# Tiny transformer building blocks with Hugging Face-like module names, so
+# synthetic models exercise the same paths (layers.N.attn.q_proj, ...) as real ones.
+class SyntheticAttention(nn.Module):
+    def __init__(self, hidden_size: int, num_heads: int):
+        super().__init__()
+        self.num_heads = num_heads
+        self.q_proj = nn.Linear(hidden_size, hidden_size)
+        self.k_proj = nn.Linear(hidden_size, hidden_size)
+        self.v_proj = nn.Linear(hidden_size, hidden_size)
+        self.o_proj = nn.Linear(hidden_size, hidden_size)
+
+    def forward(self, hidden_states: torch.Tensor) -> torch.Tensor:
+        batch_size, seq_len, hidden_size = hidden_states.shape
+        head_dim = hidden_size // self.num_heads
+
+        def split_heads(x):
+            return x.view(batch_size, seq_len, self.num_heads, head_dim).transpose(1, 2)
+
+        attended = nn.functional.scaled_dot_product_attention(
+            split_heads(self.q_proj(hidden_states)),
+            split_heads(self.k_proj(hidden_states)),
+            split_heads(self.v_proj(hidden_states)),
+            is_causal=True,
+        )
+        return self.o_proj(
+            attended.transpose(1, 2).reshape(batch_size, seq_len, hidden_size)
+        )
+
+
+class SyntheticMLP(nn.Module):
+    def __init__(self, hidden_size: int, mlp_ratio: int, extra_leaves: int = 0):
+        super().__init__()
+        self.fc_in = nn.Linear(hidden_size, hidden_size * mlp_ratio)
+        self.act = nn.GELU()
+        self.fc_out = nn.Linear(hidden_size * mlp_ratio, hidden_size)
+        # Optional identity leaves to widen the module tree without adding compute.
+        self.extra = (
+            nn.ModuleList(nn.Identity() for _ in range(extra_leaves))
+            if extra_leaves
+            else None
+        )
+
+    def forward(self, hidden_states: torch.Tensor) -> torch.Tensor:
+        hidden_states = self.fc_out(self.act(self.fc_in(hidden_states)))
+        for extra_leaf in self.extra or ():
+            hidden_states = extra_leaf(hidden_states)
+        return hidden_states
+
+
+class SyntheticBlock(nn.Module):
+    def __init__(
+        self, hidden_size: int, num_heads: int, mlp_ratio: int, extra_leaves: int
+    ):
+        super().__init__()
+        self.ln_1 = nn.LayerNorm(hidden_size)
+        self.attn = SyntheticAttention(hidden_size, num_heads)
+        self.ln_2 = nn.LayerNorm(hidden_size)
+        self.mlp = SyntheticMLP(hidden_size, mlp_ratio, extra_leaves)
+
+    def forward(self, hidden_states: torch.Tensor) -> torch.Tensor:
+        hidden_states = hidden_states + self.attn(self.ln_1(hidden_states))
+        return hidden_states + self.mlp(self.ln_2(hidden_states))
+
+
+class SyntheticTransformer(nn.Module):
+    """A configurable decoder-only transformer that needs no download."""
+
+    def __init__(
+        self,
+        num_layers: int = 2,
+        hidden_size: int = 32,
+        num_heads: int = 2,
+        mlp_ratio: int = 4,
+        vocab_size: int = 128,
+        extra_leaves_per_block: int = 0,
+    ):
+        super().__init__()
+        self.embed_tokens = nn.Embedding(vocab_size, hidden_size)
+        self.layers = nn.ModuleList(
+            SyntheticBlock(hidden_size, num_heads, mlp_ratio, extra_leaves_per_block)
+            for _ in range(num_layers)
+        )
+        self.norm = nn.LayerNorm(hidden_size)
+
+    def forward(
+        self, input_ids: torch.Tensor, attention_mask: torch.Tensor | None = None
+    ) -> torch.Tensor:
+        hidden_states = self.embed_tokens(input_ids)
+        for layer in self.layers:
+            hidden_states = layer(hidden_states)
+        return self.norm(hidden_states)
+
+
+# Modules per block with no extra leaves: the block, ln_1, attn (+4 projections),
+# ln_2 and mlp (+fc_in, act, fc_out).
+MODULES_PER_BLOCK = 12
+# The model itself, embed_tokens, the layers ModuleList and the final norm.
+MODULES_OUTSIDE_BLOCKS = 4
+
+
+def build_synthetic_model(
+    num_modules: int | None = None,
+    num_layers: int = 2,
+    hidden_size: int = 32,
+    num_heads: int = 2,
+    mlp_ratio: int = 4,
+    vocab_size: int = 128,
+    extra_leaves_per_block: int = 0,
+) -> SyntheticTransformer:
+    """Builds a synthetic transformer, optionally sized to roughly num_modules modules."""
+    if num_modules is not None:
+        # Extra leaves also add their `extra` ModuleList container.
+        per_block = (
+            MODULES_PER_BLOCK + extra_leaves_per_block + bool(extra_leaves_per_block)
+        )
+        num_layers = max(1, (num_modules - MODULES_OUTSIDE_BLOCKS) // per_block)
+    return SyntheticTransformer(
+        num_layers=num_layers,
+        hidden_size=hidden_size,
+        num_heads=num_heads,
+        mlp_ratio=mlp_ratio,
+        vocab_size=vocab_size,
+        extra_leaves_per_block=extra_leaves_per_block,
+    ).eval()
+
+
+def generate_synthetic_rules(
+    model: nn.Module, num_rules: int, seed: int = 0
+) -> List[Rule]:
+    """Generates a reproducible mix of instance, path pattern and module type rules."""
+    rng = random.Random(seed)
+    leaf_paths = [
+        (name, type(module).__name__)
+        for name, module in model.named_modules()
+        if name and not list(module.children())
+    ]
+    leaf_types = sorted({module_type for _, module_type in leaf_paths})
+    num_layers = len(getattr(model, "layers", [])) or 1
+
+    rules: List[Rule] = []
+    for rule_idx in range(num_rules):
+        action = "capture" if rng.random() < 0.7 else "skip"
+        kind = rng.random()
+        if kind < 0.6:
+            rule_type, specifier = "instance", rng.choice(leaf_paths)[0]
+        elif kind < 0.9:
+            rule_type = "path_pattern"
+            specifier = rng.choice(
+                [
+                    f"layers.{rng.randrange(num_layers)}.*",
+                    "layers.*.mlp.*",
+                    "layers.*.attn.?_proj",
+                    f"layers.{rng.randrange(num_layers)}.attn.*",
+                ]
+            )
+        else:
+            rule_type, specifier = "module_type", rng.choice(leaf_types)
+        rules.append(
+            {
+                "id": f"rule-{rule_idx}",
+                "rule_type": rule_type,
+                "specifier": specifier,
+                "action": action,
+            }
+        )
+    return rules
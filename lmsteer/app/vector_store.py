@@ -0,0 +1,239 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, List, TypedDict
+
+import torch
+
+from lmsteer.app.config_io import steering_config_hash
+
+try:
+    import fcntl  # POSIX only; used to serialize concurrent writers
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+
+# Offsets are padded so every vector can be viewed in place as any dtype.
+_ALIGNMENT = 64
+
+
+# Location of one stored vector version inside the data file.
+class VectorEntry(TypedDict):
+    offset: int
+    nbytes: int
+    dtype: str
+    shape: List[int]
+    version: int
+    created: float
+
+
+def _entry_key(module_path: str, config_hash: str, name: str) -> str:
+    return f"{config_hash}:{module_path}:{name}"
+
+
+class SteeringVectorStore:
+    """Append-only, memory-mapped store for steering vectors.
+
+    All vectors live in one data file (``vectors.bin``); ``index.json`` maps
+    (config hash, module path, vector name) to the byte range of every stored
+    version. Lookups are a dict access into a memory map of the data file;
+    every returned tensor is its own copy of just that vector's bytes, so
+    callers may modify it in place.
+
+    Writers append data first and then atomically replace the index, so readers
+    in other processes always see a consistent index; they pick up new entries
+    on refresh(), which lookups call automatically on a miss.
+    """
+
+    DATA_FILE_NAME = "vectors.bin"
+    INDEX_FILE_NAME = "index.json"
+    LOCK_FILE_NAME = ".lock"
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        os.makedirs(self.root_dir, exist_ok=True)
+        self._data_path = os.path.join(self.root_dir, self.DATA_FILE_NAME)
+        self._index_path = os.path.join(self.root_dir, self.INDEX_FILE_NAME)
+        if not os.path.exists(self._data_path):
+            open(self._data_path, "ab").close()
+        self._entries: Dict[str, List[VectorEntry]] = {}
+        self._index_stamp = None
+        self._mapped: torch.Tensor | None = None  # uint8 view of the data file
+        self.refresh()
+
+    # --- Reading ---
+
+    def refresh(self) -> None:
+        """Reloads the index if another writer has replaced it."""
+        try:
+            stat = os.stat(self._index_path)
+        except FileNotFoundError:
+            return
+        stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        if stamp == self._index_stamp:
+            return
+        with open(self._index_path, "r") as f:
+            self._entries = json.load(f)["entries"]
+        self._index_stamp = stamp
+
+    def _data_view(self, end: int) -> torch.Tensor:
+        # The data file only grows; remap when an entry lies past the current map.
+        if self._mapped is None or self._mapped.numel() < end:
+            size = os.path.getsize(self._data_path)
+            self._mapped = torch.from_file(
+                self._data_path, shared=False, size=size, dtype=torch.uint8
+            )
+        return self._mapped
+
+    def _find(self, key: str, version: int | None) -> VectorEntry | None:
+        versions = self._entries.get(key)
+        if not versions:
+            return None
+        if version is None:
+            return versions[-1]
+        for entry in versions:
+            if entry["version"] == version:
+                return entry
+        return None
+
+    def get(
+        self,
+        module_path: str,
+        config_hash: str,
+        name: str = "default",
+        version: int | None = None,
+    ) -> torch.Tensor:
+        """Returns a copy of a stored vector (the latest version unless one is given)."""
+        key = _entry_key(module_path, config_hash, name)
+        entry = self._find(key, version)
+        if entry is None:
+            self.refresh()
+            entry = self._find(key, version)
+            if entry is None:
+                raise KeyError(
+                    f"No steering vector stored for '{key}' (version {version})"
+                )
+        end = entry["offset"] + entry["nbytes"]
+        raw = self._data_view(end)[entry["offset"] : end]
+        # Clone: views would share the map, so an in-place edit would leak into later gets.
+        return raw.view(getattr(torch, entry["dtype"])).view(entry["shape"]).clone()
+
+    def versions(
+        self, module_path: str, config_hash: str, name: str = "default"
+    ) -> List[int]:
+        self.refresh()
+        key = _entry_key(module_path, config_hash, name)
+        return [entry["version"] for entry in self._entries.get(key, [])]
+
+    def load_for_config(
+        self, steering_config: dict, name: str = "default"
+    ) -> Dict[str, torch.Tensor]:
+        """Returns the latest vectors for the modules of a steering config.
+
+        Modules of the config without a stored vector are left out.
+        """
+        self.refresh()
+        config_hash = steering_config_hash(steering_config)
+        vectors = {}
+        for module_path in steering_config:
+            if _entry_key(module_path, config_hash, name) in self._entries:
+                vectors[module_path] = self.get(module_path, config_hash, name)
+        return vectors
+
+    # --- Writing ---
+
+    @contextmanager
+    def _write_lock(self):
+        with open(os.path.join(self.root_dir, self.LOCK_FILE_NAME), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def put_many(
+        self,
+        vectors: Dict[str, torch.Tensor],
+        config_hash: str,
+        name: str = "default",
+    ) -> int:
+        """Appends vectors for several modules as one new version and returns it."""
+        with self._write_lock():
+            # Another process may have appended since our last refresh.
+            self._index_stamp = None
+            self.refresh()
+            version = 1 + max(
+                (
+                    versions[-1]["version"]
+                    for module_path in vectors
+                    for versions in [
+                        self._entries.get(
+                            _entry_key(module_path, config_hash, name), []
+                        )
+                    ]
+                    if versions
+                ),
+                default=0,
+            )
+            created = time.time()
+            with open(self._data_path, "ab") as f:
+                offset = f.tell()
+                for module_path, vector in vectors.items():
+                    padding = -offset % _ALIGNMENT
+                    f.write(b"\0" * padding)
+                    offset += padding
+                    data = (
+                        vector.detach().cpu().contiguous().reshape(-1).view(torch.uint8)
+                    )
+                    f.write(data.numpy().tobytes())
+                    self._entries.setdefault(
+                        _entry_key(module_path, config_hash, name), []
+                    ).append(
+                        {
+                            "offset": offset,
+                            "nbytes": data.numel(),
+                            "dtype": str(vector.dtype).replace("torch.", ""),
+                            "shape": list(vector.shape),
+                            "version": version,
+                            "created": created,
+                        }
+                    )
+                    offset += data.numel()
+                f.flush()
+                os.fsync(f.fileno())
+
+            # Data is durable before the index that points at it is published.
+            tmp_path = f"{self._index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"entries": self._entries}, f)
+            os.replace(tmp_path, self._index_path)
+            self._index_stamp = None
+            self.refresh()
+        return version
+
+    def put(
+        self,
+        module_path: str,
+        vector: torch.Tensor,
+        config_hash: str,
+        name: str = "default",
+    ) -> int:
+        """Appends one vector and returns its version number."""
+        return self.put_many({module_path: vector}, config_hash, name)
+
+    def put_for_config(
+        self,
+        vectors: Dict[str, torch.Tensor],
+        steering_config: dict,
+        name: str = "default",
+    ) -> int:
+        """Stores vectors keyed by the hash of the steering config they belong to."""
+        unknown = [path for path in vectors if path not in steering_config]
+        if unknown:
+            raise ValueError(
+                f"Vectors for modules not in the steering config: {unknown}"
+            )
+        return self.put_many(vectors, steering_config_hash(steering_config), name)
@@ -1,3 +1,7 @@
+import threading
+import time
+
+from textual import work
 from textual.app import App, ComposeResult
 from textual.containers import Horizontal, Vertical
 from textual.widgets import (
@@ -14,9 +18,18 @@ from textual.binding import (
     Binding,
 )  # Correct: Binding from textual.binding (Forcing update)
 from textual.events import Key, Focus
+from textual.worker import get_current_worker
+
+from rich.console import Console
 
 from lmsteer.app.model_utils import ModuleNode
-# from rules import Rule
+from lmsteer.app.estimator import CaptureEstimator, format_bytes
+from lmsteer.app.compile_cache import compile_rules_cached
+from lmsteer.app.preview import PreviewCache, compute_activation_preview, sparkline
+from lmsteer.tui.status_overlay import StatusOverlay
+
+# Cursor moves within this window cancel a pending preview before it runs.
+PREVIEW_DEBOUNCE_S = 0.05
 
 
 class CustomTree(Tree):
@@ -48,6 +61,16 @@ class CustomTree(Tree):
         if prevent_default:
             event.stop()
 
+    def set_labels(self, updates) -> None:
+        """Relabels many nodes with a single repaint.
+
+        Each TreeNode.set_label schedules a refresh of its own line; inside
+        batch_update those refreshes are applied in one screen update.
+        """
+        with self.app.batch_update():
+            for node, label in updates:
+                node.set_label(label)
+
     def action_select_cursor(self) -> None:
         """Called when the cursor is selected (e.g. by pressing Enter).
         We override this to prevent toggling the node, but still allow
@@ -103,13 +126,43 @@ class LMSteerApp(App):
 
     CSS_PATH = "tui.css"
 
-    def __init__(self, model_root: ModuleNode, model_name: str, *args, **kwargs):
+    def __init__(
+        self,
+        model_root: ModuleNode,
+        model_name: str,
+        *args,
+        capture_estimator: CaptureEstimator | None = None,
+        num_samples: int = 1000,
+        memory_budget_bytes: int | None = None,
+        preview_tokenizer=None,
+        preview_prompt: str | None = None,
+        preview_cache_size: int = 256,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
         self.model_root = model_root
         self.model_name = model_name
         self.defined_rules = []
+        self.steering_config = {}
         self.title = f"LMSteer - {self.model_name}"
 
+        # Optional capture cost projection shown in the details pane.
+        self.capture_estimator = capture_estimator
+        self.num_samples = num_samples
+        self.memory_budget_bytes = memory_budget_bytes
+
+        # Optional live activation preview on a sample prompt, computed in a
+        # background worker and cached per (module path, prompt).
+        self.preview_tokenizer = preview_tokenizer
+        self.preview_prompt = preview_prompt
+        self.preview_cache = PreviewCache(preview_cache_size)
+        self._preview_inputs = None
+        self._preview_lock = threading.Lock()  # One preview forward pass at a time
+        self._highlighted_module: ModuleNode | None = None
+
+        # [C]/[S]/[I] prefixes and subtree aggregates for the module tree.
+        self.status_overlay = StatusOverlay(model_root)
+
     def compose(self) -> ComposeResult:
         yield Header(show_clock=False)
 
@@ -158,19 +211,42 @@ class LMSteerApp(App):
             label = (
                 f"{child_model_node.name}  [dim]({child_model_node.module_type})[/dim]"
             )
+            for group in child_model_node.template_groups:
+                label += f"  [dim]{len(group.instances)} × {group.template.module_type}[/dim]"
             new_textual_node = textual_tree_node.add(
-                label, data=child_model_node, allow_expand=not child_model_node.is_leaf
+                self.status_overlay.register(child_model_node, label),
+                data=child_model_node,
+                allow_expand=not child_model_node.is_leaf,
             )
-            if not child_model_node.is_leaf:
+            self.status_overlay.bind(child_model_node, new_textual_node)
+            # Instances of a shared template stay collapsed and are only
+            # populated when expanded (see on_tree_node_expanded).
+            if not child_model_node.is_leaf and child_model_node.template is None:
                 self._add_nodes_to_tree(new_textual_node, child_model_node)
 
+    def on_tree_node_expanded(self, event: Tree.NodeExpanded) -> None:
+        """Populates template instance nodes the first time they are expanded."""
+        model_node = event.node.data
+        if (
+            isinstance(model_node, ModuleNode)
+            and not model_node.is_leaf
+            and not event.node.children
+        ):
+            self._add_nodes_to_tree(event.node, model_node)
+
     def on_mount(self) -> None:
         # Store references to the widgets
         self.module_tree_widget = self.query_one("#module_tree", CustomTree)
         self.context_pane_widget = self.query_one("#context_pane", Vertical)
 
         # Populate the tree
-        self._add_nodes_to_tree(self.module_tree_widget.root, self.model_root)
+        root = self.module_tree_widget.root
+        root.set_label(self.status_overlay.register(self.model_root, str(root.label)))
+        self.status_overlay.bind(self.model_root, root)
+        self._add_nodes_to_tree(root, self.model_root)
+
+        if self.capture_estimator is not None or self.defined_rules:
+            self._recompile_steering_config()
 
         # Set initial focus to the tree
         self.module_tree_widget.focus()
@@ -193,6 +269,155 @@ class LMSteerApp(App):
                 self.context_pane_widget.add_class("pane-focused")
             if self.module_tree_widget.has_class("pane-focused"):
                 self.module_tree_widget.remove_class("pane-focused")
+
+    def _recompile_steering_config(self) -> None:
+        """Recompiles the defined rules and refreshes the tree's status prefixes."""
+        self.steering_config = compile_rules_cached(
+            self.defined_rules,
+            self.model_root.module,
+            Console(quiet=True),
+            module_root=self.model_root,
+        )
+        self.module_tree_widget.set_labels(
+            self.status_overlay.update(self.steering_config, self.defined_rules)
+        )
+
+    def set_defined_rules(self, defined_rules) -> None:
+        """Replaces the rule list and relabels only the tree nodes whose status changed."""
+        self.defined_rules = list(defined_rules)
+        self._recompile_steering_config()
+
+    def _template_details(self, module_node: ModuleNode) -> str:
+        """Returns detail lines describing shared templates at or below a module."""
+        details = ""
+        if module_node.template is not None and module_node.instance_index is not None:
+            group = next(
+                group
+                for group in module_node.parent_node.template_groups
+                if module_node in group.instances
+            )
+            details += (
+                f"[bold]Shared Template:[/bold] instance {module_node.instance_index + 1} "
+                f"of {len(group.instances)} (all blocks: {group.path_pattern()})\n"
+            )
+        for group in module_node.template_groups:
+            details += (
+                f"[bold]Repeated Blocks:[/bold] {len(group.instances)} × "
+                f"{group.template.module_type}, {len(group.template.leaf_paths())} "
+                f"leaves each (all blocks: {group.path_pattern()})\n"
+            )
+        return details
+
+    def _module_cost_details(self, module_node: ModuleNode) -> str:
+        """Returns the projected capture cost lines for a module and the whole config."""
+        estimator = self.capture_estimator
+        module_path = module_node.get_full_path()
+        shape = estimator.module_shapes.get(module_path)
+        if shape is None:
+            module_line = "[bold]Projected Capture Cost:[/bold] (no tensor output)\n"
+        else:
+            per_sample = estimator.capture_bytes_per_sample(module_path)
+            module_line = (
+                f"[bold]Output Shape:[/bold] ({', '.join(map(str, shape['output_shape']))}) "
+                f"{shape['dtype']}\n"
+                f"[bold]Projected Capture Cost:[/bold] {format_bytes(per_sample)}/sample, "
+                f"{format_bytes(per_sample * self.num_samples)} for {self.num_samples} samples\n"
+            )
+
+        if self.memory_budget_bytes is not None:
+            try:
+                cost = estimator.plan(
+                    self.steering_config, self.num_samples, self.memory_budget_bytes
+                )
+            except ValueError as e:
+                return (
+                    module_line + f"[bold]Config Capture Cost:[/bold] [red]{e}[/red]\n"
+                )
+        else:
+            cost = estimator.estimate(self.steering_config, self.num_samples)
+        config_line = (
+            f"[bold]Config Capture Cost:[/bold] {len(cost['module_bytes'])} modules, "
+            f"{format_bytes(cost['total_bytes'])} total, "
+            f"peak RAM {format_bytes(cost['peak_ram_bytes'])} "
+            f"(batch {cost['batch_size']}, shard {cost['shard_size']})\n"
+        )
+        return module_line + config_line
+
+    def _preview_enabled(self) -> bool:
+        if self.preview_tokenizer is None or not self.preview_prompt:
+            return False
+        model = self.model_root.module
+        parameter = next(model.parameters(), None) if model is not None else None
+        # A meta-device skeleton has no weights to run.
+        return model is not None and (
+            parameter is None or parameter.device.type != "meta"
+        )
+
+    def _activation_preview_details(self, module_node: ModuleNode) -> str:
+        """Returns the cached activation preview lines, scheduling the preview on a miss."""
+        if not self._preview_enabled():
+            return ""
+        module_path = module_node.get_full_path()
+        preview = self.preview_cache.get(module_path, self.preview_prompt)
+        if preview is None:
+            self._compute_activation_preview(module_path)
+            return "[bold]Activation Preview:[/bold] [dim]computing...[/dim]\n"
+        if preview["shape"] is None:
+            return "[bold]Activation Preview:[/bold] (no tensor output)\n"
+        return (
+            f"[bold]Activation Preview:[/bold] ({', '.join(map(str, preview['shape']))}) "
+            f"{preview['dtype']}, norm {preview['norm']:.3f}, "
+            f"mean token norm {preview['mean_token_norm']:.3f}\n"
+            f"[bold]Histogram:[/bold] {sparkline(preview['histogram'])} "
+            f"(min {preview['min']:.3f}, max {preview['max']:.3f}, std {preview['std']:.3f})\n"
+        )
+
+    @work(thread=True, exclusive=True, group="activation_preview")
+    def _compute_activation_preview(self, module_path: str) -> None:
+        """Computes a preview off the UI thread; newer highlights cancel older ones."""
+        worker = get_current_worker()
+        time.sleep(PREVIEW_DEBOUNCE_S)
+        if worker.is_cancelled:
+            return
+        prompt = self.preview_prompt
+        with self._preview_lock:
+            if self.preview_cache.get(module_path, prompt) is None:
+                if worker.is_cancelled:
+                    return
+                if self._preview_inputs is None:
+                    self._preview_inputs = self.preview_tokenizer(
+                        prompt, return_tensors="pt"
+                    )
+                preview = compute_activation_preview(
+                    self.model_root.module,
+                    module_path,
+                    self._preview_inputs["input_ids"],
+                    self._preview_inputs.get("attention_mask"),
+                )
+                self.preview_cache.put(module_path, prompt, preview)
+        self.call_from_thread(self._on_activation_preview_ready, module_path)
+
+    def _on_activation_preview_ready(self, module_path: str) -> None:
+        """Refreshes the details text if the previewed module is still highlighted."""
+        module_node = self._highlighted_module
+        if module_node is not None and module_node.get_full_path() == module_path:
+            self.query_one("#module_info_static", Static).update(
+                self._module_details_text(module_node)
+            )
+
+    def _module_details_text(self, module_node: ModuleNode) -> str:
+        details = (
+            f"[bold]Full Path:[/bold] {module_node.get_full_path() or '(root)'}\n"
+            f"[bold]Module Type:[/bold] {module_node.module_type}\n"
+            f"[bold]Is Leaf:[/bold] {module_node.is_leaf}\n"
+            f"[bold]Children Count:[/bold] {len(module_node.children)}\n"
+        )
+        details += self._template_details(module_node)
+        if self.capture_estimator is not None:
+            details += self._module_cost_details(module_node)
+        details += self._activation_preview_details(module_node)
+        return details
+
     def _update_module_details(self, module_node: ModuleNode | None) -> None:
         """Updates the context pane with details of the given module_node."""
         context_title_widget = self.query_one("#context_pane_title", Static)
@@ -213,13 +438,8 @@ class LMSteerApp(App):
                 f"Details for: [bold]{module_node.name}[/bold] ([italic]{module_node.module_type}[/italic])"
             )
 
-            details = (
-                f"[bold]Full Path:[/bold] {module_node.get_full_path() or '(root)'}\n"
-                f"[bold]Module Type:[/bold] {module_node.module_type}\n"
-                f"[bold]Is Leaf:[/bold] {module_node.is_leaf}\n"
-                f"[bold]Children Count:[/bold] {len(module_node.children)}\n"
-            )
-            module_info_widget.update(details)
+            self._highlighted_module = module_node
+            module_info_widget.update(self._module_details_text(module_node))
 
             # Update and enable UI elements for module-specific actions
             radio_capture.label = (
@@ -241,6 +461,7 @@ class LMSteerApp(App):
             )
 
         else:  # No module selected
+            self._highlighted_module = None
             context_title_widget.update("Context / Rule Definition")
             module_info_widget.update(
                 "Highlight a module in the tree to see details and set its capture status. "
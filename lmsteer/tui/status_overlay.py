@@ -0,0 +1,172 @@
+from typing import Dict, List, Tuple
+
+from textual.widgets.tree import TreeNode
+
+from lmsteer.app.model_utils import ModuleNode
+from lmsteer.app.rules import Rule, resolve_leaf_actions
+
+
+STATUS_INHERIT = 0
+STATUS_CAPTURE = 1
+STATUS_SKIP = 2
+
+# Prefixes are markup-escaped so Rich does not read "[C]" as a style tag.
+STATUS_PREFIXES = {
+    STATUS_INHERIT: "\\[I]",
+    STATUS_CAPTURE: "\\[C]",
+    STATUS_SKIP: "\\[S]",
+}
+MIXED_PREFIX = "\\[~]"
+
+
+class StatusOverlay:
+    """Keeps the [C]/[S]/[I] status of every leaf and the labels derived from it.
+
+    Leaf statuses live in one bytearray indexed by the leaf's position in
+    depth-first order, so every subtree covers a contiguous index range.
+    Tree nodes are registered as they are added to the widget (template
+    instances are only added when expanded); each registered internal node
+    caches its captured/skipped counts. update() diffs the new statuses
+    against the array, adjusts the counts of registered ancestors of changed
+    leaves only, and returns just the labels that actually changed, to be
+    applied in one batch.
+    """
+
+    def __init__(self, model_root: ModuleNode):
+        self.model_root = model_root
+        self.leaves: List[Tuple[str, str]] = list(model_root.iter_leaves())
+        self.leaf_index: Dict[str, int] = {
+            path: i for i, (path, _) in enumerate(self.leaves)
+        }
+        self.statuses = bytearray(len(self.leaves))  # All STATUS_INHERIT
+        # path -> (tree node, model node, base label, current label)
+        self._nodes: Dict[str, list] = {}
+        self._ranges: Dict[str, Tuple[int, int]] = {}
+        self._counts: Dict[str, List[int]] = {}  # path -> [captured, skipped]
+
+    def _leaf_range(self, model_node: ModuleNode) -> Tuple[int, int]:
+        path = model_node.get_full_path()
+        leaf_range = self._ranges.get(path)
+        if leaf_range is None:
+            if model_node.is_leaf:
+                start = self.leaf_index.get(path, 0)
+                leaf_range = (start, start + 1 if path in self.leaf_index else start)
+            else:
+                leaf_iter = model_node.iter_leaves()
+                first = next(leaf_iter, None)
+                if first is None:
+                    leaf_range = (0, 0)
+                else:
+                    start = self.leaf_index[first[0]]
+                    if model_node._children is None:  # Unexpanded template instance
+                        count = len(model_node.template.leaf_paths())
+                    else:
+                        count = 1 + sum(1 for _ in leaf_iter)
+                    leaf_range = (start, start + count)
+            self._ranges[path] = leaf_range
+        return leaf_range
+
+    def _label(self, path: str, model_node: ModuleNode, base_label: str) -> str:
+        if model_node.is_leaf:
+            index = self.leaf_index.get(path)
+            if index is None:
+                return base_label
+            return f"{STATUS_PREFIXES[self.statuses[index]]} {base_label}"
+        start, end = self._leaf_range(model_node)
+        total = end - start
+        if total == 0:
+            return base_label
+        captured, skipped = self._counts[path]
+        if captured == total:
+            prefix = STATUS_PREFIXES[STATUS_CAPTURE]
+        elif skipped == total:
+            prefix = STATUS_PREFIXES[STATUS_SKIP]
+        elif captured == 0 and skipped == 0:
+            prefix = STATUS_PREFIXES[STATUS_INHERIT]
+        else:
+            prefix = MIXED_PREFIX
+        aggregate = f"{captured}/{total} captured"
+        if skipped:
+            aggregate += f", {skipped} skipped"
+        return f"{prefix} {base_label}  [dim]{aggregate}[/dim]"
+
+    def register(self, model_node: ModuleNode, base_label: str) -> str:
+        """Starts tracking a module shown in the tree and returns its decorated label.
+
+        Call bind() with the TreeNode once it has been added.
+        """
+        path = model_node.get_full_path()
+        if not model_node.is_leaf:
+            start, end = self._leaf_range(model_node)
+            self._counts[path] = [
+                self.statuses.count(STATUS_CAPTURE, start, end),
+                self.statuses.count(STATUS_SKIP, start, end),
+            ]
+        label = self._label(path, model_node, base_label)
+        self._nodes[path] = [None, model_node, base_label, label]
+        return label
+
+    def bind(self, model_node: ModuleNode, tree_node: TreeNode) -> None:
+        self._nodes[model_node.get_full_path()][0] = tree_node
+
+    def compute_statuses(
+        self, steering_config: dict, defined_rules: List[Rule]
+    ) -> bytearray:
+        """Derives every leaf's status from the compiled config (and skip rules)."""
+        statuses = bytearray(len(self.leaves))
+        for path in steering_config:
+            index = self.leaf_index.get(path)
+            if index is not None:
+                statuses[index] = STATUS_CAPTURE
+        # The compiled config only lists captured leaves; resolve skips only if any exist.
+        if any(rule["action"] == "skip" for rule in defined_rules):
+            for index, action in enumerate(
+                resolve_leaf_actions(defined_rules, self.leaves)
+            ):
+                if action == "skip" and statuses[index] != STATUS_CAPTURE:
+                    statuses[index] = STATUS_SKIP
+        return statuses
+
+    def _ancestor_paths(self, leaf_path: str):
+        yield ""  # The root
+        position = leaf_path.find(".")
+        while position != -1:
+            yield leaf_path[:position]
+            position = leaf_path.find(".", position + 1)
+
+    def update(
+        self, steering_config: dict, defined_rules: List[Rule]
+    ) -> List[Tuple[TreeNode, str]]:
+        """Applies new statuses and returns (tree node, label) for labels that changed."""
+        new_statuses = self.compute_statuses(steering_config, defined_rules)
+        if new_statuses == self.statuses:
+            return []
+        dirty = set()
+        for index, (old, new) in enumerate(zip(self.statuses, new_statuses)):
+            if old == new:
+                continue
+            leaf_path = self.leaves[index][0]
+            if leaf_path in self._nodes:
+                dirty.add(leaf_path)
+            for ancestor_path in self._ancestor_paths(leaf_path):
+                counts = self._counts.get(ancestor_path)
+                if counts is None:
+                    continue  # Not shown in the tree (yet)
+                if old != STATUS_INHERIT:
+                    counts[old - 1] -= 1
+                if new != STATUS_INHERIT:
+                    counts[new - 1] += 1
+                dirty.add(ancestor_path)
+        self.statuses = new_statuses
+
+        changes = []
+        for path in dirty:
+            entry = self._nodes.get(path)
+            if entry is None or entry[0] is None:
+                continue
+            tree_node, model_node, base_label, old_label = entry
+            label = self._label(path, model_node, base_label)
+            if label != old_label:
+                entry[3] = label
+                changes.append((tree_node, label))
+        return changes
@@ -2,6 +2,8 @@ import argparse
 from rich.console import Console
 
 from lmsteer.app.model_utils import load_model_and_tokenizer, build_module_tree
+from lmsteer.app.estimator import CaptureEstimator
+from lmsteer.app.precision import PRECISIONS
 # from rules import Rule, compile_rules_to_steering_config # TUI will handle rules
 # from config_io import save_steering_config # TUI will handle saving
 
@@ -20,17 +22,79 @@ def main():
         required=True,
         help="Name of the Hugging Face model to steer (e.g., 'openai-community/gpt2', 'bert-base-uncased').",
     )
+    parser.add_argument(
+        "--num-samples",
+        "--num_samples",
+        dest="num_samples",
+        type=int,
+        default=1000,
+        help="Dataset size used to project capture cost in the TUI.",
+    )
+    parser.add_argument(
+        "--seq-len",
+        "--seq_len",
+        dest="seq_len",
+        type=int,
+        default=128,
+        help="Sequence length used to project capture cost in the TUI.",
+    )
+    parser.add_argument(
+        "--memory-budget-gb",
+        "--memory_budget_gb",
+        dest="memory_budget_gb",
+        type=float,
+        default=None,
+        help="If set, batch and shard sizes are planned to fit this memory budget.",
+    )
+    parser.add_argument(
+        "--preview-prompt",
+        "--preview_prompt",
+        dest="preview_prompt",
+        type=str,
+        default=None,
+        help="If set, the TUI previews activation statistics of the highlighted module on this prompt.",
+    )
+    parser.add_argument(
+        "--precision",
+        choices=PRECISIONS,
+        default="fp32",
+        help="CPU compute precision: bf16 weights, or dynamic int8 quantization of Linear layers.",
+    )
     args = parser.parse_args()
 
     console = Console()  # Still used by load_model_and_tokenizer
-    model, tokenizer = load_model_and_tokenizer(args.model_name_arg, console)
+    model, tokenizer = load_model_and_tokenizer(
+        args.model_name_arg, console, precision=args.precision
+    )
 
     if model and tokenizer:
         console.print("Building module tree for the model...")
-        model_root_node = build_module_tree(model)
-        console.print("Module tree built. Launching TUI...")
+        # Repeated blocks share one template, so large models build quickly.
+        model_root_node = build_module_tree(model, share_templates=True)
+        console.print("Module tree built.")
+
+        console.print("Projecting capture cost (meta-device dry run)...")
+        capture_estimator = None
+        try:
+            capture_estimator = CaptureEstimator(model_root_node, seq_len=args.seq_len)
+        except Exception as e:
+            console.print(f"[yellow]Capture cost projection unavailable: {e}[/yellow]")
+        memory_budget_bytes = (
+            int(args.memory_budget_gb * 1024**3)
+            if args.memory_budget_gb is not None
+            else None
+        )
+        console.print("Launching TUI...")
 
-        app = LMSteerApp(model_root=model_root_node, model_name=args.model_name_arg)
+        app = LMSteerApp(
+            model_root=model_root_node,
+            model_name=args.model_name_arg,
+            capture_estimator=capture_estimator,
+            num_samples=args.num_samples,
+            memory_budget_bytes=memory_budget_bytes,
+            preview_tokenizer=tokenizer,
+            preview_prompt=args.preview_prompt,
+        )
         app.run()
 
         # The TUI will eventually be responsible for collecting rules and triggering compilation/saving.
@@ -2,29 +2,39 @@ import pytest
 from typing import AsyncGenerator
 from textual.pilot import Pilot
 from lmsteer.tui.app import LMSteerApp
-from lmsteer.app.model_utils import ModuleNode, load_model_and_tokenizer, build_module_tree
-from rich.console import Console
+from lmsteer.app.model_utils import build_module_tree
+
 
 @pytest.fixture
-async def app() -> AsyncGenerator[LMSteerApp, None]:
+async def app(tiny_gpt2) -> AsyncGenerator[LMSteerApp, None]:
     """
     Pytest fixture to provide an instance of LMSteerApp for testing.
-    Uses a known, relatively small model.
+    Uses the tiny GPT-2 below, so the TUI tests run offline; its module tree
+    has the same structure as the hub's gpt2 (GPT2Model -> wte, wpe, drop, h, ln_f).
     The app instance is yielded before run_test() is called.
     """
-    model_name_str = "openai-community/gpt2"
-    
-    # Load the model and build the module tree
-    try:
-        console = Console()
-        model, _ = load_model_and_tokenizer(model_name_str, console=console)
-        if model is None: # Handle case where model loading failed
-            pytest.fail(f"Model loading failed for {model_name_str}")
-        actual_model_root = build_module_tree(model)
-    except Exception as e:
-        pytest.fail(f"Failed to load model or build module tree for tests: {e}")
-
-    app_instance = LMSteerApp(model_root=actual_model_root, model_name=model_name_str)
+    app_instance = LMSteerApp(
+        model_root=build_module_tree(tiny_gpt2), model_name="tiny-gpt2"
+    )
     yield app_instance
     # app_instance will be cleaned up by Textual when the test using it finishes,
     # especially if run_test() is used as a context manager in the test.
+
+
+@pytest.fixture
+def tiny_gpt2():
+    """A tiny, randomly initialised GPT-2 built from a config (no download needed)."""
+    import torch
+    from transformers import GPT2Config, GPT2Model
+
+    torch.manual_seed(0)
+    config = GPT2Config(
+        vocab_size=100,
+        n_positions=64,
+        n_embd=32,
+        n_layer=2,
+        n_head=2,
+        bos_token_id=0,
+        eos_token_id=0,
+    )
+    return GPT2Model(config).eval()
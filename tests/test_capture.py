@@ -0,0 +1,89 @@
+import pytest
+import torch
+from rich.console import Console
+
+from lmsteer.app.activation_store import ActivationStore
+from lmsteer.app.capture import build_position_selector, run_observation
+from lmsteer.app.rules import compile_rules_to_steering_config
+
+
+def _mlp_config(model):
+    rules = [
+        {
+            "id": "r1",
+            "rule_type": "path_pattern",
+            "specifier": "h.*.mlp.c_proj",
+            "action": "capture",
+        }
+    ]
+    return compile_rules_to_steering_config(rules, model, Console(quiet=True))
+
+
+def _batch():
+    input_ids = torch.tensor([[5, 6, 7, 8], [9, 5, 0, 0]])
+    attention_mask = torch.tensor([[1, 1, 1, 1], [1, 1, 0, 0]])
+    return {"input_ids": input_ids, "attention_mask": attention_mask}
+
+
+def test_last_and_first_selectors_skip_padding():
+    batch = _batch()
+    _, last = build_position_selector(
+        {"positions": "last"}, batch["input_ids"], batch["attention_mask"]
+    )
+    assert last.tolist() == [3, 1]
+
+    left_padded = torch.tensor([[0, 0, 1, 1], [1, 1, 1, 1]])
+    _, first = build_position_selector(
+        {"positions": "first"}, batch["input_ids"], left_padded
+    )
+    assert first.tolist() == [2, 0]
+
+
+@pytest.mark.parametrize(
+    "capture_spec, expected_rows",
+    [
+        ({"positions": "all"}, 6),
+        ({"positions": "last"}, 2),
+        ({"positions": "first"}, 2),
+        ({"positions": "token_ids", "token_ids": [5]}, 2),
+    ],
+)
+def test_run_observation_selects_positions(tiny_gpt2, capture_spec, expected_rows):
+    config = _mlp_config(tiny_gpt2)
+    activations = run_observation(
+        tiny_gpt2, [_batch()], config, Console(quiet=True), capture_spec
+    )
+    assert set(activations) == {"h.0.mlp.c_proj", "h.1.mlp.c_proj"}
+    for tensor in activations.values():
+        assert tensor.shape == (expected_rows, 32)
+
+
+def test_last_token_capture_matches_full_output(tiny_gpt2):
+    config = _mlp_config(tiny_gpt2)
+    batch = _batch()
+    full = run_observation(tiny_gpt2, [batch], config, Console(quiet=True))
+    last = run_observation(
+        tiny_gpt2, [batch], config, Console(quiet=True), {"positions": "last"}
+    )
+    # "all" keeps non-padding tokens in order: row 3 is the last token of sample 0,
+    # row 5 the last token of sample 1.
+    torch.testing.assert_close(last["h.1.mlp.c_proj"], full["h.1.mlp.c_proj"][[3, 5]])
+
+
+def test_mask_capture_writes_shards(tiny_gpt2, tmp_path):
+    config = _mlp_config(tiny_gpt2)
+    batch = _batch()
+    batch["capture_mask"] = torch.tensor([[0, 1, 1, 0], [1, 0, 0, 0]])
+    store = ActivationStore(str(tmp_path / "acts"))
+    run_observation(
+        tiny_gpt2,
+        [batch, batch],
+        config,
+        Console(quiet=True),
+        {"positions": "mask"},
+        store=store,
+        shard_size=2,
+    )
+    assert store.num_shards == 2
+    assert store.num_samples == 4
+    assert store.load_module("h.0.mlp.c_proj").shape == (6, 32)
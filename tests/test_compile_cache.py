@@ -0,0 +1,89 @@
+import torch
+from rich.console import Console
+
+from lmsteer.app.compile_cache import CompileCache, tree_fingerprint
+from lmsteer.app.model_utils import build_module_tree
+from lmsteer.app.precision import convert_precision
+from lmsteer.app.rules import compile_rules_to_steering_config
+from lmsteer.app.steering import SteeringWrappers
+
+RULES = [
+    {
+        "id": "r1",
+        "rule_type": "module_type",
+        "specifier": "Conv1D",
+        "action": "capture",
+    },
+    {"id": "r2", "rule_type": "path_pattern", "specifier": "h.0.*", "action": "skip"},
+]
+
+
+def test_cache_hit_returns_memoized_config(tiny_gpt2):
+    cache = CompileCache()
+    console = Console(quiet=True)
+    first = cache.compile(RULES, tiny_gpt2, console)
+    second = cache.compile(list(RULES), tiny_gpt2, console)
+    assert second is first
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert first == compile_rules_to_steering_config(RULES, tiny_gpt2, console)
+
+
+def test_rule_changes_invalidate_entry(tiny_gpt2):
+    cache = CompileCache()
+    console = Console(quiet=True)
+    before = cache.compile(RULES, tiny_gpt2, console)
+    # Reordering changes precedence, so it must also change the key.
+    reordered = [RULES[1], RULES[0]]
+    after = cache.compile(reordered, tiny_gpt2, console)
+    assert cache.misses == 2
+    assert after == compile_rules_to_steering_config(reordered, tiny_gpt2, console)
+    assert set(after) == set(before)
+
+
+def test_tree_fingerprint_matches_for_model_and_template_tree(tiny_gpt2):
+    root = build_module_tree(tiny_gpt2, share_templates=True)
+    assert tree_fingerprint(tiny_gpt2) == tree_fingerprint(tiny_gpt2, root)
+
+
+def test_disk_cache_is_shared_across_instances(tiny_gpt2, tmp_path):
+    console = Console(quiet=True)
+    CompileCache(cache_dir=str(tmp_path)).compile(RULES, tiny_gpt2, console)
+    fresh = CompileCache(cache_dir=str(tmp_path))
+    config = fresh.compile(RULES, tiny_gpt2, console)
+    assert (fresh.hits, fresh.misses) == (1, 0)
+    assert config == compile_rules_to_steering_config(RULES, tiny_gpt2, console)
+
+
+def test_module_swaps_are_detected_by_the_model_fingerprint(tiny_gpt2):
+    cache = CompileCache()
+    console = Console(quiet=True)
+    original = tree_fingerprint(tiny_gpt2)
+    before = cache.compile(RULES, tiny_gpt2, console)
+    assert "h.1.mlp.c_fc" in before
+
+    with SteeringWrappers(tiny_gpt2, {"h.1.mlp": torch.zeros(32)}):
+        assert tree_fingerprint(tiny_gpt2) != original
+        wrapped = cache.compile(RULES, tiny_gpt2, console)
+        assert "h.1.mlp.module.c_fc" in wrapped and "h.1.mlp.c_fc" not in wrapped
+    assert tree_fingerprint(tiny_gpt2) == original
+    assert cache.compile(RULES, tiny_gpt2, console) is before
+
+    # int8 conversion turns Conv1D leaves into quantized Linear layers in place.
+    convert_precision(tiny_gpt2, "int8", inplace=True)
+    assert tree_fingerprint(tiny_gpt2) != original
+    quantized = cache.compile(RULES, tiny_gpt2, console)
+    assert not any(
+        entry["action"] == "capture_leaf_activations" for entry in quantized.values()
+    )
+
+
+def test_swaps_made_by_user_code_are_detected(tiny_gpt2):
+    cache = CompileCache()
+    console = Console(quiet=True)
+    original = tree_fingerprint(tiny_gpt2)
+    cache.compile(RULES, tiny_gpt2, console)
+    # No lmsteer helper is involved, so nothing could have invalidated the entry by hand.
+    tiny_gpt2.h[1].mlp.c_fc = torch.nn.Linear(32, 128)
+    assert tree_fingerprint(tiny_gpt2) != original
+    after = cache.compile(RULES, tiny_gpt2, console)
+    assert cache.misses == 2 and "h.1.mlp.c_fc" not in after
@@ -0,0 +1,138 @@
+import json
+import threading
+
+import pytest
+import torch
+from rich.console import Console
+
+from lmsteer.app import dataset_cache
+from lmsteer.app.dataset_cache import (
+    iter_dataset_texts,
+    load_or_build_tokenized_dataset,
+    tokenizer_fingerprint,
+)
+
+
+@pytest.fixture
+def word_tokenizer():
+    """A whitespace word-level fast tokenizer built in memory (no download needed)."""
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import PreTrainedTokenizerFast
+
+    vocab = {"[PAD]": 0, "[UNK]": 1}
+    for word in "the cat sat on mat dog ran far a very long sentence".split():
+        vocab[word] = len(vocab)
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    return PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, pad_token="[PAD]", unk_token="[UNK]"
+    )
+
+
+@pytest.fixture
+def jsonl_dataset(tmp_path):
+    path = tmp_path / "prompts.jsonl"
+    texts = [
+        "the cat sat",
+        "a dog ran far",
+        "",
+        "the mat",
+        "a very long sentence on the mat",
+    ] * 3
+    path.write_text(
+        "\n".join(json.dumps({"text": text}) if text else "" for text in texts)
+    )
+    return path
+
+
+def test_iter_dataset_texts_reads_jsonl_and_text(jsonl_dataset, tmp_path):
+    assert list(iter_dataset_texts(str(jsonl_dataset)))[:2] == [
+        "the cat sat",
+        "a dog ran far",
+    ]
+    text_path = tmp_path / "prompts.txt"
+    text_path.write_text("one\n\ntwo\n")
+    assert list(iter_dataset_texts(str(text_path))) == ["one", "two"]
+
+
+def test_cache_round_trip_matches_tokenizer(
+    word_tokenizer, jsonl_dataset, tmp_path, monkeypatch
+):
+    console = Console(quiet=True)
+    dataset = load_or_build_tokenized_dataset(
+        word_tokenizer,
+        str(jsonl_dataset),
+        str(tmp_path / "cache"),
+        console,
+        chunk_size=3,
+        num_workers=2,
+    )
+    texts = list(iter_dataset_texts(str(jsonl_dataset)))
+    assert len(dataset) == len(texts) == 12
+    for index, text in enumerate(texts):
+        assert dataset[index].tolist() == word_tokenizer(text)["input_ids"]
+
+    batch = next(
+        dataset.iter_batches(batch_size=2, pad_token_id=0, padding_side="left")
+    )
+    assert batch["input_ids"].tolist() == [[0, 2, 3, 4], [10, 7, 8, 9]]
+    assert batch["attention_mask"].tolist() == [[0, 1, 1, 1], [1, 1, 1, 1]]
+
+    # A second run must reuse the cache without tokenizing anything.
+    def fail(*args, **kwargs):
+        raise AssertionError("the cached dataset was tokenized again")
+
+    monkeypatch.setattr(dataset_cache, "build_tokenized_dataset", fail)
+    monkeypatch.setattr(
+        dataset_cache, "dataset_fingerprint", fail
+    )  # Unchanged file: not re-hashed
+    cached = load_or_build_tokenized_dataset(
+        word_tokenizer, str(jsonl_dataset), str(tmp_path / "cache"), console
+    )
+    assert torch.equal(cached.tokens, dataset.tokens)
+    assert torch.equal(cached.lengths, dataset.lengths)
+
+
+def test_cache_key_changes_with_dataset_and_tokenizer(
+    word_tokenizer, jsonl_dataset, tmp_path
+):
+    cache_root = tmp_path / "cache"
+    console = Console(quiet=True)
+    first = load_or_build_tokenized_dataset(
+        word_tokenizer, str(jsonl_dataset), str(cache_root), console
+    )
+    jsonl_dataset.write_text(json.dumps({"text": "the dog"}) + "\n")
+    second = load_or_build_tokenized_dataset(
+        word_tokenizer, str(jsonl_dataset), str(cache_root), console
+    )
+    assert first.cache_dir != second.cache_dir and len(second) == 1
+
+    fingerprint = tokenizer_fingerprint(word_tokenizer)
+    word_tokenizer.add_tokens(["zebra"])
+    assert tokenizer_fingerprint(word_tokenizer) != fingerprint
+
+
+def test_each_worker_thread_tokenizes_with_its_own_copy(
+    word_tokenizer, jsonl_dataset, tmp_path, monkeypatch
+):
+    used = []
+    tokenize_chunk = dataset_cache._tokenize_chunk
+
+    def recording_tokenize_chunk(tokenizer, texts, max_length):
+        used.append((threading.get_ident(), id(tokenizer)))
+        return tokenize_chunk(tokenizer, texts, max_length)
+
+    monkeypatch.setattr(dataset_cache, "_tokenize_chunk", recording_tokenize_chunk)
+    load_or_build_tokenized_dataset(
+        word_tokenizer,
+        str(jsonl_dataset),
+        str(tmp_path),
+        Console(quiet=True),
+        chunk_size=1,
+        num_workers=3,
+    )
+    tokenizers_by_thread = {}
+    for thread_id, tokenizer_id in used:
+        assert tokenizers_by_thread.setdefault(thread_id, tokenizer_id) == tokenizer_id
+    assert id(word_tokenizer) not in tokenizers_by_thread.values()
+    assert len(set(tokenizers_by_thread.values())) == len(tokenizers_by_thread)
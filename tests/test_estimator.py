@@ -0,0 +1,104 @@
+import pytest
+import torch
+from rich.console import Console
+
+from lmsteer.app.estimator import CaptureEstimator
+from lmsteer.app.model_utils import build_module_tree
+from lmsteer.app.rules import compile_rules_to_steering_config
+from lmsteer.tui.app import LMSteerApp
+
+
+def _capture_config(model):
+    rules = [
+        {
+            "id": "r1",
+            "rule_type": "module_type",
+            "specifier": "LayerNorm",
+            "action": "capture",
+        }
+    ]
+    return compile_rules_to_steering_config(rules, model, Console(quiet=True))
+
+
+def test_dry_run_shapes_do_not_touch_weights(tiny_gpt2):
+    estimator = CaptureEstimator(build_module_tree(tiny_gpt2), seq_len=16)
+    shape = estimator.module_shapes["h.0.mlp.c_fc"]
+    assert shape["output_shape"] == [1, 16, 128]
+    assert shape["token_aligned"]
+    # The real model's parameters stay on the CPU.
+    assert not next(tiny_gpt2.parameters()).is_meta
+
+
+def test_estimate_scales_with_selected_positions(tiny_gpt2):
+    config = _capture_config(tiny_gpt2)  # 5 LayerNorms of width 32
+    estimator = CaptureEstimator(build_module_tree(tiny_gpt2), seq_len=16)
+    full = estimator.estimate(config, num_samples=10)
+    assert full["total_bytes"] == 5 * 10 * 16 * 32 * 4
+
+    last_estimator = CaptureEstimator(
+        build_module_tree(tiny_gpt2), seq_len=16, capture_spec={"positions": "last"}
+    )
+    last = last_estimator.estimate(config, num_samples=10)
+    assert last["total_bytes"] == full["total_bytes"] // 16
+
+
+def test_estimate_uses_the_model_dtype(tiny_gpt2):
+    config = _capture_config(tiny_gpt2)
+    full = CaptureEstimator(build_module_tree(tiny_gpt2), seq_len=16).estimate(
+        config, num_samples=10
+    )
+    estimator = CaptureEstimator(
+        build_module_tree(tiny_gpt2.to(torch.bfloat16)), seq_len=16
+    )
+    assert estimator.module_shapes["h.0.ln_1"]["dtype"] == "bfloat16"
+    assert (
+        estimator.estimate(config, num_samples=10)["total_bytes"]
+        == full["total_bytes"] // 2
+    )
+
+
+def test_plan_fits_memory_budget(tiny_gpt2):
+    config = _capture_config(tiny_gpt2)
+    estimator = CaptureEstimator(build_module_tree(tiny_gpt2), seq_len=16)
+    budget = estimator.weights_bytes + 2 * 1024 * 1024
+    cost = estimator.plan(config, num_samples=100_000, memory_budget_bytes=budget)
+    assert cost["peak_ram_bytes"] <= budget
+    assert cost["shard_size"] % cost["batch_size"] == 0
+
+    with pytest.raises(ValueError):
+        estimator.plan(config, 100, memory_budget_bytes=estimator.weights_bytes // 2)
+
+
+def test_peak_ram_charges_every_buffered_shard_of_the_writer(tiny_gpt2):
+    config = _capture_config(tiny_gpt2)
+    estimator = CaptureEstimator(build_module_tree(tiny_gpt2), seq_len=16)
+    shard_bytes = (64 + 8) * 5 * 16 * 32 * 4
+    synchronous = estimator.peak_ram_bytes(config, 8, 64, num_writers=0)
+    background = estimator.peak_ram_bytes(
+        config, 8, 64, num_writers=2, max_pending_shards=2
+    )
+    assert (
+        background - synchronous == (3 + 2 - 1) * shard_bytes
+    )  # 3 staging sets + 2 writer copies
+
+    budget = estimator.weights_bytes + 2 * 1024 * 1024
+    planned = estimator.plan(config, 100_000, budget)
+    assert (
+        planned["shard_size"]
+        < estimator.plan(config, 100_000, budget, num_writers=0)["shard_size"]
+    )
+
+
+async def test_details_pane_shows_projected_cost(tiny_gpt2):
+    model_root = build_module_tree(tiny_gpt2)
+    app = LMSteerApp(
+        model_root=model_root,
+        model_name="tiny-gpt2",
+        capture_estimator=CaptureEstimator(model_root, seq_len=16),
+        num_samples=10,
+    )
+    async with app.run_test() as pilot:
+        await pilot.pause()
+        details = app.query_one("#module_info_static").renderable
+        assert "[bold]Projected Capture Cost:[/bold]" in details
+        assert "[bold]Config Capture Cost:[/bold] 0 modules" in details
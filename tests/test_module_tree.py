@@ -0,0 +1,106 @@
+import pytest
+from rich.console import Console
+from textual.widgets import Tree
+
+from lmsteer.app.model_utils import build_module_tree
+from lmsteer.app.rules import compile_rules_to_steering_config
+from lmsteer.tui.app import LMSteerApp
+
+
+def _leaves(node):
+    if node.is_leaf:
+        return [node.get_full_path()]
+    return [path for child in node.children for path in _leaves(child)]
+
+
+def test_repeated_blocks_share_one_template(tiny_gpt2):
+    root = build_module_tree(tiny_gpt2, share_templates=True)
+    h_node = next(child for child in root.children if child.name == "h")
+    assert len(h_node.template_groups) == 1
+    group = h_node.template_groups[0]
+    assert [node.name for node in group.instances] == ["0", "1"]
+    assert group.instances[0].template is group.instances[1].template
+    assert group.path_pattern("mlp.c_fc") == "h.*.mlp.c_fc"
+
+    # Lazily materialized children still match the full tree.
+    full_root = build_module_tree(tiny_gpt2)
+    assert _leaves(root) == _leaves(full_root)
+    assert [path for path, _ in root.iter_leaves()] == _leaves(full_root)
+
+
+@pytest.mark.parametrize(
+    "rules",
+    [
+        [
+            {
+                "id": "t",
+                "rule_type": "module_type",
+                "specifier": "Conv1D",
+                "action": "capture",
+            }
+        ],
+        [
+            {
+                "id": "t",
+                "rule_type": "module_type",
+                "specifier": "Conv1D",
+                "action": "capture",
+            },
+            {
+                "id": "p",
+                "rule_type": "path_pattern",
+                "specifier": "h.1.*",
+                "action": "skip",
+            },
+            {
+                "id": "i",
+                "rule_type": "instance",
+                "specifier": "h.1.mlp.c_fc",
+                "action": "capture",
+            },
+        ],
+        [
+            {
+                "id": "p",
+                "rule_type": "path_pattern",
+                "specifier": "*.ln_*",
+                "action": "capture",
+            },
+            {
+                "id": "t",
+                "rule_type": "module_type",
+                "specifier": "LayerNorm",
+                "action": "skip",
+            },
+        ],
+    ],
+)
+def test_template_compile_matches_leaf_by_leaf_compile(tiny_gpt2, rules):
+    console = Console(quiet=True)
+    expected = compile_rules_to_steering_config(rules, tiny_gpt2, console)
+    root = build_module_tree(tiny_gpt2, share_templates=True)
+    compiled = compile_rules_to_steering_config(
+        rules, tiny_gpt2, console, module_root=root
+    )
+    assert list(compiled.items()) == list(expected.items())
+
+
+async def test_tree_populates_template_instances_on_expand(tiny_gpt2):
+    app = LMSteerApp(
+        model_root=build_module_tree(tiny_gpt2, share_templates=True),
+        model_name="tiny-gpt2",
+    )
+    async with app.run_test() as pilot:
+        await pilot.pause()
+        tree = app.query_one("#module_tree", Tree)
+        h_node = next(n for n in tree.root.children if n.data.name == "h")
+        block = h_node.children[0]
+        assert not block.is_expanded and not block.children
+        block.expand()
+        await pilot.pause()
+        assert [child.data.name for child in block.children] == [
+            "ln_1",
+            "attn",
+            "ln_2",
+            "mlp",
+        ]
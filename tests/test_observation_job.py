@@ -0,0 +1,155 @@
+import os
+import stat
+
+import pytest
+import torch
+from rich.console import Console
+
+from lmsteer.app.activation_store import ActivationStore
+from lmsteer.app.observation_job import (
+    load_checkpoint,
+    run_observation_job,
+    save_checkpoint,
+)
+from lmsteer.app.steering_vectors import reduce_activations
+
+CONFIG = {
+    "h.0.mlp.c_fc": {"action": "capture_leaf_activations"},
+    "h.1": {"action": "capture_leaf_activations"},
+}
+NUM_SAMPLES = 12
+
+
+class Interrupted(Exception):
+    pass
+
+
+def _dataset():
+    generator = torch.Generator().manual_seed(0)
+    return torch.randint(0, 100, (NUM_SAMPLES, 6), generator=generator)
+
+
+def _batches_from(started, crash_after=None, batch_size=2):
+    """make_batches factory recording each start cursor, optionally crashing after some batches."""
+    input_ids = _dataset()
+
+    def make_batches(start):
+        started.append(start)
+        for count, batch_start in enumerate(range(start, NUM_SAMPLES, batch_size)):
+            if crash_after is not None and count == crash_after:
+                raise Interrupted()
+            yield {"input_ids": input_ids[batch_start : batch_start + batch_size]}
+
+    return make_batches
+
+
+def _run(model, store_dir, make_batches, **kwargs):
+    kwargs = {"shard_size": 2, "checkpoint_every": 2, **kwargs}
+    return run_observation_job(
+        model, make_batches, CONFIG, str(store_dir), Console(quiet=True), **kwargs
+    )
+
+
+def test_interrupted_job_resumes_without_reprocessing(tiny_gpt2, tmp_path):
+    reference = _run(tiny_gpt2, tmp_path / "reference", _batches_from([]))
+    assert reference["complete"] and reference["cursor"] == NUM_SAMPLES
+
+    started = []
+    with pytest.raises(Interrupted):
+        _run(tiny_gpt2, tmp_path / "job", _batches_from(started, crash_after=3))
+    checkpoint = load_checkpoint(str(tmp_path / "job"))
+    assert (
+        checkpoint["cursor"] == 4 and not checkpoint["complete"]
+    )  # Checkpoint after shard 2
+    assert (
+        ActivationStore(str(tmp_path / "job")).num_shards == 3
+    )  # Shard 3 was written after it
+
+    resumed = _run(tiny_gpt2, tmp_path / "job", _batches_from(started))
+    assert started == [
+        0,
+        6,
+    ]  # The shard written after the checkpoint is recovered, not redone
+    store = ActivationStore(str(tmp_path / "job"))
+    assert store.num_shards == 6 and store.num_samples == NUM_SAMPLES
+    assert store.verify_shards() == []
+    expected = ActivationStore(str(tmp_path / "reference"))
+    for module_path in CONFIG:
+        torch.testing.assert_close(
+            store.load_module(module_path), expected.load_module(module_path)
+        )
+        torch.testing.assert_close(
+            resumed["reducer_states"][module_path]["sum"],
+            reference["reducer_states"][module_path]["sum"],
+        )
+    assert (
+        reduce_activations(store)["h.1"]["count"]
+        == resumed["reducer_states"]["h.1"]["count"]
+    )
+
+    # A finished job is not run again.
+    _run(tiny_gpt2, tmp_path / "job", _batches_from(started))
+    assert started == [0, 6]
+
+
+def test_corrupt_and_partial_shards_are_discarded_on_resume(tiny_gpt2, tmp_path):
+    with pytest.raises(Interrupted):
+        _run(tiny_gpt2, tmp_path, _batches_from([], crash_after=3), num_writers=0)
+    (tmp_path / "shard_00002.pt").write_bytes(
+        b"truncated"
+    )  # Written after the checkpoint
+    (tmp_path / "shard_00003.pt.tmp").write_bytes(b"partial")
+    assert ActivationStore(str(tmp_path)).verify_shards() == ["shard_00002.pt"]
+
+    started = []
+    _run(tiny_gpt2, tmp_path, _batches_from(started), num_writers=0)
+    assert started == [4]
+    store = ActivationStore(str(tmp_path))
+    assert store.verify_shards() == [] and store.num_samples == NUM_SAMPLES
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_resume_rejects_a_different_steering_config(tiny_gpt2, tmp_path):
+    with pytest.raises(Interrupted):
+        _run(tiny_gpt2, tmp_path, _batches_from([], crash_after=3))
+    with pytest.raises(ValueError, match="different steering config"):
+        run_observation_job(
+            tiny_gpt2,
+            _batches_from([]),
+            {"h.1": {"action": "capture_leaf_activations"}},
+            str(tmp_path),
+            Console(quiet=True),
+        )
+
+
+def test_checkpoint_and_index_are_synced_before_and_after_the_rename(
+    tmp_path, monkeypatch
+):
+    synced = []
+    real_fsync = os.fsync
+
+    def recording_fsync(fd):
+        synced.append("dir" if stat.S_ISDIR(os.fstat(fd).st_mode) else "file")
+        real_fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", recording_fsync)
+    store = ActivationStore(str(tmp_path))
+    store.index["metadata"]["note"] = "synced"
+    store._save_index()
+    assert synced == ["file", "dir"]
+
+    synced.clear()
+    save_checkpoint(str(tmp_path), {"cursor": 4, "complete": False})
+    assert synced == ["file", "dir"]
+    assert load_checkpoint(str(tmp_path))["cursor"] == 4
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_resume_rejects_a_different_capture_spec(tiny_gpt2, tmp_path):
+    with pytest.raises(Interrupted):
+        _run(tiny_gpt2, tmp_path, _batches_from([], crash_after=3))
+    assert load_checkpoint(str(tmp_path))["capture_spec"] == {"positions": "all"}
+    with pytest.raises(ValueError, match="capture spec"):
+        _run(tiny_gpt2, tmp_path, _batches_from([]), capture_spec={"positions": "last"})
+    _run(tiny_gpt2, tmp_path, _batches_from([]), capture_spec={"positions": "all"})
+    assert load_checkpoint(str(tmp_path))["complete"]
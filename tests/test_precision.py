@@ -0,0 +1,91 @@
+import pytest
+import torch
+from rich.console import Console
+
+from lmsteer.app.capture import run_observation
+from lmsteer.app.precision import (
+    convert_precision,
+    model_memory_bytes,
+    print_precision_report,
+    validate_precision,
+)
+
+CONFIG = {
+    "h.0.mlp.c_fc": {"action": "capture_leaf_activations"},
+    "h.1.mlp.c_proj": {"action": "capture_leaf_activations"},
+}
+
+
+def _batches():
+    generator = torch.Generator().manual_seed(0)
+    return [
+        {"input_ids": torch.randint(0, 100, (2, 8), generator=generator)}
+        for _ in range(2)
+    ]
+
+
+def test_int8_quantizes_conv1d_layers_and_keeps_outputs_close(tiny_gpt2):
+    quantized = convert_precision(tiny_gpt2, "int8")
+    assert (
+        type(tiny_gpt2.h[0].mlp.c_fc).__name__ == "Conv1D"
+    )  # The original is untouched
+    assert isinstance(quantized.h[0].mlp.c_fc, torch.ao.nn.quantized.dynamic.Linear)
+    assert model_memory_bytes(quantized) < model_memory_bytes(tiny_gpt2)
+
+    console = Console(quiet=True)
+    reference = run_observation(tiny_gpt2, _batches(), CONFIG, console)
+    reduced = run_observation(quantized, _batches(), CONFIG, console)
+    assert reduced["h.0.mlp.c_fc"].dtype == torch.float32
+    torch.testing.assert_close(
+        reduced["h.0.mlp.c_fc"], reference["h.0.mlp.c_fc"], atol=0.1, rtol=0.1
+    )
+
+
+@pytest.mark.parametrize("precision", ["bf16", "int8"])
+def test_validation_reports_agreement_and_steering_effect(tiny_gpt2, precision):
+    model = convert_precision(tiny_gpt2, precision)
+    # A constant vector would mostly be removed by ln_f's mean subtraction.
+    vectors = {
+        "h.1.mlp.c_proj": torch.randn(32, generator=torch.Generator().manual_seed(1))
+    }
+    report = validate_precision(
+        tiny_gpt2,
+        model,
+        _batches(),
+        CONFIG,
+        Console(quiet=True),
+        vectors,
+        scale=2.0,
+        precision=precision,
+    )
+    assert report["precision"] == precision
+    assert {module["module_path"] for module in report["modules"]} == set(CONFIG)
+    for module in report["modules"]:
+        assert module["cosine"] > 0.98
+        assert module["relative_error"] < 0.2
+    assert report["steering_cosine"] > 0.95
+    if precision == "bf16":
+        # Weights halve; the boolean causal-mask buffers keep their size.
+        assert report["model_bytes"] < 0.55 * report["reference_bytes"]
+
+    console = Console(record=True, width=120)
+    print_precision_report(report, console)
+    assert "h.1.mlp.c_proj" in console.export_text()
+
+
+def test_unknown_precision_is_rejected(tiny_gpt2):
+    with pytest.raises(ValueError):
+        convert_precision(tiny_gpt2, "fp8")
+
+
+def test_estimator_counts_packed_int8_weights(tiny_gpt2):
+    from lmsteer.app.estimator import CaptureEstimator
+    from lmsteer.app.model_utils import build_module_tree
+
+    quantized = convert_precision(tiny_gpt2, "int8")
+    estimator = CaptureEstimator(build_module_tree(quantized), seq_len=8)
+    assert estimator.weights_bytes == model_memory_bytes(quantized)
+    # The Conv1D weights now live in packed params, not parameters().
+    assert estimator.weights_bytes > sum(
+        p.numel() * p.element_size() for p in quantized.parameters()
+    )
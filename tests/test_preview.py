@@ -0,0 +1,97 @@
+import torch
+from textual.worker import WorkerState
+
+from lmsteer.app.model_utils import build_module_tree
+from lmsteer.app.preview import PreviewCache, compute_activation_preview, sparkline
+from lmsteer.tui import app as tui_app
+from lmsteer.tui.app import CustomTree, LMSteerApp
+
+
+class _CharTokenizer:
+    """Maps characters to token IDs; enough to feed the tiny model a prompt."""
+
+    def __call__(self, text, return_tensors=None):
+        input_ids = torch.tensor([[ord(char) % 100 for char in text]])
+        return {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)}
+
+
+def test_preview_matches_module_output(tiny_gpt2):
+    input_ids = torch.randint(0, 100, (1, 5))
+    captured = {}
+    handle = tiny_gpt2.h[0].mlp.c_fc.register_forward_hook(
+        lambda module, inputs, output: captured.setdefault("output", output)
+    )
+    with torch.no_grad():
+        tiny_gpt2(input_ids=input_ids)
+    handle.remove()
+
+    preview = compute_activation_preview(tiny_gpt2, "h.0.mlp.c_fc", input_ids, bins=8)
+    output = captured["output"]
+    assert preview["shape"] == [1, 5, 128]
+    assert abs(preview["norm"] - output.norm().item()) < 1e-4
+    assert sum(preview["histogram"]) == output.numel()
+    assert len(sparkline(preview["histogram"])) == 8
+
+
+def test_preview_cache_is_bounded_lru():
+    cache = PreviewCache(maxsize=2)
+    cache.put("a", "p", {"module_path": "a"})
+    cache.put("b", "p", {"module_path": "b"})
+    assert cache.get("a", "p") is not None  # "a" becomes most recently used
+    cache.put("c", "p", {"module_path": "c"})
+    assert ("b", "p") not in cache
+    assert ("a", "p") in cache and ("c", "p") in cache
+    assert cache.get("a", "other prompt") is None
+
+
+async def _wait_for_workers(app, pilot):
+    # workers.wait_for_complete() raises for cancelled workers, which are expected here.
+    while any(
+        worker.is_running or worker.state == WorkerState.PENDING
+        for worker in app.workers
+    ):
+        await pilot.pause(0.01)
+
+
+async def test_details_pane_previews_activations_in_background(tiny_gpt2, monkeypatch):
+    calls = []
+
+    def counting_preview(*args, **kwargs):
+        calls.append(args[1])
+        return compute_activation_preview(*args, **kwargs)
+
+    monkeypatch.setattr(tui_app, "compute_activation_preview", counting_preview)
+    app = LMSteerApp(
+        model_root=build_module_tree(tiny_gpt2),
+        model_name="tiny-gpt2",
+        preview_tokenizer=_CharTokenizer(),
+        preview_prompt="hello world",
+    )
+    async with app.run_test() as pilot:
+        tree = app.query_one("#module_tree", CustomTree)
+        await pilot.pause()
+        # Highlights in quick succession cancel pending previews instead of queueing them.
+        nodes = [child.data for child in tree.root.children[:3]]  # wte, wpe, drop
+        calls.clear()
+        for module_node in nodes:
+            app._update_module_details(module_node)
+        await _wait_for_workers(app, pilot)
+        await pilot.pause()
+        highlighted_path = nodes[-1].get_full_path()
+        assert calls == [highlighted_path]
+        details = app.query_one("#module_info_static").renderable
+        assert "[bold]Activation Preview:[/bold] (1, 11, 32)" in details
+        assert "[bold]Histogram:[/bold]" in details
+
+        # Revisiting a module is served from the cache.
+        calls.clear()
+        app._update_module_details(nodes[0])
+        await _wait_for_workers(app, pilot)
+        app._update_module_details(nodes[-1])
+        await _wait_for_workers(app, pilot)
+        await pilot.pause()
+        assert calls == [nodes[0].get_full_path()]
+        assert (
+            "[bold]Activation Preview:[/bold] (1, 11, 32)"
+            in app.query_one("#module_info_static").renderable
+        )
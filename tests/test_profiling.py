@@ -0,0 +1,73 @@
+import json
+
+import torch
+from rich.console import Console
+
+from lmsteer.app.activation_store import ActivationStore
+from lmsteer.app.capture import run_observation
+from lmsteer.app.profiling import profiler
+from lmsteer.app.steering import SteeringHooks
+
+CONFIG = {
+    "h.0.mlp.c_proj": {"action": "capture_leaf_activations"},
+    "h.1.mlp.c_proj": {"action": "capture_leaf_activations"},
+}
+
+
+def _batches():
+    return [{"input_ids": torch.randint(0, 100, (2, 8))} for _ in range(3)]
+
+
+def test_disabled_profiler_records_nothing(tiny_gpt2):
+    profiler.reset()
+    run_observation(tiny_gpt2, _batches(), CONFIG, Console(quiet=True))
+    assert profiler.summary() == []
+
+
+def test_profiles_capture_run_and_exports_trace(tiny_gpt2, tmp_path):
+    profiler.reset()
+    with profiler.profile():
+        run_observation(
+            tiny_gpt2,
+            _batches(),
+            CONFIG,
+            Console(quiet=True),
+            store=ActivationStore(str(tmp_path / "acts")),
+            shard_size=2,
+        )
+    assert not profiler.enabled
+    rows = {(row["category"], row["name"]): row for row in profiler.summary()}
+    hook_row = rows[("capture_hook", "h.0.mlp.c_proj")]
+    assert hook_row["calls"] == 3
+    assert hook_row["bytes"] == 3 * 2 * 8 * 32 * 4
+    assert rows[("forward", "h.1")]["calls"] == 3
+    assert rows[("writer", "write_shard")]["calls"] == 3
+
+    trace_path = tmp_path / "trace.json"
+    profiler.export_chrome_trace(str(trace_path))
+    trace = json.loads(trace_path.read_text())
+    assert {event["cat"] for event in trace["traceEvents"]} >= {
+        "capture_hook",
+        "forward",
+        "writer",
+    }
+
+    console = Console(record=True, width=120)
+    profiler.print_summary(console)
+    assert "h.0.mlp.c_proj" in console.export_text()
+    profiler.reset()
+
+
+def test_steering_hooks_shift_output_and_are_profiled(tiny_gpt2):
+    input_ids = torch.randint(0, 100, (1, 5))
+    with torch.no_grad():
+        baseline = tiny_gpt2(input_ids=input_ids).last_hidden_state
+    vector = torch.ones(32)
+    # The final layer norm feeds last_hidden_state directly.
+    with SteeringHooks(tiny_gpt2, {"ln_f": vector}, scale=2.0), torch.no_grad():
+        profiler.enable()
+        steered = tiny_gpt2(input_ids=input_ids).last_hidden_state
+        profiler.disable()
+    torch.testing.assert_close(steered, baseline + 2.0)
+    assert any(row["category"] == "steering_hook" for row in profiler.summary())
+    profiler.reset()
@@ -0,0 +1,121 @@
+import pytest
+import torch
+from rich.console import Console
+
+from lmsteer.app.activation_store import ActivationStore
+from lmsteer.app.capture import run_observation
+from lmsteer.app.projection import Projector, lift_vectors, reconstruct
+
+CONFIG = {
+    "h.0.mlp.c_fc": {"action": "capture_leaf_activations"},
+    "h.1.mlp.c_proj": {"action": "capture_leaf_activations"},
+}
+
+
+def _batches(count=3):
+    generator = torch.Generator().manual_seed(0)
+    return [
+        {"input_ids": torch.randint(0, 100, (2, 6), generator=generator)}
+        for _ in range(count)
+    ]
+
+
+def test_random_projection_is_seeded_and_orthonormal():
+    rows = torch.randn(10, 64)
+    spec = {"method": "random", "dim": 8, "seed": 3}
+    first, second = Projector(spec), Projector(spec)
+    reduced = first.transform(rows)
+    assert reduced.shape == (10, 8)
+    torch.testing.assert_close(second.transform(rows), reduced)
+    basis = first.state["basis"]
+    torch.testing.assert_close(basis.T @ basis, torch.eye(8), atol=1e-5, rtol=0)
+
+
+def test_pca_buffers_fit_window_and_recovers_low_rank_data():
+    generator = torch.Generator().manual_seed(0)
+    mixing = torch.randn(3, 40, generator=generator)
+    batches = [torch.randn(20, 3, generator=generator) @ mixing + 5.0 for _ in range(3)]
+    projector = Projector({"method": "pca", "dim": 3, "fit_batches": 2})
+    assert projector.transform(batches[0]) is None
+    released = projector.transform(batches[1])
+    assert released.shape == (40, 3)  # Both buffered batches are released together
+    later = projector.transform(batches[2])
+    torch.testing.assert_close(
+        reconstruct(later, projector.state), batches[2], atol=1e-3, rtol=1e-3
+    )
+
+
+def test_observation_writes_reduced_shards_and_bases(tiny_gpt2, tmp_path):
+    store = ActivationStore(str(tmp_path / "acts"), metadata={})
+    config = dict(CONFIG)
+    config["h.1.mlp.c_proj"] = {
+        **CONFIG["h.1.mlp.c_proj"],
+        "projection": {"method": "random", "dim": 4},
+    }
+    run_observation(
+        tiny_gpt2,
+        _batches(),
+        config,
+        Console(quiet=True),
+        store=store,
+        shard_size=2,
+        projection={"method": "pca", "dim": 8, "fit_batches": 2},
+    )
+
+    reopened = ActivationStore(str(tmp_path / "acts"))
+    assert reopened.load_module("h.0.mlp.c_fc").shape == (36, 8)
+    assert reopened.load_module("h.1.mlp.c_proj").shape == (
+        36,
+        4,
+    )  # Entry override wins
+    states = reopened.load_projections()
+    assert states["h.0.mlp.c_fc"]["method"] == "pca" and states["h.0.mlp.c_fc"][
+        "basis"
+    ].shape == (128, 8)
+    assert reopened.index["metadata"]["projections"]["h.1.mlp.c_proj"]["out_dim"] == 4
+
+    vectors = {"h.1.mlp.c_proj": torch.ones(4), "h.0.mlp.c_fc": torch.ones(128)}
+    lifted = lift_vectors(vectors, {"h.1.mlp.c_proj": states["h.1.mlp.c_proj"]})
+    assert lifted["h.1.mlp.c_proj"].shape == (32,)
+    assert lifted["h.0.mlp.c_fc"].shape == (128,)
+
+
+def test_shards_stay_aligned_with_samples_across_the_pca_fit_window(
+    tiny_gpt2, tmp_path
+):
+    store = run_observation(
+        tiny_gpt2,
+        _batches(5),
+        CONFIG,
+        Console(quiet=True),
+        store=ActivationStore(str(tmp_path)),
+        shard_size=2,
+        projection={"method": "pca", "dim": 8, "fit_batches": 3},
+    )
+    # The fit window spans three one-batch shards, so they are written as one.
+    assert [shard["num_samples"] for shard in store.index["shards"]] == [6, 2, 2]
+    for shard in store.index["shards"]:
+        assert set(shard["rows"].values()) == {
+            shard["num_samples"] * 6
+        }  # Six positions per sample
+
+
+def test_short_runs_and_wide_dims(tiny_gpt2):
+    # A run shorter than the PCA fit window still yields every row, and dims
+    # at least as wide as the module leave activations untouched.
+    activations = run_observation(
+        tiny_gpt2,
+        _batches(1),
+        CONFIG,
+        Console(quiet=True),
+        projection={"method": "pca", "dim": 64, "fit_batches": 4},
+    )
+    assert activations["h.0.mlp.c_fc"].shape == (12, 64)
+    assert activations["h.1.mlp.c_proj"].shape == (12, 32)
+
+
+def test_invalid_projection_is_rejected():
+    with pytest.raises(ValueError):
+        Projector({"method": "svd", "dim": 4})
+    with pytest.raises(ValueError):
+        Projector({"method": "random"})
@@ -0,0 +1,78 @@
+import torch
+from rich.console import Console
+
+from lmsteer.app.capture import run_observation
+from lmsteer.app.rules import compile_rules_to_steering_config
+from lmsteer.app.screening import (
+    print_screening_results,
+    screen_modules,
+    suggest_capture_rules,
+)
+
+
+def _batches(low, high, seed):
+    generator = torch.Generator().manual_seed(seed)
+    return [
+        {
+            "input_ids": torch.randint(low, high, (2, 6), generator=generator),
+            "attention_mask": torch.tensor([[1] * 6, [0, 0, 1, 1, 1, 1]]),
+        }
+        for _ in range(3)
+    ]
+
+
+def test_statistics_match_full_capture(tiny_gpt2):
+    console = Console(quiet=True)
+    batches = _batches(0, 100, seed=0)
+    results = screen_modules(tiny_gpt2, batches, console)
+    by_path = {result["module_path"]: result for result in results}
+    leaves = [
+        name
+        for name, module in tiny_gpt2.named_modules()
+        if name and not list(module.children())
+    ]
+    # Leaves that never run (attention dropout under SDPA) have no statistics.
+    assert set(by_path) <= set(leaves)
+    assert {"wte", "ln_f", "h.0.mlp.c_proj", "h.1.attn.c_attn"} <= set(by_path)
+    assert [r["score"] for r in results] == sorted(
+        (r["score"] for r in results), reverse=True
+    )
+
+    config = {"h.0.mlp.c_proj": {"action": "capture_leaf_activations"}}
+    captured = run_observation(tiny_gpt2, batches, config, console)[
+        "h.0.mlp.c_proj"
+    ].double()
+    result = by_path["h.0.mlp.c_proj"]
+    assert result["num_tokens"] == captured.shape[0] == 3 * 10  # Padding is skipped
+    assert abs(result["mean_norm"] - captured.norm(dim=-1).mean().item()) < 1e-4
+    assert (
+        abs(result["variance"] - captured.var(dim=0, unbiased=False).mean().item())
+        < 1e-4
+    )
+    assert result["separation"] is None
+
+
+def test_two_prompt_sets_rank_separating_modules_and_suggest_rules(tiny_gpt2):
+    console = Console(quiet=True)
+    results = screen_modules(
+        tiny_gpt2,
+        _batches(1, 10, seed=1),
+        console,
+        negative_batches=_batches(90, 100, seed=2),
+    )
+    assert all(result["separation"] is not None for result in results)
+    # Token embeddings see disjoint vocabularies, so they separate the sets well.
+    wte = next(result for result in results if result["module_path"] == "wte")
+    assert wte["separation"] > results[len(results) // 2]["separation"]
+
+    rules = suggest_capture_rules(results, top_k=3)
+    assert [rule["specifier"] for rule in rules] == [
+        r["module_path"] for r in results[:3]
+    ]
+    assert suggest_capture_rules(results, top_k=3, min_score=float("inf")) == []
+    config = compile_rules_to_steering_config(rules, tiny_gpt2, console)
+    assert set(config) == {rule["specifier"] for rule in rules}
+
+    output = Console(record=True, width=140)
+    print_screening_results(results, output, limit=5)
+    assert results[0]["module_path"] in output.export_text()
@@ -0,0 +1,205 @@
+import asyncio
+import json
+
+import pytest
+import torch
+
+from rich.console import Console
+
+from lmsteer.app.capture import run_observation
+from lmsteer.app.config_io import load_steering_vectors, save_steering_vectors
+from lmsteer.app.server import SteeredInferenceServer
+from lmsteer.app.steering import BatchedSteeringHooks, SteeringHooks
+from lmsteer.app.steering_vectors import compute_steering_vectors
+
+
+@pytest.fixture
+def tiny_lm():
+    from transformers import GPT2Config, GPT2LMHeadModel
+
+    torch.manual_seed(0)
+    config = GPT2Config(
+        vocab_size=100,
+        n_positions=64,
+        n_embd=32,
+        n_layer=2,
+        n_head=2,
+        bos_token_id=0,
+        eos_token_id=0,
+    )
+    return GPT2LMHeadModel(config).eval()
+
+
+def _profiles():
+    generator = torch.Generator().manual_seed(1)
+    return {
+        "up": {"h.1.mlp.c_proj": 5 * torch.randn(32, generator=generator)},
+        "down": {"h.0.mlp.c_proj": -5 * torch.randn(32, generator=generator)},
+    }
+
+
+def test_batched_hooks_apply_per_row_profiles(tiny_gpt2):
+    vector = torch.ones(32)
+    input_ids = torch.randint(1, 100, (3, 6))
+    with torch.no_grad():
+        baseline = tiny_gpt2(input_ids=input_ids).last_hidden_state
+    with (
+        BatchedSteeringHooks(tiny_gpt2, {"shift": {"ln_f": vector}}) as hooks,
+        torch.no_grad(),
+    ):
+        hooks.set_rows(["shift", None, "shift"], [2.0, 1.0, 0.0])
+        steered = tiny_gpt2(input_ids=input_ids).last_hidden_state
+    torch.testing.assert_close(steered[0], baseline[0] + 2.0)
+    torch.testing.assert_close(steered[1], baseline[1])
+    torch.testing.assert_close(steered[2], baseline[2])
+
+
+async def test_concurrent_requests_are_batched_and_match_unbatched(tiny_lm):
+    prompts = [[5, 6, 7], [8, 9], [10, 11, 12, 13], [14]]
+    requests = [
+        {"input_ids": prompt, "max_new_tokens": 4, "profile": profile, "scale": scale}
+        for prompt, (profile, scale) in zip(
+            prompts, [(None, 1.0), ("up", 1.0), ("down", 0.5), ("up", 0.0)]
+        )
+    ]
+    policy = {"max_batch_size": 8, "max_batch_tokens": 1024, "max_wait_ms": 200.0}
+    async with SteeredInferenceServer(
+        tiny_lm, steering_profiles=_profiles(), policy=policy
+    ) as server:
+        batched = await asyncio.gather(
+            *(server.submit(request) for request in requests)
+        )
+        assert [response["batch_size"] for response in batched] == [4, 4, 4, 4]
+        # One request at a time must give the same tokens as the mixed batch.
+        for request, response in zip(requests, batched):
+            alone = await server.submit(request)
+            assert alone["batch_size"] == 1
+            assert alone["output_ids"] == response["output_ids"]
+            assert len(alone["output_ids"]) == 4
+        stats = server.stats.snapshot()
+    assert stats["requests"] == 8
+    assert stats["batches"] == 5
+    assert stats["latency_p99_ms"] >= stats["latency_p50_ms"] > 0
+    assert stats["tokens_generated"] == 32
+
+
+async def test_token_budget_splits_batches(tiny_lm):
+    policy = {
+        "max_batch_size": 8,
+        "max_batch_tokens": 2 * (4 + 2),
+        "max_wait_ms": 200.0,
+    }
+    async with SteeredInferenceServer(tiny_lm, policy=policy) as server:
+        responses = await asyncio.gather(
+            *(
+                server.submit({"input_ids": [1, 2, 3, 4], "max_new_tokens": 2})
+                for _ in range(3)
+            )
+        )
+    assert sorted(response["batch_size"] for response in responses) == [1, 2, 2]
+
+
+async def test_http_endpoints(tiny_lm):
+    async with SteeredInferenceServer(tiny_lm, steering_profiles=_profiles()) as server:
+        listener = await server.serve_tcp("127.0.0.1", 0)
+        port = listener.sockets[0].getsockname()[1]
+
+        async def http(method, path, payload=None):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            body = json.dumps(payload).encode() if payload is not None else b""
+            writer.write(
+                f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            head, _, data = response.partition(b"\r\n\r\n")
+            return int(head.split()[1]), json.loads(data)
+
+        status, result = await http(
+            "POST",
+            "/generate",
+            {"input_ids": [3, 4], "max_new_tokens": 3, "profile": "up"},
+        )
+        assert status == 200 and len(result["output_ids"]) == 3
+        status, result = await http(
+            "POST", "/generate", {"input_ids": [3], "profile": "missing"}
+        )
+        assert status == 400 and "missing" in result["error"]
+        status, stats = await http("GET", "/stats")
+        assert status == 200 and stats["requests"] == 1
+        status, _ = await http("GET", "/nope")
+        assert status == 404
+
+
+async def test_serves_vectors_computed_on_the_base_model(tiny_lm, tmp_path):
+    from transformers import GPT2Model
+
+    # Capture and vector files use AutoModel paths; the server runs the LM head model.
+    base_model = GPT2Model(tiny_lm.config).eval()
+    base_model.load_state_dict(tiny_lm.transformer.state_dict())
+    steering_config = {"h.1.mlp": {"action": "capture_leaf_activations"}}
+    console = Console(quiet=True)
+    generator = torch.Generator().manual_seed(2)
+    positive, negative = (
+        run_observation(
+            base_model,
+            [{"input_ids": torch.randint(low, high, (4, 5), generator=generator)}],
+            steering_config,
+            console,
+        )
+        for low, high in ((1, 50), (50, 100))
+    )
+    vector_path = str(tmp_path / "vectors.pt")
+    computed = compute_steering_vectors(positive, negative, steering_config)
+    save_steering_vectors(computed, steering_config, vector_path, console)
+    vectors = load_steering_vectors(vector_path, steering_config)
+
+    request = {
+        "input_ids": [5, 6, 7],
+        "max_new_tokens": 4,
+        "profile": "topic",
+        "scale": 8.0,
+    }
+    async with SteeredInferenceServer(
+        tiny_lm, steering_profiles={"topic": vectors}
+    ) as server:
+        steered = await server.submit(request)
+        plain = await server.submit({**request, "profile": None})
+    with SteeringHooks(tiny_lm.transformer, vectors, scale=8.0), torch.no_grad():
+        expected = tiny_lm.generate(
+            torch.tensor([[5, 6, 7]]), max_new_tokens=4, do_sample=False, pad_token_id=0
+        )
+    assert steered["output_ids"] == expected[0, 3:].tolist()
+    assert steered["output_ids"] != plain["output_ids"]
+
+
+async def test_invalid_requests_fail_alone(tiny_lm):
+    policy = {"max_batch_size": 8, "max_batch_tokens": 1024, "max_wait_ms": 200.0}
+    async with SteeredInferenceServer(tiny_lm, policy=policy) as server:
+        good = {"input_ids": [1, 2, 3], "max_new_tokens": 2}
+        results = await asyncio.gather(
+            server.submit(good),
+            server.submit({"input_ids": [1, 500]}),  # Outside the vocabulary of 100
+            server.submit(
+                {"input_ids": [1] * 60, "max_new_tokens": 8}
+            ),  # Past n_positions=64
+            server.submit({**good, "scale": None}),
+            return_exceptions=True,
+        )
+    assert len(results[0]["output_ids"]) == 2
+    assert all(isinstance(result, ValueError) for result in results[1:])
+
+
+async def test_close_fails_requests_still_waiting(tiny_lm):
+    server = SteeredInferenceServer(tiny_lm, policy={"max_wait_ms": 10_000.0})
+    await server.start()
+    waiting = [
+        asyncio.ensure_future(server.submit({"input_ids": [1, 2]})) for _ in range(2)
+    ]
+    await asyncio.sleep(0.05)  # Collected into a batch that waits for more requests
+    await server.close()
+    for future in waiting:
+        with pytest.raises(RuntimeError, match="closed"):
+            await future
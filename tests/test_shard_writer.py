@@ -0,0 +1,142 @@
+import threading
+import time
+
+import pytest
+import torch
+from rich.console import Console
+
+from lmsteer.app.activation_store import ActivationStore
+from lmsteer.app.capture import ActivationCapture, run_observation
+from lmsteer.app.shard_writer import ShardWriter
+
+CONFIG = {
+    "h.0.mlp.c_fc": {"action": "capture_leaf_activations"},
+    "h.1": {"action": "capture_leaf_activations"},
+}
+
+
+class SlowStore(ActivationStore):
+    """Delays shard writes, and writes shard 0 last, to exercise ordering and backpressure."""
+
+    def save_shard_file(self, shard_idx, activations):
+        time.sleep(0.1 if shard_idx == 0 else 0.02)
+        return super().save_shard_file(shard_idx, activations)
+
+
+class FailingStore(ActivationStore):
+    fail_at = 1
+
+    def save_shard_file(self, shard_idx, activations):
+        if shard_idx == self.fail_at:
+            time.sleep(0.05)  # Let the producer move on first
+            raise OSError("disk full")
+        return super().save_shard_file(shard_idx, activations)
+
+
+def _batches(count=5):
+    generator = torch.Generator().manual_seed(0)
+    return [
+        {"input_ids": torch.randint(0, 100, (2, 6), generator=generator)}
+        for _ in range(count)
+    ]
+
+
+def test_background_writes_match_synchronous_shards(tiny_gpt2, tmp_path):
+    console = Console(quiet=True)
+    sync_store = run_observation(
+        tiny_gpt2,
+        _batches(),
+        CONFIG,
+        console,
+        store=ActivationStore(str(tmp_path / "sync")),
+        shard_size=2,
+        num_writers=0,
+    )
+    run_observation(
+        tiny_gpt2,
+        _batches(),
+        CONFIG,
+        console,
+        store=SlowStore(str(tmp_path / "async")),
+        shard_size=2,
+        num_writers=3,
+        max_pending_shards=1,
+    )
+    reopened = ActivationStore(str(tmp_path / "async"))
+    assert reopened.index["shards"] == sync_store.index["shards"]
+    assert [shard["file"] for shard in reopened.index["shards"]] == [
+        f"shard_{i:05d}.pt" for i in range(5)
+    ]
+    for module_path in CONFIG:
+        torch.testing.assert_close(
+            reopened.load_module(module_path), sync_store.load_module(module_path)
+        )
+
+
+def test_full_queue_blocks_the_producer_and_staging_is_reused(tmp_path):
+    writer = ShardWriter(SlowStore(str(tmp_path)), num_workers=1, max_pending=1)
+    staging_ids = set()
+    for shard in range(4):
+        staging = writer.acquire_staging()
+        staging_ids.add(id(staging))
+        staging.setdefault("m", torch.zeros(4, 3))[:] = shard
+        writer.submit({"m": staging["m"][:2]}, 2, staging)
+    writer.close()
+    assert writer.stats["shards"] == 4
+    assert writer.stats["blocked_s"] > 0.05
+    assert len(staging_ids) <= 2  # max_pending + 1 buffer sets
+    shards = list(writer.store.iter_shards())
+    assert [int(shard["m"][0, 0]) for shard in shards] == [0, 1, 2, 3]
+    # Views of the staging buffers are compacted before saving.
+    assert shards[0]["m"].untyped_storage().nbytes() == 2 * 3 * 4
+    assert not any(
+        thread.name.startswith("lmsteer-shard-writer")
+        for thread in threading.enumerate()
+    )
+
+
+def test_staging_is_sized_for_a_whole_shard_up_front(tiny_gpt2, tmp_path):
+    writer = ShardWriter(ActivationStore(str(tmp_path)), num_workers=1, max_pending=1)
+    capture = ActivationCapture(tiny_gpt2, CONFIG)
+    capture.attach_writer(writer, shard_size=6)
+    data_ptrs = set()
+    with capture, torch.no_grad():
+        for batch in _batches(3):
+            capture.set_batch(batch["input_ids"])
+            tiny_gpt2(input_ids=batch["input_ids"])
+            data_ptrs.add(capture.staging["h.1"].data_ptr())
+    assert len(data_ptrs) == 1  # Allocated once, not grown batch by batch
+    assert capture.staging["h.1"].shape[0] == 6 * 6  # shard_size samples x 6 positions
+    writer.close()
+
+
+def test_failed_write_is_raised_and_not_indexed(tiny_gpt2, tmp_path):
+    store = FailingStore(str(tmp_path))
+    with pytest.raises(RuntimeError, match="shard write failed"):
+        run_observation(
+            tiny_gpt2,
+            _batches(),
+            CONFIG,
+            Console(quiet=True),
+            store=store,
+            shard_size=2,
+        )
+    assert [
+        shard["file"] for shard in ActivationStore(str(tmp_path)).index["shards"]
+    ] == ["shard_00000.pt"]
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_forward_errors_are_not_masked_by_failed_writes(tiny_gpt2, tmp_path):
+    def batches():
+        yield from _batches(4)
+        raise KeyboardInterrupt
+
+    # The last shard fails in the background while the interruption propagates.
+    store = FailingStore(str(tmp_path))
+    store.fail_at = 3
+    with pytest.raises(KeyboardInterrupt):
+        run_observation(
+            tiny_gpt2, batches(), CONFIG, Console(quiet=True), store=store, shard_size=2
+        )
+    assert store.num_shards == 3
@@ -0,0 +1,79 @@
+from lmsteer.app.model_utils import build_module_tree
+from lmsteer.tui.app import CustomTree, LMSteerApp
+from lmsteer.tui.status_overlay import STATUS_CAPTURE, STATUS_SKIP, StatusOverlay
+
+MLP_CAPTURE = {
+    "id": "mlp",
+    "rule_type": "path_pattern",
+    "specifier": "h.*.mlp.*",
+    "action": "capture",
+}
+DROPOUT_SKIP = {
+    "id": "drop",
+    "rule_type": "module_type",
+    "specifier": "Dropout",
+    "action": "skip",
+}
+
+
+def _labels(node, labels=None):
+    labels = {} if labels is None else labels
+    labels[node.data.get_full_path()] = str(node.label)
+    for child in node.children:
+        _labels(child, labels)
+    return labels
+
+
+def test_overlay_statuses_follow_config_and_skip_rules(tiny_gpt2):
+    overlay = StatusOverlay(build_module_tree(tiny_gpt2, share_templates=True))
+    config = {"h.0.mlp.c_fc": {}, "h.1.mlp.c_fc": {}}
+    statuses = overlay.compute_statuses(config, [DROPOUT_SKIP])
+    assert statuses[overlay.leaf_index["h.0.mlp.c_fc"]] == STATUS_CAPTURE
+    assert statuses[overlay.leaf_index["drop"]] == STATUS_SKIP
+    assert statuses.count(STATUS_SKIP) == 1 + 2 * 3  # drop + three dropouts per block
+
+
+async def test_rule_changes_relabel_only_changed_nodes(tiny_gpt2):
+    app = LMSteerApp(
+        model_root=build_module_tree(tiny_gpt2, share_templates=True),
+        model_name="tiny-gpt2",
+    )
+    async with app.run_test() as pilot:
+        await pilot.pause()
+        tree = app.query_one("#module_tree", CustomTree)
+        labels = _labels(tree.root)
+        assert labels[""].startswith("[I] GPT2Model") and "0/24 captured" in labels[""]
+        assert labels["wte"].startswith("[I] wte")
+
+        app.set_defined_rules([MLP_CAPTURE, DROPOUT_SKIP])
+        await pilot.pause()
+        labels = _labels(tree.root)
+        assert labels["drop"].startswith("[S] drop")
+        assert "8/24 captured, 5 skipped" in labels[""]
+        assert "4/10 captured, 2 skipped" in labels["h.0"]
+        # The repainted tree shows the new prefixes, not just the node labels.
+        rendered = [tree.render_line(y).text for y in range(tree.size.height)]
+        assert any("[S] drop" in line for line in rendered)
+        assert not any("[I] drop" in line for line in rendered)
+
+        # Expanding a template instance shows leaves with the current statuses.
+        h0 = next(
+            node for node in tree.root.children if node.data.name == "h"
+        ).children[0]
+        h0.expand()
+        await pilot.pause()
+        mlp = next(node for node in h0.children if node.data.name == "mlp")
+        mlp.expand()
+        await pilot.pause()
+        labels = _labels(tree.root)
+        assert (
+            labels["h.0.mlp"].startswith("[C] mlp")
+            and "4/4 captured" in labels["h.0.mlp"]
+        )
+        assert labels["h.0.mlp.c_fc"].startswith("[C] c_fc")
+
+        # Dropping the skip rule only touches the dropouts and their ancestors.
+        changes = app.status_overlay.update(app.steering_config, [MLP_CAPTURE])
+        changed_paths = {node.data.get_full_path() for node, _ in changes}
+        assert changed_paths == {"", "drop", "h", "h.0", "h.1", "h.0.attn"}
+        assert app.status_overlay.update(app.steering_config, [MLP_CAPTURE]) == []
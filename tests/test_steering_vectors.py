@@ -0,0 +1,63 @@
+import pytest
+import torch
+from rich.console import Console
+
+from lmsteer.app.activation_store import ActivationStore
+from lmsteer.app.config_io import load_steering_vectors, save_steering_vectors
+from lmsteer.app.steering_vectors import compute_steering_vectors, reduce_activations
+
+CONFIG = {
+    "a": {"action": "capture_leaf_activations"},
+    "b": {"action": "capture_leaf_activations"},
+    "c": {"action": "capture_leaf_activations"},
+}
+
+
+def _activations(offset):
+    torch.manual_seed(int(offset))
+    return {
+        "a": torch.randn(50, 4) + offset,
+        "b": torch.randn(60, 4) - offset,
+        "c": torch.randn(40, 6) * 0.1 + offset * torch.eye(6)[0],
+    }
+
+
+def test_mean_diff_matches_per_module_means():
+    positive, negative = _activations(2.0), _activations(0.0)
+    vectors = compute_steering_vectors(positive, negative, CONFIG)
+    assert list(vectors) == ["a", "b", "c"]
+    for path in CONFIG:
+        expected = positive[path].double().mean(0) - negative[path].double().mean(0)
+        torch.testing.assert_close(vectors[path], expected.float())
+
+
+def test_store_and_reducer_states_give_same_result(tmp_path):
+    positive, negative = _activations(1.0), _activations(0.0)
+    store = ActivationStore(str(tmp_path / "pos"))
+    store.write_shard({k: v[:20] for k, v in positive.items()}, 20)
+    store.write_shard({k: v[20:] for k, v in positive.items()}, 20)
+    from_store = compute_steering_vectors(store, negative, CONFIG)
+    from_states = compute_steering_vectors(
+        reduce_activations(positive), reduce_activations(negative), CONFIG
+    )
+    for path in CONFIG:
+        torch.testing.assert_close(from_store[path], from_states[path])
+
+
+def test_pca_direction_aligns_with_separating_axis():
+    positive, negative = _activations(3.0), _activations(0.0)
+    vectors = compute_steering_vectors(
+        positive, negative, CONFIG, method="pca", normalize=True
+    )
+    # Module "c" is separated only along its first axis.
+    assert vectors["c"][0] == pytest.approx(1.0, abs=1e-3)
+
+
+def test_vector_file_round_trip_checks_config(tmp_path):
+    vectors = compute_steering_vectors(_activations(1.0), _activations(0.0), CONFIG)
+    file_path = str(tmp_path / "vectors.pt")
+    save_steering_vectors(vectors, CONFIG, file_path, Console(quiet=True))
+    loaded = load_steering_vectors(file_path, CONFIG)
+    assert list(loaded) == list(CONFIG)
+    with pytest.raises(ValueError):
+        load_steering_vectors(file_path, {"a": CONFIG["a"]})
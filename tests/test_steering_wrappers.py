@@ -0,0 +1,80 @@
+import pytest
+import torch
+
+from lmsteer.app.steering import SteeredModule, SteeringHooks, SteeringWrappers
+
+VECTORS = {
+    "h.0.mlp": torch.randn(32, generator=torch.Generator().manual_seed(0)),
+    "h.0.mlp.c_proj": torch.randn(32, generator=torch.Generator().manual_seed(1)),
+    "h.1": torch.randn(32, generator=torch.Generator().manual_seed(2)),
+}
+
+
+def _forward(model, input_ids):
+    with torch.no_grad():
+        return model(input_ids=input_ids).last_hidden_state
+
+
+def test_wrappers_match_hooks_and_restore_the_original_modules(tiny_gpt2):
+    input_ids = torch.randint(
+        0, 100, (2, 6), generator=torch.Generator().manual_seed(3)
+    )
+    originals = {path: tiny_gpt2.get_submodule(path) for path in VECTORS}
+    baseline = _forward(tiny_gpt2, input_ids)
+    with SteeringHooks(tiny_gpt2, VECTORS, scale=1.5):
+        hooked = _forward(tiny_gpt2, input_ids)
+
+    with SteeringWrappers(tiny_gpt2, VECTORS, scale=1.5) as wrappers:
+        # Nested targets: the outer wrapper encloses the inner one.
+        assert isinstance(tiny_gpt2.h[0].mlp, SteeredModule)
+        assert isinstance(tiny_gpt2.h[0].mlp.module.c_proj, SteeredModule)
+        assert not any(
+            key.endswith((".vector", ".scale")) for key in tiny_gpt2.state_dict()
+        )
+        torch.testing.assert_close(_forward(tiny_gpt2, input_ids), hooked)
+        wrappers.set_scale(0.0)
+        torch.testing.assert_close(_forward(tiny_gpt2, input_ids), baseline)
+
+    for path, module in originals.items():
+        assert tiny_gpt2.get_submodule(path) is module
+    torch.testing.assert_close(_forward(tiny_gpt2, input_ids), baseline)
+
+
+def test_wrapped_model_compiles_as_one_graph_and_rescales_without_recompiling(
+    tiny_gpt2,
+):
+    torch._dynamo.reset()
+    graphs = []
+
+    def counting_backend(graph_module, example_inputs):
+        graphs.append(graph_module)
+        return graph_module.forward
+
+    input_ids = torch.randint(
+        0, 100, (2, 6), generator=torch.Generator().manual_seed(3)
+    )
+    baseline = _forward(tiny_gpt2, input_ids)
+    with SteeringWrappers(tiny_gpt2, VECTORS, scale=1.0) as wrappers:
+        eager = _forward(tiny_gpt2, input_ids)
+        compiled = torch.compile(tiny_gpt2, backend=counting_backend, fullgraph=True)
+        torch.testing.assert_close(_forward(compiled, input_ids), eager)
+        wrappers.set_scale(0.0)
+        torch.testing.assert_close(_forward(compiled, input_ids), baseline)
+    assert len(graphs) == 1
+    torch._dynamo.reset()
+
+
+def test_root_cannot_be_wrapped(tiny_gpt2):
+    with pytest.raises(ValueError):
+        SteeringWrappers(tiny_gpt2, {"": torch.zeros(32)}).register()
+
+
+def test_failed_register_restores_the_modules_already_wrapped(tiny_gpt2):
+    block = tiny_gpt2.h[0]
+    wrappers = SteeringWrappers(
+        tiny_gpt2, {"h.0": torch.zeros(32), "h.9": torch.zeros(32)}
+    )
+    with pytest.raises(AttributeError):
+        wrappers.register()
+    assert tiny_gpt2.h[0] is block
+    assert wrappers.wrappers == {}
@@ -0,0 +1,41 @@
+import torch
+
+from benchmarks.run_benchmarks import compare_results, run_suite
+from lmsteer.app.model_utils import build_module_tree
+from lmsteer.app.synthetic import build_synthetic_model, generate_synthetic_rules
+
+
+def test_synthetic_model_is_sized_by_module_count():
+    model = build_synthetic_model(num_modules=1_000)
+    assert len(list(model.named_modules())) == 1_000
+    wide = build_synthetic_model(num_layers=3, extra_leaves_per_block=4)
+    root = build_module_tree(wide, share_templates=True)
+    assert len(root.children[1].template_groups[0].instances) == 3
+    assert wide(torch.randint(0, 128, (2, 5))).shape == (2, 5, 32)
+
+
+def test_synthetic_rules_are_reproducible():
+    model = build_synthetic_model(num_layers=4)
+    rules = generate_synthetic_rules(model, 50, seed=1)
+    assert rules == generate_synthetic_rules(model, 50, seed=1)
+    assert {rule["rule_type"] for rule in rules} == {
+        "instance",
+        "path_pattern",
+        "module_type",
+    }
+
+
+def test_benchmark_suite_smoke():
+    results = run_suite([200], [10], repeat=1)
+    names = {result["name"] for result in results["results"].values()}
+    assert names == {
+        "build_module_tree",
+        "compile_rules_to_steering_config",
+        "tui_tree_population",
+        "tui_status_update",
+        "capture_throughput",
+        "capture_writer",
+        "injection",
+        "precision_forward",
+    }
+    assert compare_results(results, results) == []
@@ -0,0 +1,62 @@
+import pytest
+import torch
+
+from lmsteer.app.config_io import steering_config_hash
+from lmsteer.app.vector_store import SteeringVectorStore
+
+CONFIG = {
+    "h.0.mlp.c_proj": {"action": "capture_leaf_activations"},
+    "h.1.mlp.c_proj": {"action": "capture_leaf_activations"},
+}
+
+
+def test_round_trip_returns_independent_tensors(tmp_path):
+    store = SteeringVectorStore(str(tmp_path))
+    vectors = {
+        "h.0.mlp.c_proj": torch.randn(32),
+        "h.1.mlp.c_proj": torch.randn(4, 8).to(torch.bfloat16),
+    }
+    store.put_for_config(vectors, CONFIG)
+
+    loaded = store.load_for_config(CONFIG)
+    assert list(loaded) == list(CONFIG)
+    for path, vector in vectors.items():
+        assert torch.equal(loaded[path], vector)
+    # Editing a returned vector in place must not change what later lookups see.
+    loaded["h.0.mlp.c_proj"] *= 2
+    assert torch.equal(
+        store.load_for_config(CONFIG)["h.0.mlp.c_proj"], vectors["h.0.mlp.c_proj"]
+    )
+    assert loaded["h.0.mlp.c_proj"].untyped_storage().nbytes() == 32 * 4
+
+
+def test_appends_create_new_versions(tmp_path):
+    store = SteeringVectorStore(str(tmp_path))
+    config_hash = steering_config_hash(CONFIG)
+    first = torch.zeros(4)
+    second = torch.ones(4)
+    assert store.put("h.0.mlp.c_proj", first, config_hash) == 1
+    assert store.put("h.0.mlp.c_proj", second, config_hash) == 2
+    assert store.versions("h.0.mlp.c_proj", config_hash) == [1, 2]
+    assert torch.equal(store.get("h.0.mlp.c_proj", config_hash), second)
+    assert torch.equal(store.get("h.0.mlp.c_proj", config_hash, version=1), first)
+    with pytest.raises(KeyError):
+        store.get("h.0.mlp.c_proj", "other-config")
+
+
+def test_reader_sees_appends_from_another_writer(tmp_path):
+    reader = SteeringVectorStore(str(tmp_path))
+    writer = SteeringVectorStore(str(tmp_path))
+    writer.put_for_config({"h.0.mlp.c_proj": torch.arange(4.0)}, CONFIG)
+    assert torch.equal(
+        reader.load_for_config(CONFIG)["h.0.mlp.c_proj"], torch.arange(4.0)
+    )
+    writer.put_for_config({"h.1.mlp.c_proj": torch.arange(8.0)}, CONFIG)
+    config_hash = steering_config_hash(CONFIG)
+    assert torch.equal(reader.get("h.1.mlp.c_proj", config_hash), torch.arange(8.0))
+
+
+def test_rejects_vectors_outside_config(tmp_path):
+    store = SteeringVectorStore(str(tmp_path))
+    with pytest.raises(ValueError):
+        store.put_for_config({"wte": torch.zeros(2)}, CONFIG)